@@ -3,28 +3,573 @@
 
 import sys
 import os
-import math
+import re
+import json
+import time
+import bisect
+import hashlib
+import mmap
+import operator
+import itertools
+import stat
 import tempfile
+import zlib
+import atexit
+import datetime
+import gc
+from collections import deque, namedtuple
 
 # --- KONFIGURACJA ŚRODOWISKA ---
-try:
-    import scribus
-except ImportError:
-    print("Ten skrypt musi być uruchomiony wewnątrz Scribusa.")
-    sys.exit(1)
-
-try:
-    import tkinter as tk
-    from tkinter import ttk
-    import tkinter.filedialog as filedialog
-    import tkinter.simpledialog as simpledialog
-    import tkinter.messagebox as messagebox
-except ImportError:
-    scribus.messageBox("Błąd", "Brak modułu 'tkinter'. Skrypt wymaga biblioteki GUI.", scribus.ICON_WARNING)
-    sys.exit(1)
+# Moduły scribus i tkinter ładowane są leniwie (_load_scribus / _load_tk).
+# Dzięki temu silnik (ImpositionEngine, SHEET_SIZES, get_pdf_page_count)
+# importuje się w milisekundach ze zwykłego Pythona - w usługach, testach
+# i procesach roboczych - bez Scribusa i biblioteki GUI.
+scribus = None
+tk = ttk = filedialog = simpledialog = messagebox = None
+
+def _load_scribus():
+    """Importuje moduł scribus (dostępny tylko wewnątrz Scribusa)"""
+    global scribus
+    if scribus is None:
+        import scribus as scribus_module
+        scribus = scribus_module
+    return scribus
+
+def _load_tk():
+    """Importuje tkinter dla GUI"""
+    global tk, ttk, filedialog, simpledialog, messagebox
+    if tk is None:
+        import tkinter
+        import tkinter.ttk
+        import tkinter.filedialog
+        import tkinter.simpledialog
+        import tkinter.messagebox
+        ttk = tkinter.ttk
+        filedialog = tkinter.filedialog
+        simpledialog = tkinter.simpledialog
+        messagebox = tkinter.messagebox
+        tk = tkinter
+    return tk
+
+def check_import_budget(budget_ms=50.0, cold_budget_ms=250.0):
+    """
+    Mierzy czas importu tego modułu w świeżym interpreterze Pythona, w dwóch stanach:
+    zimnym (bez kodu bajtowego - kompilacja źródła, jak pierwszy start po zmianie
+    skryptu) i ciepłym (z plikiem .pyc). Mierzona jest kopia modułu w katalogu
+    tymczasowym, więc wynik nie zależy od __pycache__ obok skryptu ani od
+    PYTHONDONTWRITEBYTECODE.
+    Zwraca (zimny_ms, ciepły_ms, ciężkie_moduły, ok) - ok oznacza mieszczenie się
+    w obu budżetach i brak ciężkich importów (scribus, tkinter, sieć) przy ładowaniu.
+    """
+    import py_compile
+    import shutil
+    import subprocess
+    mod_name = os.path.splitext(os.path.basename(__file__))[0]
+    code = (
+        "import sys, time\n"
+        "sys.path.insert(0, %r)\n"
+        "heavy = ('scribus', 'tkinter', 'socket', 'multiprocessing', 'subprocess', 'concurrent')\n"
+        "before = set(sys.modules)\n"
+        "t0 = time.perf_counter()\n"
+        "import %s\n"
+        "print((time.perf_counter() - t0) * 1000.0)\n"
+        "print(','.join(m for m in heavy if m in sys.modules and m not in before))\n"
+    )
+    tmp = tempfile.mkdtemp(prefix="impo_import_")
+    try:
+        shutil.copy(os.path.abspath(__file__), tmp)
+        env = dict(os.environ)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        
+        def measure():
+            out = subprocess.run([sys.executable, "-c", code % (tmp, mod_name)], env=env,
+                                 capture_output=True, text=True, check=True).stdout.splitlines()
+            return float(out[0]), [m for m in out[1].split(",") if m] if len(out) > 1 else []
+        
+        env["PYTHONDONTWRITEBYTECODE"] = "1"
+        cold, heavy = measure()
+        py_compile.compile(os.path.join(tmp, os.path.basename(__file__)), doraise=True)
+        del env["PYTHONDONTWRITEBYTECODE"]
+        warm, _ = measure()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return cold, warm, heavy, (warm <= budget_ms and cold <= cold_budget_ms and not heavy)
 
 # --- LOGIKA IMPOZYCJI ---
 
+# Cache liczby stron PDF: (ścieżka, mtime, rozmiar) -> liczba stron
+_PDF_PAGE_COUNT_CACHE = {}
+
+def get_pdf_page_count(filename):
+    """Liczba stron pliku PDF (0, jeśli nie udało się ustalić). Wynik jest buforowany."""
+    try:
+        st = os.stat(filename)
+        key = (os.path.abspath(filename), st.st_mtime, st.st_size)
+    except OSError:
+        return 0
+    if key not in _PDF_PAGE_COUNT_CACHE:
+        _PDF_PAGE_COUNT_CACHE[key] = _read_pdf_page_count(filename)
+    return _PDF_PAGE_COUNT_CACHE[key]
+
+def _read_pdf_page_count(filename):
+    """
+    Liczba stron z drzewa stron: startxref -> tablice / strumienie xref (z /Prev)
+    -> /Root -> /Pages -> /Count. Plik jest mapowany (mmap) i czytane są tylko
+    potrzebne fragmenty, więc pamięć nie zależy od rozmiaru pliku (także wiele GB).
+    Obsługuje strumienie obiektów i xref (PDF 1.5+); przy uszkodzonej strukturze
+    wraca do wyszukiwania wzorców w całym pliku.
+    """
+    try:
+        with open(filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # startxref, a gdy wskazuje źle: ostatnia sekcja odsyłaczy znaleziona w pliku
+                for find_start in (lambda: None, lambda: PdfXref.last_section(data)):
+                    try:
+                        count = PdfXref(data, find_start()).page_count()
+                        if count > 0: return count
+                    except Exception:
+                        pass
+                return _scan_pdf_page_count(data)
+    except Exception:
+        return 0
+
+def _scan_pdf_page_count(data):
+    """Awaryjnie: największe /Count węzła /Pages albo liczba obiektów /Page"""
+    counts = [int(x) for x in re.findall(rb"/Type\s*/Pages\b[^>]*\/Count\s+(\d+)", data)]
+    if counts:
+        return max(counts)
+    return len(re.findall(rb"/Type\s*/Page\b", data))
+
+class PdfXref:
+    """
+    Minimalny czytnik struktury PDF - tylko to, czego wymaga liczba stron:
+    odsyłacze (klasyczne tablice i strumienie xref z predyktorem PNG),
+    strumienie obiektów i słowniki najwyższego poziomu obiektu.
+    data: bytes albo mmap.
+    """
+
+    def __init__(self, data, start=None):
+        self.data = data
+        self.sections = [] # Sekcje odsyłaczy od najnowszej; wpisy odczytywane dopiero przy get()
+        self.trailer = {} # /Root, /Size z najnowszej sekcji
+        self._objstm = {}
+        if start is None:
+            tail = data[max(0, len(data) - 4096):]
+            m = list(re.finditer(rb"startxref\s+(\d+)", tail))
+            if not m:
+                raise ValueError("Brak startxref")
+            start = int(m[-1].group(1))
+        pos, seen = start, set()
+        while pos is not None and pos not in seen:
+            seen.add(pos)
+            pos = self._read_section(pos)
+
+    @staticmethod
+    def last_section(data):
+        """Położenie ostatniej tablicy xref albo obiektu strumienia /XRef (naprawa złego startxref)"""
+        table = data.rfind(b"\nxref")
+        table = table + 1 if table >= 0 else -1
+        stream, idx = -1, data.rfind(b"/XRef")
+        while idx >= 0 and stream < 0:
+            # Nagłówek "N G obj <<" tuż przed /Type /XRef (w obrębie słownika)
+            lo = max(0, idx - 256)
+            heads = list(re.finditer(rb"\d+\s+\d+\s+obj\s*<<", data[lo:idx]))
+            if heads and b"endobj" not in data[lo + heads[-1].end():idx]:
+                stream = lo + heads[-1].start()
+            idx = data.rfind(b"/XRef", 0, idx)
+        start = max(table, stream)
+        return start if start >= 0 else None
+
+    # Słowniki i obiekty
+    def _dict_at(self, pos):
+        """Słownik << ... >> zaczynający się od pos (z zagnieżdżeniami): (bajty, koniec)"""
+        data = self.data
+        start = data.find(b"<<", pos)
+        if start < 0: raise ValueError("Brak słownika")
+        depth, i = 0, start
+        while True:
+            lt, gt = data.find(b"<<", i), data.find(b">>", i)
+            if gt < 0: raise ValueError("Niedomknięty słownik")
+            if 0 <= lt < gt:
+                depth, i = depth + 1, lt + 2
+            else:
+                depth, i = depth - 1, gt + 2
+                if depth == 0:
+                    return bytes(data[start:i]), i
+
+    @staticmethod
+    def _key(d, key, ref=False):
+        if ref:
+            m = re.search(rb"/" + key + rb"\s+(\d+)\s+(\d+)\s+R", d)
+            return int(m.group(1)) if m else None
+        m = re.search(rb"/" + key + rb"\s+(\d+)(?![\d.])(?!\s+\d+\s+R)", d)
+        return int(m.group(1)) if m else None
+
+    def _stream(self, d, end):
+        """Zdekodowana zawartość strumienia, którego słownik kończy się w end"""
+        data = self.data
+        m = re.compile(rb"\s*stream\r?\n").match(data, end)
+        if not m: raise ValueError("Brak strumienia")
+        length = self._key(d, b"Length")
+        if length is None:
+            ref = self._key(d, b"Length", ref=True)
+            length = int(self.get(ref).split()[0]) if ref else data.find(b"endstream", m.end()) - m.end()
+        raw = bytes(data[m.end():m.end() + length])
+        if re.search(rb"/Filter\s*\[?\s*/FlateDecode", d):
+            raw = zlib.decompress(raw)
+        elif b"/Filter" in d:
+            raise ValueError("Nieobsługiwany filtr")
+        predictor = self._key(d, b"Predictor") or 1
+        if predictor >= 10:
+            raw = self._png_unpredict(raw, self._key(d, b"Columns") or 1)
+        return raw
+
+    @staticmethod
+    def _png_unpredict(raw, columns):
+        """Predyktor PNG: None/Sub/Up; Up dodaje wiersze bajtami naraz (liczby całkowite, bez przeniesień)"""
+        stride = columns + 1
+        low = int.from_bytes(b"\x7f" * columns, "big")
+        high = int.from_bytes(b"\x80" * columns, "big")
+        prev, out = 0, bytearray()
+        for r in range(len(raw) // stride):
+            ftype = raw[r * stride]
+            row = raw[r * stride + 1:(r + 1) * stride]
+            if ftype == 2:
+                a = int.from_bytes(row, "big")
+                prev = ((a & low) + (prev & low)) ^ ((a ^ prev) & high)
+            elif ftype == 1:
+                row = bytearray(row)
+                for i in range(1, columns): row[i] = (row[i] + row[i - 1]) & 0xFF
+                prev = int.from_bytes(row, "big")
+            elif ftype == 0:
+                prev = int.from_bytes(row, "big")
+            else:
+                raise ValueError(f"Nieobsługiwany predyktor PNG {ftype}")
+            out += prev.to_bytes(columns, "big")
+        return bytes(out)
+
+    def _obj_at(self, pos):
+        """Treść obiektu od nagłówka 'N G obj' w pos"""
+        m = re.compile(rb"\s*\d+\s+\d+\s+obj\s*").match(self.data, pos)
+        if not m: raise ValueError(f"Brak obiektu w {pos}")
+        return m.end()
+
+    def entry(self, num):
+        """Położenie obiektu: offset (int), (strumień obiektów, indeks) albo None (wolny / brak)"""
+        for kind, table in self.sections:
+            if kind == "table":
+                for first, count, pos, width in table:
+                    if first <= num < first + count:
+                        off, _, typ = bytes(self.data[pos + (num - first) * width:pos + (num - first + 1) * width]).split()[:3]
+                        return int(off) if typ == b"n" else None
+            else:
+                body, widths, index = table
+                row, pos = sum(widths), 0
+                for first, count in zip(index[0::2], index[1::2]):
+                    if first <= num < first + count:
+                        p, fields = pos + (num - first) * row, []
+                        for w in widths:
+                            fields.append(int.from_bytes(body[p:p + w], "big") if w else None)
+                            p += w
+                        ftype = 1 if fields[0] is None else fields[0]
+                        return fields[1] if ftype == 1 else (fields[1], fields[2]) if ftype == 2 else None
+                    pos += count * row
+        return None
+
+    def get(self, num):
+        """Treść obiektu num (bajty od początku wartości)"""
+        entry = self.entry(num)
+        if entry is None:
+            raise KeyError(num)
+        if isinstance(entry, int):
+            start = self._obj_at(entry)
+            end = self.data.find(b"endobj", start)
+            return bytes(self.data[start:end if end > 0 else start + 4096])
+        stm, idx = entry
+        if stm not in self._objstm:
+            d, end = self._dict_at(self._obj_at(self.entry(stm)))
+            body = self._stream(d, end)
+            n, first = self._key(d, b"N"), self._key(d, b"First")
+            head = [int(x) for x in body[:first].split()[:2 * n]]
+            self._objstm[stm] = (body, first, head[1::2])
+        body, first, offs = self._objstm[stm]
+        stop = first + offs[idx + 1] if idx + 1 < len(offs) else len(body)
+        return body[first + offs[idx]:stop]
+
+    # Odsyłacze
+    def _read_section(self, pos):
+        """Dodaje sekcję odsyłaczy z pos (po nowszych, więc ich nie przesłania); zwraca /Prev"""
+        data = self.data
+        while data[pos:pos + 1] in (b" ", b"\r", b"\n", b"\t"): pos += 1
+        if data[pos:pos + 4] == b"xref":
+            # Podsekcje: nagłówek "pierwszy liczba" i wpisy o stałej długości (zwykle 20 bajtów)
+            table, head = [], re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*(?:\r\n|\r|\n)")
+            pos += 4
+            while True:
+                m = head.match(data, pos)
+                if not m: break
+                first, count = int(m.group(1)), int(m.group(2))
+                eol = data.find(b"\n", m.end())
+                width = eol + 1 - m.end() if count and eol - m.end() < 22 else 20
+                table.append((first, count, m.end(), width))
+                pos = m.end() + count * width
+            end = data.find(b"trailer", pos)
+            if end < 0: raise ValueError("Brak słownika trailer")
+            self.sections.append(("table", table))
+            d, _ = self._dict_at(end)
+            stm = self._key(d, b"XRefStm") # Plik hybrydowy: uzupełniający strumień xref
+            if stm is not None:
+                self._read_section(stm)
+        else:
+            d, end = self._dict_at(self._obj_at(pos))
+            widths = [int(x) for x in re.search(rb"/W\s*\[([^\]]*)\]", d).group(1).split()]
+            m = re.search(rb"/Index\s*\[([^\]]*)\]", d)
+            index = [int(x) for x in m.group(1).split()] if m else [0, self._key(d, b"Size")]
+            self.sections.append(("stream", (self._stream(d, end), widths, index)))
+        for key in (b"Root", b"Size"):
+            if key not in self.trailer:
+                value = self._key(d, key, ref=(key == b"Root"))
+                if value is not None: self.trailer[key] = value
+        return self._key(d, b"Prev")
+
+    def page_count(self):
+        catalog = self.get(self.trailer[b"Root"])
+        pages = self.get(self._key(catalog, b"Pages", ref=True))
+        count = self._key(pages, b"Count")
+        if count is None:
+            ref = self._key(pages, b"Count", ref=True)
+            count = int(self.get(ref).split()[0])
+        return count
+
+# --- ŹRÓDŁA STRON ---
+
+def natural_sort_key(text):
+    """Klucz sortowania z liczbami porównywanymi jako liczby: rozdz2 < rozdz10"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", text)]
+
+class PageSource:
+    """
+    Leniwa sekwencja stron złożona z wielu źródeł (np. rozdziałów książki).
+    Źródło to ścieżka PDF, {"file": ścieżka, "pages": N} albo {"blank": N}
+    (wstawione puste strony). Strony numerowane są globalnie od 1;
+    resolve(n) zwraca (plik, strona w pliku) albo None dla pustej strony.
+    Liczba stron pliku jest ustalana dopiero wtedy, gdy jest potrzebna
+    (chyba że podano "pages"), i zapamiętywana.
+    """
+
+    def __init__(self, sources, counter=None):
+        self.specs = [self._norm(s) for s in sources]
+        self._counter = counter or get_pdf_page_count
+        self._ends = [] # Ostatnia globalna strona kolejnych źródeł (uzupełniane leniwie)
+
+    @staticmethod
+    def _norm(spec):
+        if isinstance(spec, str):
+            return {"file": spec.replace("\\", "/")}
+        spec = dict(spec)
+        if "blank" in spec:
+            return {"blank": max(0, int(spec["blank"]))}
+        if not spec.get("file"):
+            raise ValueError(f"Nieprawidłowe źródło stron: {spec}")
+        spec["file"] = spec["file"].replace("\\", "/")
+        return spec
+
+    def _count(self, spec):
+        if "blank" in spec: return spec["blank"]
+        n = int(spec.get("pages") or 0) or self._counter(spec["file"])
+        if n <= 0:
+            raise ValueError(f"Nie można ustalić liczby stron: {spec['file']}")
+        return n
+
+    def _extend(self, page=None):
+        """Ustala liczby stron kolejnych źródeł, aż do strony page (None = wszystkich)"""
+        while len(self._ends) < len(self.specs):
+            if page is not None and self._ends and self._ends[-1] >= page:
+                break
+            prev = self._ends[-1] if self._ends else 0
+            self._ends.append(prev + self._count(self.specs[len(self._ends)]))
+
+    def __len__(self):
+        self._extend()
+        return self._ends[-1] if self._ends else 0
+
+    def __repr__(self):
+        return f"PageSource({self.specs!r})"
+
+    def resolve(self, page):
+        """Globalny numer strony -> (plik, strona w pliku) albo None (pusta strona)"""
+        if page is None or page < 1: return None
+        self._extend(page)
+        i = bisect.bisect_left(self._ends, page)
+        if i >= len(self._ends): return None
+        spec = self.specs[i]
+        if "blank" in spec: return None
+        start = self._ends[i - 1] if i else 0
+        return (spec["file"], page - start)
+
+    def counted_specs(self):
+        """
+        Źródła z ustalonymi już liczbami stron zapisanymi jako "pages" - nowy
+        PageSource z tej listy (np. w JobContext) nie otwiera plików ponownie.
+        """
+        out = []
+        for i, spec in enumerate(self.specs):
+            if "file" in spec and i < len(self._ends):
+                spec = dict(spec, pages=self._ends[i] - (self._ends[i - 1] if i else 0))
+            out.append(spec)
+        return out
+
+    def files(self):
+        """Pliki źródłowe w kolejności (bez powtórzeń)"""
+        out = []
+        for spec in self.specs:
+            f = spec.get("file")
+            if f and f not in out: out.append(f)
+        return out
+
+class PageSequence:
+    """
+    Kolejność stron zapisana wyrażeniem, np. "1-4,blank*2,5-200,r10-1,@rozdz2.pdf:1-32".
+    Elementy oddzielone przecinkami:
+      N, A-B        strona / zakres (A > B - malejąco)
+      z, rN         ostatnia strona / N-ta strona od końca (jak w qpdf)
+      blank         pusta strona
+      @plik:A-B     strony innego pliku PDF (samo @plik - wszystkie)
+      X*K           element powtórzony K razy
+    Wyrażenie jest kompilowane do segmentów arytmetycznych (źródło, pierwsza
+    strona, krok, liczba, powtórzenia) - lista stron nie jest rozwijana.
+    resolve(n) zamienia pozycję w planie (od 1) na stronę głównego źródła,
+    (plik, strona) albo None (pusta strona).
+    """
+
+    def __init__(self, segments):
+        self.segments = [tuple(seg) for seg in segments]
+        self._ends = []
+        total = 0
+        for src, first, step, count, repeat in self.segments:
+            total += count * repeat
+            self._ends.append(total)
+
+    @classmethod
+    def parse(cls, expr, main_pages=None, base_dir=None, counter=None):
+        """
+        Kompiluje wyrażenie. main_pages - liczba stron głównego źródła (kontrola
+        zakresu, z/rN); liczba stron innych plików jest odczytywana tylko wtedy,
+        gdy jest potrzebna (z, rN, samo @plik).
+        """
+        counter = counter or get_pdf_page_count
+        segments = []
+        for term in str(expr).split(","):
+            term = term.strip()
+            if not term: continue
+            repeat = 1
+            m = re.match(r"^(.*?)\s*\*\s*(\d+)$", term)
+            if m:
+                term, repeat = m.group(1).strip(), int(m.group(2))
+            if term.lower() == "blank":
+                segments.append((None, 0, 0, 1, repeat))
+                continue
+            
+            src, rng, limit = None, term, main_pages
+            if term.startswith("@"):
+                m = re.match(r"^@(.+):([\drRzZ]+(?:\s*-\s*[\drRzZ]+)?)$", term)
+                src, rng = (m.group(1), m.group(2)) if m else (term[1:], "1-z")
+                src = src.strip().replace("\\", "/")
+                if base_dir and not os.path.isabs(src):
+                    src = os.path.join(base_dir, src).replace("\\", "/")
+                limit = None # Odczytywana leniwie
+            
+            ends = [e.strip() for e in rng.split("-")]
+            if len(ends) > 2 or not all(ends):
+                raise ValueError(f"Błędny zakres stron: {term}")
+            
+            def page_no(tok, src=src):
+                nonlocal limit
+                tok = tok.lower()
+                if tok == "z" or tok.startswith("r"):
+                    if limit is None and src is not None:
+                        limit = counter(src) or None
+                    if limit is None:
+                        raise ValueError(f"Nieznana liczba stron dla '{tok}' w: {term}")
+                    if tok == "z": return limit
+                    if not tok[1:].isdigit():
+                        raise ValueError(f"Błędny numer strony: {tok}")
+                    return limit - int(tok[1:]) + 1
+                if not tok.isdigit():
+                    raise ValueError(f"Błędny numer strony: {tok}")
+                return int(tok)
+            
+            a = page_no(ends[0])
+            b = page_no(ends[-1])
+            for n in (a, b):
+                if n < 1 or (limit is not None and n > limit):
+                    raise ValueError(f"Strona {n} poza zakresem w: {term}")
+            step = 1 if b >= a else -1
+            segments.append((src, a, step, abs(b - a) + 1, repeat))
+        return cls(segments)
+
+    def __len__(self):
+        return self._ends[-1] if self._ends else 0
+
+    def __repr__(self):
+        return f"PageSequence({self.segments!r})"
+
+    def __iter__(self):
+        for src, first, step, count, repeat in self.segments:
+            for _ in range(repeat):
+                for k in range(count):
+                    yield self._ref(src, first + step * k if first else 0)
+
+    @staticmethod
+    def _ref(src, page):
+        if not page: return None
+        return page if src is None else (src, page)
+
+    def resolve(self, pos):
+        """Pozycja w planie (od 1) -> strona, (plik, strona) albo None"""
+        if pos is None or not 1 <= pos <= len(self): return None
+        i = bisect.bisect_left(self._ends, pos)
+        src, first, step, count, repeat = self.segments[i]
+        k = (pos - 1 - (self._ends[i - 1] if i else 0)) % count
+        return self._ref(src, first + step * k if first else 0)
+
+class PaddedPages:
+    """Widok sekwencji stron dopełnionej pustymi stronami (None) do długości length"""
+
+    def __init__(self, pages, length):
+        self.pages = pages
+        self._n = len(pages)
+        self.length = length
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in range(*i.indices(self.length))]
+        if i < 0: i += self.length
+        if not 0 <= i < self.length:
+            raise IndexError("PaddedPages index out of range")
+        return self.pages[i] if i < self._n else None
+
+# Mapowanie formatów arkusza na wymiary (w mm, pionowo)
+SHEET_SIZES = {
+    "A4": (210.0, 297.0),
+    "A3": (297.0, 420.0),
+    "A2": (420.0, 594.0),
+    "SRA3": (320.0, 450.0),
+    "B1": (700.0, 1000.0),
+    "RA1": (610.0, 860.0),
+    "B2": (500.0, 707.0),
+    "B3": (353.0, 500.0)
+}
+
 class ImpositionEngine:
     """
     Silnik obliczający układ stron na arkuszach dla różnych metod impozycji.
@@ -41,6 +586,54 @@ class ImpositionEngine:
     METHOD_WORK_TURN = "Obracanie (Work-and-Turn) - Przez bok"
     METHOD_WORK_TUMBLE = "Przewracanie (Work-and-Tumble) - Przez głowę"
     METHOD_SINGLE = "Jednostronnie (Simplex)"
+    
+    # Krótkie nazwy dla biletów zadań (tryb wsadowy / serwer)
+    TYPE_ALIASES = {
+        "saddle": TYPE_SADDLE,
+        "perfect": TYPE_PERFECT,
+        "cut_stack": TYPE_CUT_STACK,
+        "n_up": TYPE_N_UP
+    }
+    METHOD_ALIASES = {
+        "sheetwise": METHOD_SHEETWISE,
+        "work_turn": METHOD_WORK_TURN,
+        "work_tumble": METHOD_WORK_TUMBLE,
+        "single": METHOD_SINGLE
+    }
+
+    # Katalog falcowania: cała składka na jednym arkuszu (schematy z falcowaniem
+    # krzyżowym, wszystkie złamy "pod spód", ostatni złam = grzbiet).
+    # front/back: numery stron składki w siatce rows x cols, tył widziany po
+    # odwróceniu arkusza przez bok; inverted_rows: wiersze obrócone o 180°
+    # (głowa do głowy). Para stron (1-2, 3-4...) leży w lustrzanej kolumnie tyłu.
+    FOLD_CATALOG = {
+        "F4": {"pages": 4, "cols": 2, "rows": 1,
+               "front": ((4, 1),),
+               "back": ((2, 3),),
+               "inverted_rows": ()},
+        "F8": {"pages": 8, "cols": 2, "rows": 2,
+               "front": ((5, 4),
+                         (8, 1)),
+               "back": ((3, 6),
+                        (2, 7)),
+               "inverted_rows": (0,)},
+        "F16": {"pages": 16, "cols": 4, "rows": 2,
+                "front": ((5, 12, 9, 8),
+                          (4, 13, 16, 1)),
+                "back": ((7, 10, 11, 6),
+                         (2, 15, 14, 3)),
+                "inverted_rows": (0,)},
+        "F32": {"pages": 32, "cols": 4, "rows": 4,
+                "front": ((5, 28, 29, 4),
+                          (12, 21, 20, 13),
+                          (9, 24, 17, 16),
+                          (8, 25, 32, 1)),
+                "back": ((3, 30, 27, 6),
+                         (14, 19, 22, 11),
+                         (15, 18, 23, 10),
+                         (2, 31, 26, 7)),
+                "inverted_rows": (0, 2)},
+    }
 
     def __init__(self):
         pass
@@ -55,6 +648,15 @@ class ImpositionEngine:
         ]
         Gdzie PageItem to krotka: (numer_strony, x_ratio, y_ratio, w_ratio, h_ratio, rotacja)
         """
+        # Obracanie / przewracanie: plan dwustronny składany w jedną formę
+        if print_method in (self.METHOD_WORK_TURN, self.METHOD_WORK_TUMBLE):
+            plan = self.calculate(imp_type, self.METHOD_SHEETWISE, total_pages, params)
+            return self._calc_work_form(plan, tumble=(print_method == self.METHOD_WORK_TUMBLE))
+        
+        # Cięcie i stos: plan liczony arytmetycznie, bez listy stron
+        if imp_type == self.TYPE_CUT_STACK:
+            return self._calc_cut_stack(total_pages, print_method, params.get('cols', 2), params.get('rows', 1))
+        
         # Normalizacja liczby stron
         pages = self._get_page_list(total_pages)
         
@@ -63,25 +665,28 @@ class ImpositionEngine:
             return self._calc_saddle(pages, print_method)
         elif imp_type == self.TYPE_PERFECT:
             sig_size = params.get('sig_size', 16)
-            return self._calc_perfect(pages, print_method, sig_size)
-        elif imp_type == self.TYPE_CUT_STACK:
-            return self._calc_cut_stack(pages, print_method)
+            fold = params.get('fold', False)
+            if params.get('mixed_sigs'):
+                sig_plan = self.plan_signatures(len(pages), sig_size, params.get('sig_sizes'))
+                return self._calc_perfect(pages, print_method, sig_size, sig_plan, fold)
+            return self._calc_perfect(pages, print_method, sig_size, fold=fold)
         elif imp_type == self.TYPE_N_UP:
             cols = params.get('cols', 2)
             rows = params.get('rows', 1)
+            if params.get('step_repeat'):
+                return self._calc_step_repeat(pages, print_method, cols, rows)
             return self._calc_n_up(pages, print_method, cols, rows)
         
         return []
 
     def _get_page_list(self, count):
-        return list(range(1, count + 1))
+        return range(1, count + 1)
 
     def _pad_pages(self, pages, multiple):
-        """Dopełnia listę stron pustymi stronami (None) do wielokrotności"""
-        p = list(pages)
-        while len(p) % multiple != 0:
-            p.append(None)
-        return p
+        """Dopełnia sekwencję stron pustymi stronami (None) do wielokrotności - bez kopiowania"""
+        n = len(pages)
+        target = -(-n // multiple) * multiple
+        return pages if target == n else PaddedPages(pages, target)
 
     def _create_item(self, page, x, y, w, h, rot=0):
         return (page, x, y, w, h, rot)
@@ -145,77 +750,129 @@ class ImpositionEngine:
             
         return sheets
 
-    def _calc_perfect(self, pages, method, sig_size):
-        """Impozycja Klejona (Składkowa)"""
+    def plan_signatures(self, total_pages, sig_size, allowed=None):
+        """
+        Dobiera mieszankę składek (np. 6x32 + 4 dla 196 stron), aby uniknąć
+        pustych stron na końcu książki. Ograniczenia maszyny/falcerki to lista
+        dozwolonych rozmiarów składki (wielokrotności 4, nie większe niż sig_size);
+        domyślnie sig_size i jego kolejne połówki (32, 16, 8, 4).
+        Programowanie dynamiczne: najmniej pustych stron, potem najmniej składek.
+        Zwraca listę rozmiarów składek - duże na początku, małe na końcu.
+        """
+        if sig_size % 4 != 0: sig_size = 16
+        if allowed:
+            sizes = sorted({int(a) for a in allowed if a % 4 == 0 and 0 < a <= sig_size}, reverse=True)
+        else:
+            sizes = []
+            s = sig_size
+            while s >= 4 and s % 4 == 0:
+                sizes.append(s)
+                s //= 2
+        if not sizes: sizes = [sig_size]
+        
+        # Najmniejsza osiągalna liczba stron >= total_pages (dopełnienie do najmniejszej składki)
+        step = min(sizes)
+        limit = -(-max(total_pages, 1) // step) * step + max(sizes)
+        
+        # best[t] = (liczba_składek, ostatnia_składka) dla sumy dokładnie t stron
+        best = [None] * (limit + 1)
+        best[0] = (0, 0)
+        for t in range(step, limit + 1, 4):
+            for sz in sizes:
+                if sz <= t and best[t - sz] is not None:
+                    cand = best[t - sz][0] + 1
+                    if best[t] is None or cand < best[t][0]:
+                        best[t] = (cand, sz)
+        
+        target = next(t for t in range(max(total_pages, 1), limit + 1) if best[t] is not None)
+        
+        plan = []
+        t = target
+        while t > 0:
+            sz = best[t][1]
+            plan.append(sz)
+            t -= sz
+        return sorted(plan, reverse=True)
+
+    def _calc_perfect(self, pages, method, sig_size, sig_plan=None, fold=False):
+        """
+        Impozycja Klejona (Składkowa).
+        fold=True: składka o rozmiarze z katalogu falcowania (F4/F8/F16/F32)
+        trafia w całości na jeden arkusz; inne rozmiary - zagnieżdżone arkusze 2-stronne.
+        """
         # Dzielimy na składki (signatures)
         if sig_size % 4 != 0: sig_size = 16
         pages = self._pad_pages(pages, 4)
         
-        # Dopełnij do pełnych składek
-        while len(pages) % sig_size != 0:
-            pages.append(None)
+        if sig_plan:
+            # Mieszane składki (np. 6x32 + 4) - dopełnienie tylko do sumy planu
+            pages = self._pad_pages(pages, sum(sig_plan))
+            chunks = []
+            start = 0
+            for sz in sig_plan:
+                chunks.append(pages[start:start + sz])
+                start += sz
+        else:
+            # Dopełnij do pełnych składek
+            pages = self._pad_pages(pages, sig_size)
             
-        chunks = [pages[i:i + sig_size] for i in range(0, len(pages), sig_size)]
+            chunks = [pages[i:i + sig_size] for i in range(0, len(pages), sig_size)]
         all_sheets = []
         total_sigs = len(chunks)
         
         for i, chunk in enumerate(chunks):
+            scheme = f"F{len(chunk)}"
+            if fold and scheme in self.FOLD_CATALOG:
+                all_sheets.extend(self._calc_folded(chunk, method, scheme, i, total_sigs))
+                continue
+            
             # Każda składka jest jak mała broszura
             sub_sheets = self._calc_saddle(chunk, method, sig_idx=i, total_sigs=total_sigs)
+            for sh in sub_sheets:
+                sh["sig_pages"] = len(chunk)
             all_sheets.extend(sub_sheets)
             
         return all_sheets
 
-    def _calc_cut_stack(self, pages, method):
-        """Impozycja Cut & Stack (2-up)"""
-        # Dzielimy stos na dwie połowy: Góra (1..N/2) i Dół (N/2+1..N)
-        pages = self._pad_pages(pages, 2)
-        half = len(pages) // 2
+    def _calc_folded(self, chunk, method, scheme, sig_idx=0, total_sigs=1):
+        """Jedna składka według schematu z FOLD_CATALOG (arkusz przód/tył)"""
+        spec = self.FOLD_CATALOG[scheme]
+        cols, rows = spec["cols"], spec["rows"]
+        w = 1.0 / cols
+        h = 1.0 / rows
         
-        stack_1 = pages[:half]
-        stack_2 = pages[half:]
+        def side(grid):
+            items = []
+            for r, row in enumerate(grid):
+                rot = 180 if r in spec["inverted_rows"] else 0
+                for c, n in enumerate(row):
+                    items.append(self._create_item(chunk[n - 1], c * w, r * h, w, h, rot))
+            return items
         
-        sheets = []
-        
-        # Dla druku dwustronnego (dupleks) bierzemy pary (Przód, Tył) z każdego stosu
-        # Stos 1: [1, 2], [3, 4]...
-        # Stos 2: [51, 52], [53, 54]...
-        
-        # Jeśli druk jednostronny:
-        # Arkusz 1: [1, 51]
-        # Arkusz 2: [2, 52]
-        
-        step = 2 if method != self.METHOD_SINGLE else 1
+        # Grzbiet składki leży między ostatnią a pierwszą stroną (zewnętrzny złam)
+        r1 = next(r for r, row in enumerate(spec["front"]) if 1 in row)
+        c1 = spec["front"][r1].index(1)
         
-        for i in range(0, len(stack_1), step):
-            p1 = stack_1[i]
-            p2 = stack_2[i]
-            
-            # Przód Arkusza
-            front = [
-                self._create_item(p1, 0.0, 0.0, 0.5, 1.0), # Lewa (Stos 1)
-                self._create_item(p2, 0.5, 0.0, 0.5, 1.0)  # Prawa (Stos 2)
-            ]
-            
-            back = []
-            if method != self.METHOD_SINGLE and (i+1 < len(stack_1)):
-                p1_back = stack_1[i+1]
-                p2_back = stack_2[i+1]
-                
-                # Tył Arkusza (Dupleks)
-                # Rewers strony 1 to strona 2.
-                # W druku przez przewracanie (Sheetwise), strona 2 musi być pod stroną 1.
-                # Jeśli Przód to [1 | 51], to Tył (patrząc na arkusz) to [52 | 2] 
-                # (żeby po obróceniu 2 trafiło pod 1, a 52 pod 51)
-                
-                back = [
-                    self._create_item(p2_back, 0.0, 0.0, 0.5, 1.0), # Lewa (Tył Stosu 2)
-                    self._create_item(p1_back, 0.5, 0.0, 0.5, 1.0)  # Prawa (Tył Stosu 1)
-                ]
-            
-            sheets.append({"front": front, "back": back})
-            
-        return sheets
+        meta = {
+            "sig_idx": sig_idx,
+            "total_sigs": total_sigs,
+            "sig_pages": spec["pages"],
+            "fold": scheme,
+            "spines": [c1 * w], # Linia grzbietu (znaczniki falcowania)
+            "collation": (c1 * w, r1 * h, (r1 + 1) * h) # Grzbiet zewnętrzny: x, y od, y do
+        }
+        front, back = side(spec["front"]), side(spec["back"])
+        if method == self.METHOD_SINGLE:
+            return [{"front": front, "back": [], **meta}, {"front": back, "back": [], **meta}]
+        return [{"front": front, "back": back, **meta}]
+
+    def _calc_cut_stack(self, total_pages, method, cols=2, rows=1):
+        """
+        Impozycja Cut & Stack dla siatki cols x rows.
+        Zwraca leniwy plan (CutStackPlan) - arkusze wyliczane są przy odczycie,
+        więc plan dla 100 tys. stron zajmuje stałą ilość pamięci.
+        """
+        return CutStackPlan(total_pages, method == self.METHOD_SINGLE, max(1, int(cols)), max(1, int(rows)))
 
     def _calc_n_up(self, pages, method, cols, rows):
         """Impozycja N-up (Siatka)"""
@@ -226,42 +883,36 @@ class ImpositionEngine:
         # Zakładamy tryb książki (unikalne strony po kolei)
         pages = self._pad_pages(pages, per_sheet if method == self.METHOD_SINGLE else per_sheet * 2)
         
+        # Dupleks: przód dostaje strony nieparzyste, a strona-para (parzysta)
+        # ląduje na tyle dokładnie za nią
+        step = 1 if method == self.METHOD_SINGLE else 2
+        
+        # Siatka liczona raz: arkusze dzielą te same liczby zamiast tworzyć je na nowo
+        w = 1.0 / cols
+        h = 1.0 / rows
+        grid = [[(c * w, r * h) for c in range(cols)] for r in range(rows)]
+        
         idx = 0
         while idx < len(pages):
             front_items = []
             back_items = []
             
+            # Buforujemy stronę tyłu
+            back_page_grid = [[None for _ in range(cols)] for _ in range(rows)]
+            
             # Wypełnianie przodu
             for r in range(rows):
                 for c in range(cols):
-                    if idx < len(pages):
-                        w = 1.0 / cols
-                        h = 1.0 / rows
-                        x = c * w
-                        y = r * h
-                        front_items.append(self._create_item(pages[idx], x, y, w, h))
-                        idx += 1
+                    x, y = grid[r][c]
+                    front_items.append(self._create_item(pages[idx], x, y, w, h))
+                    if step == 2:
+                        back_page_grid[r][c] = pages[idx + 1]
+                    idx += step
             
             # Wypełnianie tyłu (jeśli nie simplex)
             if method != self.METHOD_SINGLE:
-                # Dla tyłu musimy odwrócić kolejność kolumn (lustrzane odbicie), 
-                # aby strona 2 trafiła na plecy strony 1
-                # Ale tutaj po prostu bierzemy kolejne strony z listy.
-                
-                # Buforujemy stronę tyłu
-                back_page_grid = [[None for _ in range(cols)] for _ in range(rows)]
-                
-                for r in range(rows):
-                    for c in range(cols):
-                        if idx < len(pages):
-                            back_page_grid[r][c] = pages[idx]
-                            idx += 1
-                            
                 # Generujemy items z uwzględnieniem lustrzanego odbicia kolumn
                 # Kolumna 0 na Tyle to plecy Kolumny (Max) na Przodzie.
-                # Jeśli Przód [1][2], to Tył [4][3] -> 3 pod 1, 4 pod 2? Nie.
-                # Przód: [1 2]
-                # Tył:   [2 1] (żeby 2 było za 1)? Nie, to kolejne strony.
                 # Przód: [1 3]
                 #        [5 7]
                 # Tył:   [4 2]
@@ -272,11 +923,7 @@ class ImpositionEngine:
                         # Lustrzana kolumna
                         mirror_c = (cols - 1) - c
                         pg = back_page_grid[r][mirror_c]
-                        
-                        w = 1.0 / cols
-                        h = 1.0 / rows
-                        x = c * w
-                        y = r * h
+                        x, y = grid[r][c]
                         
                         if pg is not None:
                             back_items.append(self._create_item(pg, x, y, w, h))
@@ -285,22 +932,703 @@ class ImpositionEngine:
             
         return sheets
 
+    def _calc_step_repeat(self, pages, method, cols, rows):
+        """Impozycja N-up z powielaniem (Step & Repeat) - np. wizytówki"""
+        # Każdy użytek na arkuszu to ta sama strona źródłowa (Przód),
+        # a na rewersie ta sama strona-para (Tył).
+        # Przy dupleksie para to (1, 2), (3, 4)... - jeden arkusz na wzór.
+        w = 1.0 / cols
+        h = 1.0 / rows
+        step = 1 if method == self.METHOD_SINGLE else 2
+        pages = self._pad_pages(pages, step)
+        sheets = []
+        
+        for idx in range(0, len(pages), step):
+            p_front = pages[idx]
+            p_back = pages[idx + 1] if step == 2 else None
+            
+            front_items = []
+            back_items = []
+            for r in range(rows):
+                for c in range(cols):
+                    front_items.append(self._create_item(p_front, c * w, r * h, w, h))
+                    # Tył powielany - lustro kolumn niczego nie zmienia (wszędzie ta sama strona)
+                    if p_back is not None:
+                        back_items.append(self._create_item(p_back, c * w, r * h, w, h))
+            
+            sheets.append({"front": front_items, "back": back_items, "step_repeat": True})
+            
+        return sheets
+
+    def _calc_work_form(self, plan, tumble=False):
+        """
+        Zamienia plan dwustronny (Sheetwise) na formy z obracaniem lub przewracaniem:
+        przód i tył arkusza trafiają na jedną płytę, a arkusz drukowany jest nią
+        z obu stron i cięty na pół (dwa komplety z arkusza, połowa płyt i stron dokumentu).
+        
+        Obracanie (przez bok): przód w lewej połowie, tył w prawej - arkusz odwracany
+        wokół osi pionowej, więc tył (już lustrzany w planie Sheetwise) leży pod przodem.
+        Przewracanie (przez głowę): przód w górnej połowie, tył w dolnej, obrócony o 180°
+        (arkusz odwracany wokół osi poziomej).
+        """
+        forms = []
+        for sheet in plan:
+            items = []
+            for pg, x, y, w, h, rot in sheet["front"]:
+                if tumble:
+                    items.append(self._create_item(pg, x, y * 0.5, w, h * 0.5, rot))
+                else:
+                    items.append(self._create_item(pg, x * 0.5, y, w * 0.5, h, rot))
+            for pg, x, y, w, h, rot in sheet["back"]:
+                if tumble:
+                    # Plan Sheetwise ma tył lustrzany w poziomie - cofamy lustro i odwracamy w pionie
+                    items.append(self._create_item(pg, 1.0 - x - w, 0.5 + 0.5 * (1.0 - y - h), w, h * 0.5, (rot + 180) % 360))
+                else:
+                    items.append(self._create_item(pg, 0.5 + x * 0.5, y, w * 0.5, h, rot))
+            
+            meta = {k: v for k, v in sheet.items() if k not in ("front", "back", "collation")}
+            meta["work_form"] = "tumble" if tumble else "turn"
+            # Grzbiety (Creep, falcowanie): grzbiet przodu i lustrzany grzbiet tyłu
+            spines = sheet.get("spines", [0.5])
+            if tumble:
+                meta["spines"] = sorted(set(spines) | {1.0 - sx for sx in spines})
+            else:
+                meta["spines"] = [sx * 0.5 for sx in spines] + [0.5 + (1.0 - sx) * 0.5 for sx in spines]
+            forms.append({"front": items, "back": [], **meta})
+        return forms
+
+    # --- NUMERACJA ---
+    # Komplety (count > 0): jeden wzór o design_pages stronach źródła drukowany
+    # count razy. Plan liczony jest dla count * design_pages "wirtualnych" stron,
+    # a resolve_page sprowadza stronę planu pg do strony wzoru przez design_cycle:
+    # (pg - 1) % design_pages + 1. Komplet c (od 0) to strony planu
+    # c*design_pages + 1 .. (c+1)*design_pages; numer dostaje tylko pierwsza z nich.
+
+    NUMBERING_DEFAULTS = {
+        "start": 1,          # Pierwszy numer
+        "count": 0,          # Liczba numerowanych kompletów (0 = numer na każdej stronie)
+        "design_pages": 1,   # Stron źródłowych na komplet (bilet: 1, przód/tył: 2)
+        "digits": 6,         # Dopełnienie zerami
+        "prefix": "Nr ",
+        "x": 0.55, "y": 0.85, "w": 0.4, "h": 0.1, # Ramka numeru względem użytku
+        "size": 10.0,        # Stopień pisma (pt)
+    }
+
+    @classmethod
+    def numbering_spec(cls, numbering):
+        """Pełne ustawienia numeracji (z wartościami domyślnymi) albo None"""
+        if not numbering: return None
+        spec = dict(cls.NUMBERING_DEFAULTS)
+        spec.update(numbering)
+        spec["design_pages"] = max(1, int(spec["design_pages"]))
+        return spec
+
+    @classmethod
+    def numbered_page_count(cls, total_pages, numbering):
+        """
+        Liczba stron planu przy numeracji: count kompletów po design_pages stron
+        źródła (wzór powtarzany w planie), albo total_pages, gdy count == 0.
+        """
+        spec = cls.numbering_spec(numbering)
+        if spec and spec["count"] > 0:
+            return spec["count"] * spec["design_pages"]
+        return total_pages
+
+    @staticmethod
+    def number_text(pg, spec):
+        """
+        Numer dla strony planu pg (pierwsza strona kompletu) albo None.
+        Numery rosną z numerem strony, więc w Cut & Stack idą kolejno w stosie:
+        użytek k na arkuszu j to strona k*L + j + 1 (dupleks: k*L + 2j + 1 na
+        przodzie), czyli stos k niesie komplety k*L/d .. (k+1)*L/d - 1, a po
+        przecięciu i położeniu stosów na sobie numery tworzą jeden ciągły szereg.
+        Dupleksowy stos ma parzystą długość L, więc bilet przód/tył (d = 2) nie
+        rozdziela się między stosy; przy innych d komplet na granicy stosów
+        zaczyna się na końcu stosu k i kończy na początku stosu k+1.
+        """
+        if pg is None or isinstance(pg, tuple): return None
+        d = spec["design_pages"]
+        if (pg - 1) % d: return None # Tył / dalsze strony kompletu - bez numeru
+        return f"{spec['prefix']}{spec['start'] + (pg - 1) // d:0{spec['digits']}d}"
+
+    # --- OPTYMALIZACJA UKŁADU ---
+
+    def count_sheets(self, imp_type, print_method, total_pages, params):
+        """
+        Liczba arkuszy i form (płyt) dla danego układu - sama arytmetyka,
+        bez budowania planu. Zwraca krotkę (arkusze, formy).
+        """
+        n = total_pages
+        simplex = (print_method == self.METHOD_SINGLE)
+        
+        # Obracanie / przewracanie: jedna forma (płyta) na arkusz planu Sheetwise
+        if print_method in (self.METHOD_WORK_TURN, self.METHOD_WORK_TUMBLE):
+            sheets, _ = self.count_sheets(imp_type, self.METHOD_SHEETWISE, total_pages, params)
+            return sheets, sheets
+        
+        def ceil_to(v, m):
+            return -(-v // m) * m
+        
+        if n <= 0:
+            return 0, 0
+        
+        if imp_type in (self.TYPE_SADDLE, self.TYPE_PERFECT):
+            padded = ceil_to(n, 4)
+            if imp_type == self.TYPE_PERFECT:
+                sig_size = params.get('sig_size', 16)
+                if sig_size % 4 != 0: sig_size = 16
+                if params.get('mixed_sigs'):
+                    sig_plan = self.plan_signatures(n, sig_size, params.get('sig_sizes'))
+                else:
+                    sig_plan = [sig_size] * (ceil_to(padded, sig_size) // sig_size)
+                if params.get('fold'):
+                    # Składka z katalogu falcowania = jeden arkusz
+                    k = sum(1 if f"F{sz}" in self.FOLD_CATALOG else sz // 4 for sz in sig_plan)
+                    return (2 * k, 2 * k) if simplex else (k, 2 * k)
+                padded = max(padded, sum(sig_plan))
+            k = padded // 4
+            return (2 * k, 2 * k) if simplex else (k, 2 * k)
+        
+        if imp_type == self.TYPE_CUT_STACK:
+            stacks = params.get('cols', 2) * params.get('rows', 1)
+            per = -(-n // stacks)
+            if simplex:
+                return per, per
+            sheets = ceil_to(per, 2) // 2
+            return sheets, 2 * sheets
+        
+        if imp_type == self.TYPE_N_UP:
+            per = params.get('cols', 2) * params.get('rows', 1)
+            if params.get('step_repeat'):
+                return (n, n) if simplex else (-(-n // 2), n)
+            if simplex:
+                sheets = -(-n // per)
+                return sheets, sheets
+            sheets = -(-n // (2 * per))
+            # Tył istnieje, gdy na arkuszu jest choć jedna strona parzysta
+            backs = -(-(n - 1) // (2 * per))
+            return sheets, sheets + backs
+        
+        return 0, 0
+
+    def optimize_layout(self, imp_type, print_method, total_pages, page_w, page_h, params=None,
+                        gap=0.0, margin=10.0, formats=None, weights=None):
+        """
+        Przeszukuje formaty arkusza (SHEET_SIZES), orientacje i siatki użytków.
+        Ocenia każdy wariant liczbą arkuszy, form (płyt) i odpadem papieru.
+        Zwraca listę słowników posortowaną od najlepszego wariantu.
+        
+        Odcinanie: formaty, na których nie mieści się układ, są pomijane,
+        a dla N-up i cięcia-stosu liczona jest tylko największa mieszcząca się siatka
+        (mniejsza siatka na tym samym arkuszu nigdy nie da mniej arkuszy
+        ani mniejszego odpadu).
+        """
+        params = dict(params or {})
+        formats = formats or SHEET_SIZES
+        # Koszt umowny: forma (komplet płyt), arkusz, 100% odpadu
+        weights = weights or {"plates": 1.0, "sheets": 0.01, "waste": 20.0}
+        
+        slot_w = page_w + gap
+        slot_h = page_h + gap
+        page_area = page_w * page_h
+        results = []
+        
+        # Obracanie / przewracanie: układ Sheetwise zajmuje połowę arkusza
+        # (lewą/prawą albo górną/dolną), a arkusz daje dwa komplety
+        turn = (print_method == self.METHOD_WORK_TURN)
+        tumble = (print_method == self.METHOD_WORK_TUMBLE)
+        
+        for fmt, (fw, fh) in formats.items():
+            for orient in ("Portrait", "Landscape"):
+                sw, sh = (fh, fw) if orient == "Landscape" else (fw, fh)
+                avail_w = (sw - 2 * margin) / 2 if turn else sw - 2 * margin
+                avail_h = (sh - 2 * margin) / 2 if tumble else sh - 2 * margin
+                max_cols = int(avail_w // slot_w) if slot_w > 0 else 0
+                max_rows = int(avail_h // slot_h) if slot_h > 0 else 0
+                
+                if imp_type in (self.TYPE_N_UP, self.TYPE_CUT_STACK):
+                    cols, rows = max_cols, max_rows
+                elif imp_type == self.TYPE_PERFECT and params.get('fold') and f"F{params.get('sig_size', 16)}" in self.FOLD_CATALOG:
+                    # Cała składka na arkuszu - siatka ze schematu falcowania
+                    spec = self.FOLD_CATALOG[f"F{params.get('sig_size', 16)}"]
+                    cols, rows = spec["cols"], spec["rows"]
+                    if max_cols < cols or max_rows < rows: continue
+                else:
+                    # Broszura i klejona: zawsze 2 strony obok siebie
+                    cols, rows = 2, 1
+                    if max_cols < 2 or max_rows < 1: continue
+                
+                if cols < 1 or rows < 1: continue
+                
+                p = dict(params, cols=cols, rows=rows)
+                sheets, plates = self.count_sheets(imp_type, print_method, total_pages, p)
+                if sheets <= 0: continue
+                
+                sides = 1 if print_method == self.METHOD_SINGLE else 2
+                placed = total_pages
+                if imp_type == self.TYPE_N_UP and params.get('step_repeat'):
+                    placed = sheets * cols * rows * sides
+                if turn or tumble:
+                    placed *= 2 # Dwa komplety z arkusza
+                waste = 1.0 - (placed * page_area) / (sheets * sides * sw * sh)
+                waste = max(0.0, waste)
+                
+                score = (plates * weights["plates"] + sheets * weights["sheets"] + waste * weights["waste"])
+                results.append({
+                    "fmt": fmt, "orient": orient, "cols": cols, "rows": rows,
+                    "sheets": sheets, "plates": plates, "waste": waste, "score": score
+                })
+        
+        results.sort(key=lambda r: (r["score"], r["sheets"], r["fmt"]))
+        return results
+
+    # --- WERYFIKACJA PLANU ---
+
+    def verify_plan(self, plan, total_pages, print_method, max_errors=20):
+        """
+        Sprawdza plan w jednym liniowym przejściu, przed generowaniem:
+        - każda strona 1..total_pages występuje dokładnie raz (Step & Repeat
+          może powtarzać strony; odwołania (plik, strona) z Gang-run są pomijane),
+        - w dupleksie strona i jej para (1-2, 3-4, ...) leżą na przodzie i tyle
+          w użytkach lustrzanych względem pionowej osi arkusza,
+        - użytki jednej strony arkusza mieszczą się na arkuszu i nie nachodzą na siebie.
+        Przy obracaniu/przewracaniu para leży na tej samej formie: w użytku
+        lustrzanym względem osi pionowej (obracanie) lub poziomej (przewracanie).
+        total_pages=None oznacza największy numer strony w planie.
+        Zwraca listę opisów błędów (pusta lista = plan poprawny).
+        
+        Poprawny plan przechodzi szybką ścieżką (_verify_fast); szczegółowe
+        przejście arkusz po arkuszu buduje opisy błędów tylko wtedy, gdy jest
+        co opisać (albo plan zawiera arkusze Gang-run / Step & Repeat).
+        Na czas szybkiej ścieżki GC jest wstrzymany: przy planach na miliony
+        stron pełne przebiegi kolektora kosztowały więcej niż sama weryfikacja.
+        """
+        gc_was_on = gc.isenabled()
+        gc.disable()
+        try:
+            fast_ok = self._verify_fast(plan, total_pages, print_method)
+        finally:
+            if gc_was_on: gc.enable()
+        if fast_ok:
+            return []
+        
+        rect = operator.itemgetter(1, 2, 3, 4)
+        first = operator.itemgetter(0)
+        
+        if total_pages is None:
+            total_pages = 0
+            for sheet in plan:
+                if sheet.get("gang"): continue
+                for items in (sheet["front"], sheet["back"]):
+                    pgs = [pg for pg in map(first, items) if pg is not None]
+                    if pgs: total_pages = max(total_pages, max(pgs))
+        
+        errors = []
+        seen = set()
+        simplex = (print_method == self.METHOD_SINGLE)
+        tumble = (print_method == self.METHOD_WORK_TUMBLE)
+        work_form = tumble or print_method == self.METHOD_WORK_TURN
+        # Układ arkusza (geometria przodu, geometria tyłu) -> (błąd przodu, błąd tyłu, pary).
+        # Kolejne arkusze zwykle mają ten sam układ, więc najpierw porównujemy
+        # z poprzednim (bez kosztownego haszowania krotek liczb).
+        layout_cache = {}
+        last_key = last_layout = None
+        
+        def partner(pg):
+            # Para strony: 1-2, 3-4, ... (None, jeśli wypada poza dokument)
+            q = pg + 1 if pg % 2 else pg - 1
+            return q if q <= total_pages else None
+        
+        for s_idx, sheet in enumerate(plan):
+            if len(errors) >= max_errors: break
+            front = sheet["front"]
+            back = sheet["back"]
+            gang = sheet.get("gang", False)
+            repeat_ok = sheet.get("step_repeat", False)
+            
+            if work_form:
+                # Tył formy to ona sama po odwróceniu arkusza - sprowadzamy go do układu
+                # Sheetwise (lustro w poziomie), aby sprawdzić pary tą samą drogą
+                if back:
+                    errors.append(f"Arkusz {s_idx+1}: osobny tył w formie z obracaniem/przewracaniem")
+                back = front
+                if tumble:
+                    back = [(pg, 1.0 - x - w, 1.0 - y - h, w, h, rot) for pg, x, y, w, h, rot in front]
+            
+            key = (tuple(map(rect, front)), tuple(map(rect, back)))
+            
+            # 1. Geometria (liczona raz dla każdego unikalnego układu użytków)
+            if key == last_key:
+                layout = last_layout
+            else:
+                layout = layout_cache.get(key)
+                if layout is None:
+                    layout = layout_cache[key] = (self._check_geometry(key[0]), self._check_geometry(key[1]),
+                                                  None if simplex else self._mirror_pairs(key[0], key[1]))
+                last_key, last_layout = key, layout
+            front_err, back_err, pairs = layout
+            
+            sides = (("przód", front, front_err),) if work_form else (("przód", front, front_err), ("tył", back, back_err))
+            for side, items, geo_err in sides:
+                if geo_err:
+                    errors.append(f"Arkusz {s_idx+1} ({side}): {geo_err}")
+                
+                # 2. Każda strona dokładnie raz (Gang-run: odwołania do innych plików)
+                if gang or not items: continue
+                pgs = list(map(first, items))
+                if None in pgs:
+                    pgs = [pg for pg in pgs if pg is not None]
+                    if not pgs: continue
+                if min(pgs) < 1 or max(pgs) > total_pages:
+                    bad = [pg for pg in pgs if pg < 1 or pg > total_pages]
+                    errors.append(f"Arkusz {s_idx+1} ({side}): strona {bad[0]} spoza zakresu 1-{total_pages}")
+                    continue
+                if repeat_ok:
+                    seen.update(pgs)
+                elif not seen.isdisjoint(pgs):
+                    dup = next(pg for pg in pgs if pg in seen)
+                    errors.append(f"Arkusz {s_idx+1} ({side}): strona {dup} występuje ponownie")
+                    seen.update(pgs)
+                else:
+                    before = len(seen)
+                    seen.update(pgs)
+                    if len(seen) - before != len(pgs):
+                        dup = next(pg for i, pg in enumerate(pgs) if pg in pgs[:i])
+                        errors.append(f"Arkusz {s_idx+1} ({side}): strona {dup} występuje ponownie")
+            
+            # 3. Pary Przód/Tył
+            if simplex:
+                if back:
+                    errors.append(f"Arkusz {s_idx+1}: tył w druku jednostronnym")
+                continue
+            
+            f_idx, b_idx, unpaired, f_get, b_get = pairs
+            
+            if gang:
+                if any(fi < 0 for fi, bi in unpaired):
+                    errors.append(f"Arkusz {s_idx+1}: użytek na tyle bez odpowiednika na przodzie")
+                continue
+            
+            # Szybka ścieżka: pełne pary (p, q) to strony sąsiednie, mniejsza nieparzysta,
+            # czyli |p - q| == 1 oraz (p + q) % 4 == 3
+            if f_idx and not unpaired:
+                P = list(map(first, f_get(front))) if len(f_idx) > 1 else [f_get(front)[0]]
+                Q = list(map(first, b_get(back))) if len(b_idx) > 1 else [b_get(back)[0]]
+                if None not in P and None not in Q:
+                    if set(map(operator.sub, P, Q)) <= {1, -1} and set(map(operator.and_, map(operator.add, P, Q), itertools.repeat(3))) == {3}:
+                        continue
+            
+            # Wolna ścieżka: dopełnienia (None) i szczegółowe błędy
+            all_pairs = list(zip(f_idx, b_idx)) + unpaired
+            for fi, bi in all_pairs:
+                p = front[fi][0] if fi >= 0 else None
+                q = back[bi][0] if bi >= 0 else None
+                if (p is not None and partner(p) != q) or (q is not None and partner(q) != p):
+                    p_txt, q_txt = (f"strona {pg}" if pg is not None else "pusty użytek" for pg in (p, q))
+                    errors.append(f"Arkusz {s_idx+1}: {p_txt} i {q_txt} nie tworzą pary Przód/Tył")
+        
+        if total_pages and len(errors) < max_errors:
+            missing = total_pages - len(seen)
+            if missing > 0:
+                first_missing = next(pg for pg in range(1, total_pages + 1) if pg not in seen)
+                errors.append(f"Brak {missing} stron w planie (pierwsza: {first_missing})")
+        
+        return errors[:max_errors]
+
+    def _verify_fast(self, plan, total_pages, print_method, block_size=4096):
+        """
+        Szybka ścieżka verify_plan: arkusze przetwarzane porcjami operacjami na
+        całych listach (map, wycinki co n-ty element), bez tworzenia krotek dla
+        użytków; strony zaznaczane w bytearray. Porcja, w której wszystkie arkusze
+        mają układ pierwszego arkusza, jest sprawdzana kolumnami (x, y, w, h);
+        pozostałe arkusze pojedynczo. Geometria i pary liczone raz na układ.
+        Plan z metodą page_columns (CutStackPlan) podaje kolumny stron wprost.
+        True = plan na pewno poprawny; False = potrzebne szczegółowe przejście
+        (błąd albo arkusz Gang-run / Step & Repeat).
+        """
+        rect = operator.itemgetter(1, 2, 3, 4)
+        cols = [operator.itemgetter(k) for k in range(5)] # strona, x, y, w, h
+        get_front = operator.itemgetter("front")
+        get_back = operator.itemgetter("back")
+        has_key = dict.__contains__
+        simplex = (print_method == self.METHOD_SINGLE)
+        tumble = (print_method == self.METHOD_WORK_TUMBLE)
+        work_form = tumble or print_method == self.METHOD_WORK_TURN
+        
+        mark = bytearray((total_pages or 0) + 1) # mark[strona] = 1 po wystąpieniu
+        state = {"covered": 0, "top": 0}
+        layouts = {}
+        
+        def layout_for(key):
+            layout = layouts.get(key)
+            if layout is None:
+                layout = layouts[key] = self._fast_layout(key, simplex, work_form, tumble)
+            return layout
+        
+        def side_columns(sheets_side, n, template):
+            """Strony jednej strony arkuszy, kolumna na użytek, albo None, gdy geometria odbiega od wzorca"""
+            items = list(itertools.chain.from_iterable(sheets_side))
+            if len(items) != n * len(sheets_side): return None
+            for k in range(1, 5):
+                if list(map(cols[k], items)) != [it[k] for it in template] * len(sheets_side):
+                    return None
+            pages = list(map(cols[0], items))
+            return [pages[k::n] for k in range(n)]
+        
+        def pairs_ok(P, Q):
+            if None in P or None in Q:
+                if total_pages is None: return False
+                for p, q in zip(P, Q):
+                    # Dopełnienie (None) tylko naprzeciw strony bez pary w dokumencie
+                    if p is None and q is None: continue
+                    if p is None or q is None:
+                        pg = q if p is None else p
+                        if (pg + 1 if pg % 2 else pg - 1) <= total_pages: return False
+                    elif abs(p - q) != 1 or (p + q) & 3 != 3:
+                        return False
+                return True
+            return (set(map(operator.sub, P, Q)) <= {1, -1} and
+                    set(map(operator.and_, map(operator.add, P, Q), itertools.repeat(3))) == {3})
+        
+        def check_columns(layout, fc, bc):
+            """Pary stron w kolumnach użytków; zwraca listę wszystkich stron albo None"""
+            if layout is False: return None
+            if not simplex:
+                f_idx, b_idx = layout
+                src = fc if work_form else bc
+                for fi, bi in zip(f_idx, b_idx):
+                    if not pairs_ok(fc[fi], src[bi]): return None
+            return list(itertools.chain(*fc, *bc))
+        
+        def check(fronts, backs):
+            """Sprawdza arkusze o wspólnym układzie fronts[0]/backs[0]; zwraca listę stron albo None"""
+            back = fronts[0] if work_form else backs[0]
+            layout = layout_for((tuple(map(rect, fronts[0])), tuple(map(rect, back))))
+            if layout is False: return None
+            fc = side_columns(fronts, len(fronts[0]), fronts[0])
+            if fc is None: return None
+            bc = [] if work_form or simplex else side_columns(backs, len(backs[0]), backs[0])
+            if bc is None: return None
+            return check_columns(layout, fc, bc)
+        
+        def mark_pages(pages):
+            if None in pages:
+                pages = [pg for pg in pages if pg is not None]
+            if not pages: return True
+            lo, hi = min(pages), max(pages)
+            if lo < 1: return False
+            if total_pages is not None:
+                if hi > total_pages: return False
+            elif hi >= len(mark):
+                mark.extend(bytes(hi + 1 - len(mark)))
+            for pg in pages:
+                if mark[pg]: return False
+                mark[pg] = 1
+            state["covered"] += len(pages)
+            state["top"] = max(state["top"], hi)
+            return True
+        
+        # Plany leniwe z kolumnami stron (CutStackPlan): porcje bez budowania arkuszy,
+        # geometria wspólna dla porcji z konstrukcji; ogon planu - arkusz po arkuszu
+        start = 0
+        page_columns = getattr(plan, "page_columns", None)
+        if page_columns is not None:
+            while start < len(plan):
+                block = page_columns(start, min(start + block_size, len(plan)))
+                if block is None: break
+                front_rects, back_rects, fc, bc = block
+                if (work_form or simplex) and any(bc): return False
+                pages = check_columns(layout_for((front_rects, front_rects if work_form else back_rects)), fc, bc)
+                if pages is None or not mark_pages(pages): return False
+                start += block_size
+        
+        sheets = iter(plan[start:] if start else plan)
+        while True:
+            block = list(itertools.islice(sheets, block_size))
+            if not block: break
+            if (any(map(has_key, block, itertools.repeat("gang"))) or
+                    any(map(has_key, block, itertools.repeat("step_repeat")))):
+                return False
+            fronts, backs = list(map(get_front, block)), list(map(get_back, block))
+            if (work_form or simplex) and any(backs):
+                return False
+            
+            pages = check(fronts, backs)
+            if pages is None:
+                # Różne układy w porcji (np. granica składek): arkusz po arkuszu
+                for front, back in zip(fronts, backs):
+                    pages = check([front], [back])
+                    if pages is None or not mark_pages(pages): return False
+            elif not mark_pages(pages):
+                return False
+        
+        return state["covered"] == (state["top"] if total_pages is None else total_pages)
+
+    def _fast_layout(self, key, simplex, work_form, tumble):
+        """Układ dla _verify_fast: (indeksy sparowanych użytków przodu, tyłu) albo False"""
+        front, back = key
+        if tumble:
+            back = tuple((1.0 - x - w, 1.0 - y - h, w, h) for x, y, w, h in front)
+        if self._check_geometry(front) or (not work_form and self._check_geometry(back)):
+            return False
+        if simplex:
+            return True
+        f_idx, b_idx, unpaired, _, _ = self._mirror_pairs(front, back)
+        if unpaired or not f_idx:
+            return False
+        return f_idx, b_idx
+
+    def _check_geometry(self, rects):
+        """Opis błędu geometrii użytków (x, y, w, h) albo None"""
+        eps = 1e-6
+        for x, y, w, h in rects:
+            if x < -eps or y < -eps or x + w > 1 + eps or y + h > 1 + eps or w <= 0 or h <= 0:
+                return "użytek poza arkuszem"
+        
+        # Zamiatanie po osi X: porównujemy tylko użytki, które zachodzą na siebie w poziomie
+        order = sorted(rects)
+        for i, (x, y, w, h) in enumerate(order):
+            for x2, y2, w2, h2 in order[i+1:]:
+                if x2 >= x + w - eps: break
+                if y2 < y + h - eps and y < y2 + h2 - eps:
+                    return "użytki nachodzą na siebie"
+        return None
+
+    def _mirror_pairs(self, front_rects, back_rects):
+        """
+        Użytki leżące na sobie po odwróceniu arkusza przez bok: (indeksy przodu,
+        indeksy tyłu, pary bez odpowiednika oznaczonego indeksem -1,
+        oraz itemgettery pobierające sparowane użytki).
+        """
+        def k(x, y, w, h):
+            return (round(x, 4), round(y, 4), round(w, 4), round(h, 4))
+        
+        back_idx = {k(*r): i for i, r in enumerate(back_rects)}
+        f_idx = []
+        b_idx = []
+        unpaired = []
+        for fi, (x, y, w, h) in enumerate(front_rects):
+            bi = back_idx.pop(k(1.0 - x - w, y, w, h), -1)
+            if bi >= 0:
+                f_idx.append(fi)
+                b_idx.append(bi)
+            else:
+                unpaired.append((fi, -1))
+        for bi in back_idx.values():
+            unpaired.append((-1, bi))
+        f_get = operator.itemgetter(*f_idx) if f_idx else None
+        b_get = operator.itemgetter(*b_idx) if b_idx else None
+        return f_idx, b_idx, unpaired, f_get, b_get
+
+    # --- PRACE ZBIORCZE (GANG-RUN) ---
+
+    def calculate_gang(self, jobs, sheet_w, sheet_h, gap=0.0, margin=10.0, allow_rotate=True):
+        """
+        Pakowanie wielu małych prac na wspólnych arkuszach (Gang-run).
+        jobs: lista słowników {"src_file", "page", "w", "h", "qty", ["back_page"]}
+        (wymiary netto w mm). Zwraca plan w formacie calculate(), gdzie numer
+        strony to krotka (plik_źródłowy, numer_strony).
+        
+        Heurystyka półkowa (First-Fit Decreasing Height): użytki tego samego
+        formatu układane są całymi seriami, więc tysiące sztuk pakują się
+        w ułamku sekundy.
+        """
+        usable_w = sheet_w - 2 * margin
+        usable_h = sheet_h - 2 * margin
+        
+        # Grupy użytków: (szer_slotu, wys_slotu, obrót, praca)
+        groups = []
+        for job in jobs:
+            qty = int(job.get("qty", 1))
+            if qty <= 0: continue
+            w = float(job["w"]) + gap
+            h = float(job["h"]) + gap
+            rot = 0
+            # Kładziemy użytek "na płasko" (niższa półka), o ile się zmieści
+            if allow_rotate and h > w and h <= usable_w:
+                w, h, rot = h, w, 90
+            if w > usable_w or h > usable_h:
+                if allow_rotate and h <= usable_w and w <= usable_h:
+                    w, h, rot = h, w, (90 if rot == 0 else 0)
+                else:
+                    raise ValueError(f"Praca {os.path.basename(job['src_file'])} nie mieści się na arkuszu.")
+            groups.append((w, h, rot, job, qty))
+        
+        groups.sort(key=lambda g: (g[1], g[0]), reverse=True)
+        
+        sheets = []   # lista list użytków (front)
+        backs = []
+        shelves = []  # [indeks_arkusza, y, wysokość, zajęta_szerokość]
+        sheet_fill = [] # zajęta wysokość na każdym arkuszu
+        
+        for w, h, rot, job, qty in groups:
+            src = job["src_file"]
+            front_ref = (src, int(job.get("page", 1)))
+            back_ref = (src, int(job["back_page"])) if job.get("back_page") else None
+            remaining = qty
+            
+            while remaining > 0:
+                # First-fit: pierwsza półka, na której zmieści się choć jeden użytek
+                shelf = None
+                for sh in shelves:
+                    if sh[2] >= h and usable_w - sh[3] >= w:
+                        shelf = sh
+                        break
+                
+                if shelf is None:
+                    # Nowa półka na pierwszym arkuszu z wolnym miejscem
+                    s_idx = None
+                    for i, used_h in enumerate(sheet_fill):
+                        if usable_h - used_h >= h:
+                            s_idx = i
+                            break
+                    if s_idx is None:
+                        sheets.append([])
+                        backs.append([])
+                        sheet_fill.append(0.0)
+                        s_idx = len(sheets) - 1
+                    shelf = [s_idx, sheet_fill[s_idx], h, 0.0]
+                    sheet_fill[s_idx] += h
+                    shelves.append(shelf)
+                
+                s_idx, y, _, x_used = shelf
+                n = min(remaining, int((usable_w - x_used) // w))
+                for k in range(n):
+                    xr = (margin + x_used + k * w) / sheet_w
+                    yr = (margin + y) / sheet_h
+                    wr = w / sheet_w
+                    hr = h / sheet_h
+                    sheets[s_idx].append(self._create_item(front_ref, xr, yr, wr, hr, rot))
+                    if back_ref is not None:
+                        # Rewers: lustro względem pionowej osi arkusza, obrót przeciwny
+                        backs[s_idx].append(self._create_item(back_ref, 1.0 - xr - wr, yr, wr, hr, (360 - rot) % 360))
+                shelf[3] += n * w
+                remaining -= n
+        
+        return [{"front": sheets[i], "back": backs[i], "gang": True} for i in range(len(sheets))]
+
 
 # --- GUI ---
 
 class ImpositionApp:
     def __init__(self, root):
+        _load_tk()
+        _load_scribus()
         self.root = root
         self.root.title("Scribus Impozycja Master")
         self.root.geometry("1000x750")
         
         self.engine = ImpositionEngine()
         self.preview_data = []
+        self.plan_params = None # Parametry silnika, z których powstał preview_data
         self.current_sheet_idx = 0
         
         # Stan
         self.src_file = ""
         self.page_count = 0
+        self.gang_jobs = [] # Prace zbiorcze (Gang-run)
+        self.src_sources = [] # Pliki źródłowe książki (tryb "multi")
+        self.src_page_count = 0 # Liczba stron źródła (dla z/rN w wyrażeniu kolejności)
         
         # Zmienne GUI
         self.v_src_mode = tk.StringVar(value="current")
@@ -310,22 +1638,39 @@ class ImpositionApp:
         
         self.v_sheet_fmt = tk.StringVar(value="A3")
         self.v_orient = tk.StringVar(value="Landscape")
+        self.v_page_w = tk.DoubleVar(value=210.0) # Format strony netto (dla optymalizatora)
+        self.v_page_h = tk.DoubleVar(value=297.0)
         
         # Parametry
         self.v_gap = tk.DoubleVar(value=0.0)
         self.v_bleed = tk.DoubleVar(value=3.0)
         self.v_paper_thickness = tk.DoubleVar(value=0.1) # Grubość papieru w mm
         self.v_sig_size = tk.IntVar(value=16)
+        self.v_mixed_sigs = tk.BooleanVar(value=False) # Składki mieszane (bez pustych stron)
+        self.v_fold = tk.BooleanVar(value=False) # Cała składka na jednym arkuszu (F8/F16/F32)
+        self.v_number_on = tk.BooleanVar(value=False) # Numeracja użytków (bilety, druki)
+        self.v_number_start = tk.IntVar(value=1)
+        self.v_number_count = tk.IntVar(value=0) # 0 = numer na każdej stronie źródła
         self.v_nup_cols = tk.IntVar(value=2)
         self.v_nup_rows = tk.IntVar(value=2)
-        self.v_page_count = tk.IntVar(value=0) # Zmienna GUI dla liczby stron
+        self.v_step_repeat = tk.BooleanVar(value=False) # N-up: powielanie jednej strony
+        self.v_page_count = tk.StringVar(value="0") # Liczba stron albo wyrażenie kolejności (np. 1-4,blank*2,5-8)
+        self.page_seq = None # Skompilowane wyrażenie kolejności stron
         self.v_page_count.trace("w", self._on_page_count_change)
         
         self.v_auto_save = tk.BooleanVar(value=True)
         self.v_output_path = tk.StringVar(value=os.path.expanduser("~"))
+        self.v_incremental = tk.BooleanVar(value=False) # Aktualizacja istniejącego pliku
+        self.v_draft = tk.BooleanVar(value=False) # Tryb roboczy: podgląd obrazów w niskiej rozdzielczości
+        self.v_slug_note = tk.StringVar(value="")
+        self.v_copies = tk.IntVar(value=1) # Nakład - zapisywany w metadanych, arkusze nie są powielane
+        self.v_collate = tk.BooleanVar(value=True)
+        self.v_crop_len = tk.DoubleVar(value=5.0)
+        self.v_crop_offset = tk.DoubleVar(value=2.0)
 
         # Wyniki z GUI do przekazania do main()
         self.ready_to_generate = False
+        self.finalize_path = None # Dokument roboczy do przełączenia na pełną rozdzielczość po zamknięciu okna
         self.gen_params = {}
 
         self._setup_ui()
@@ -407,6 +1752,159 @@ class ImpositionApp:
         # Wywołaj raz na starcie
         calc()
 
+    def _open_gang_dialog(self):
+        # Lista prac do wspólnego pakowania na arkuszach
+        dlg = tk.Toplevel(self.root)
+        dlg.title("Praca zbiorcza (Gang-run)")
+        
+        x = self.root.winfo_x() + 50
+        y = self.root.winfo_y() + 50
+        dlg.geometry(f"560x380+{x}+{y}")
+        
+        f = ttk.Frame(dlg, padding=10)
+        f.pack(fill="both", expand=True)
+        
+        cols = ("file", "page", "w", "h", "qty")
+        tree = ttk.Treeview(f, columns=cols, show="headings", height=10)
+        for c, title, width in zip(cols, ["Plik", "Str.", "Szer.", "Wys.", "Nakład"], [220, 50, 60, 60, 70]):
+            tree.heading(c, text=title)
+            tree.column(c, width=width)
+        tree.pack(fill="both", expand=True)
+        
+        def row(job):
+            return (os.path.basename(job["src_file"]), job["page"], job["w"], job["h"], job["qty"])
+        
+        for job in self.gang_jobs:
+            tree.insert("", "end", values=row(job))
+        
+        # Parametry nowej pracy (wymiar netto w mm)
+        v_w = tk.DoubleVar(value=90.0)
+        v_h = tk.DoubleVar(value=50.0)
+        v_qty = tk.IntVar(value=100)
+        v_page = tk.IntVar(value=1)
+        
+        f_add = ttk.Frame(f)
+        f_add.pack(fill="x", pady=5)
+        for label, var in [("Szer.:", v_w), ("Wys.:", v_h), ("Nakład:", v_qty), ("Str.:", v_page)]:
+            ttk.Label(f_add, text=label).pack(side="left")
+            ttk.Entry(f_add, textvariable=var, width=6).pack(side="left", padx=(0, 5))
+        
+        def add():
+            path = filedialog.askopenfilename(filetypes=[("PDF", "*.pdf")], parent=dlg)
+            if not path: return
+            try:
+                job = {
+                    "src_file": path.replace("\\", "/"),
+                    "page": v_page.get(),
+                    "w": v_w.get(),
+                    "h": v_h.get(),
+                    "qty": v_qty.get()
+                }
+            except tk.TclError:
+                messagebox.showwarning("Gang-run", "Niepoprawne parametry pracy.", parent=dlg)
+                return
+            self.gang_jobs.append(job)
+            tree.insert("", "end", values=row(job))
+        
+        def remove():
+            sel = tree.selection()
+            for idx in sorted((tree.index(i) for i in sel), reverse=True):
+                del self.gang_jobs[idx]
+            tree.delete(*sel)
+        
+        def pack():
+            if not self.gang_jobs: return
+            self.v_src_mode.set("gang")
+            self._recalc_preview()
+            dlg.destroy()
+        
+        f_btn = ttk.Frame(f)
+        f_btn.pack(fill="x")
+        ttk.Button(f_btn, text="Dodaj PDF...", command=add).pack(side="left")
+        ttk.Button(f_btn, text="Usuń", command=remove).pack(side="left", padx=5)
+        ttk.Button(f_btn, text="Pakuj", command=pack).pack(side="right")
+
+    def _open_optimizer(self):
+        # Ranking formatów / orientacji / siatek dla bieżącej pracy
+        dlg = tk.Toplevel(self.root)
+        dlg.title("Optymalizacja układu")
+        
+        x = self.root.winfo_x() + 50
+        y = self.root.winfo_y() + 50
+        dlg.geometry(f"560x400+{x}+{y}")
+        
+        f = ttk.Frame(dlg, padding=10)
+        f.pack(fill="both", expand=True)
+        
+        f_page = ttk.Frame(f)
+        f_page.pack(fill="x")
+        ttk.Label(f_page, text="Strona netto (mm):").pack(side="left")
+        ttk.Entry(f_page, textvariable=self.v_page_w, width=6).pack(side="left", padx=2)
+        ttk.Label(f_page, text="x").pack(side="left")
+        ttk.Entry(f_page, textvariable=self.v_page_h, width=6).pack(side="left", padx=2)
+        
+        cols = ("fmt", "orient", "grid", "sheets", "plates", "waste")
+        tree = ttk.Treeview(f, columns=cols, show="headings", height=12)
+        for c, title, width in zip(cols, ["Format", "Orientacja", "Siatka", "Arkusze", "Formy", "Odpad"], [70, 90, 70, 70, 70, 70]):
+            tree.heading(c, text=title)
+            tree.column(c, width=width)
+        tree.pack(fill="both", expand=True, pady=5)
+        
+        v_info = tk.StringVar(value="")
+        ttk.Label(f, textvariable=v_info, foreground="gray").pack(anchor="w")
+        
+        ranking = []
+        
+        def search(*args):
+            try:
+                pages = self.page_count
+                page_w = self.v_page_w.get()
+                page_h = self.v_page_h.get()
+            except tk.TclError:
+                v_info.set("Niepoprawne dane wejściowe.")
+                return
+            
+            params = {
+                "sig_size": self.v_sig_size.get(),
+                "mixed_sigs": self.v_mixed_sigs.get(),
+                "fold": self.v_fold.get(),
+                "step_repeat": self.v_step_repeat.get()
+            }
+            t0 = time.perf_counter()
+            res = self.engine.optimize_layout(self.v_imp_type.get(), self.v_print_method.get(), pages,
+                                              page_w, page_h, params, gap=self.v_gap.get())
+            ms = (time.perf_counter() - t0) * 1000.0
+            
+            ranking[:] = res
+            tree.delete(*tree.get_children())
+            for r in res:
+                orient = "Poziomo" if r["orient"] == "Landscape" else "Pionowo"
+                tree.insert("", "end", values=(r["fmt"], orient, f"{r['cols']}x{r['rows']}",
+                                               r["sheets"], r["plates"], f"{r['waste']*100:.1f}%"))
+            if res:
+                tree.selection_set(tree.get_children()[0])
+            v_info.set(f"{len(res)} wariantów w {ms:.1f} ms")
+        
+        def apply():
+            sel = tree.selection()
+            if not sel: return
+            r = ranking[tree.index(sel[0])]
+            self.v_sheet_fmt.set(r["fmt"])
+            self.v_orient.set(r["orient"])
+            if self.v_imp_type.get() == ImpositionEngine.TYPE_N_UP:
+                self.v_nup_cols.set(r["cols"])
+                self.v_nup_rows.set(r["rows"])
+            self._recalc_preview()
+            dlg.destroy()
+        
+        f_btn = ttk.Frame(f)
+        f_btn.pack(fill="x")
+        ttk.Button(f_btn, text="Szukaj", command=search).pack(side="left")
+        ttk.Button(f_btn, text="Zastosuj", command=apply).pack(side="right")
+        tree.bind("<Double-1>", lambda e: apply())
+        
+        search()
+
     def _setup_ui(self):
         # Główny kontener
         paned = tk.PanedWindow(self.root, orient=tk.HORIZONTAL)
@@ -425,6 +1923,7 @@ class ImpositionApp:
         
         ttk.Radiobutton(lf_src, text="Aktualny dokument Scribus", variable=self.v_src_mode, value="current", command=self._check_context).pack(anchor="w", padx=5)
         ttk.Radiobutton(lf_src, text="Zewnętrzny plik PDF", variable=self.v_src_mode, value="pdf", command=self._browse_pdf).pack(anchor="w", padx=5)
+        ttk.Radiobutton(lf_src, text="Wiele plików PDF (rozdziały)", variable=self.v_src_mode, value="multi", command=self._browse_multi).pack(anchor="w", padx=5)
         
         self.lbl_file_info = ttk.Label(lf_src, text="Brak dokumentu", foreground="gray")
         self.lbl_file_info.pack(anchor="w", padx=20)
@@ -432,8 +1931,8 @@ class ImpositionApp:
         # Pole edycji liczby stron
         f_pgs = ttk.Frame(lf_src)
         f_pgs.pack(fill="x", padx=20, pady=2)
-        ttk.Label(f_pgs, text="Liczba stron:").pack(side="left")
-        self.ent_pages = ttk.Entry(f_pgs, textvariable=self.v_page_count, width=5)
+        ttk.Label(f_pgs, text="Strony:").pack(side="left")
+        self.ent_pages = ttk.Entry(f_pgs, textvariable=self.v_page_count, width=24)
         self.ent_pages.pack(side="left", padx=5)
         # self.ent_pages.bind("<FocusOut>", lambda e: self._recalc_preview())
         # self.ent_pages.bind("<Return>", lambda e: self._recalc_preview())
@@ -492,6 +1991,8 @@ class ImpositionApp:
         
         self.btn_calc = ttk.Button(f_cover, text="Kalkulator", command=self._open_spine_calculator, state="disabled")
         self.btn_calc.pack(side="left", padx=5)
+        
+        ttk.Button(lf_imp, text="Praca zbiorcza (Gang-run)...", command=self._open_gang_dialog).pack(fill="x", padx=5, pady=2)
 
         # 3. Arkusz
         lf_sheet = ttk.LabelFrame(frame_left, text="3. Arkusz Docelowy")
@@ -508,6 +2009,8 @@ class ImpositionApp:
         f_orient.pack(fill="x", padx=5, pady=2)
         ttk.Radiobutton(f_orient, text="Poziomo", variable=self.v_orient, value="Landscape", command=self._recalc_preview).pack(side="left")
         ttk.Radiobutton(f_orient, text="Pionowo", variable=self.v_orient, value="Portrait", command=self._recalc_preview).pack(side="left", padx=10)
+        
+        ttk.Button(lf_sheet, text="Optymalizuj układ...", command=self._open_optimizer).pack(fill="x", padx=5, pady=2)
 
         # 4. Generowanie
         lf_out = ttk.LabelFrame(frame_left, text="4. Wynik")
@@ -519,9 +2022,34 @@ class ImpositionApp:
         f_path.pack(fill="x", padx=5, pady=2)
         ttk.Entry(f_path, textvariable=self.v_output_path).pack(side="left", fill="x", expand=True)
         ttk.Button(f_path, text="...", width=3, command=self._browse_output).pack(side="left", padx=2)
+        
+        ttk.Checkbutton(lf_out, text="Aktualizuj istniejący plik (tylko zmiany)", variable=self.v_incremental).pack(anchor="w", padx=5)
+        f_draft = ttk.Frame(lf_out)
+        f_draft.pack(fill="x", padx=5)
+        ttk.Checkbutton(f_draft, text="Tryb roboczy (podgląd niskiej rozdzielczości)", variable=self.v_draft).pack(side="left")
+        ttk.Button(f_draft, text="Pełna rozdzielczość...", command=self._finalize).pack(side="right")
+        
+        f_slug = ttk.Frame(lf_out)
+        f_slug.pack(fill="x", padx=5, pady=2)
+        ttk.Label(f_slug, text="Opis:").pack(side="left")
+        ttk.Entry(f_slug, textvariable=self.v_slug_note).pack(side="left", fill="x", expand=True, padx=2)
+        
+        f_copies = ttk.Frame(lf_out)
+        f_copies.pack(fill="x", padx=5, pady=2)
+        ttk.Label(f_copies, text="Nakład (egz.):").pack(side="left")
+        ttk.Entry(f_copies, textvariable=self.v_copies, width=6).pack(side="left", padx=2)
+        ttk.Checkbutton(f_copies, text="Kompletowanie", variable=self.v_collate).pack(side="left", padx=5)
+        
+        f_crop = ttk.Frame(lf_out)
+        f_crop.pack(fill="x", padx=5, pady=2)
+        ttk.Label(f_crop, text="Linie cięcia (mm):").pack(side="left")
+        ttk.Entry(f_crop, textvariable=self.v_crop_len, width=4).pack(side="left", padx=2)
+        ttk.Label(f_crop, text="Odsunięcie:").pack(side="left", padx=2)
+        ttk.Entry(f_crop, textvariable=self.v_crop_offset, width=4).pack(side="left", padx=2)
 
         ttk.Button(frame_left, text="PRZELICZ PODGLĄD", command=self._recalc_preview).pack(fill="x", padx=10, pady=10)
         
+        ttk.Button(frame_left, text="Eksport planu dla RIP (JSON/JDF)...", command=self._export_plan).pack(fill="x", side="bottom", padx=10)
         btn_gen = tk.Button(frame_left, text="GENERUJ DOKUMENT", bg="#2196F3", fg="white", font=("Segoe UI", 10, "bold"), height=2, command=self._generate)
         btn_gen.pack(fill="x", side="bottom", padx=10, pady=10)
 
@@ -547,14 +2075,46 @@ class ImpositionApp:
             cb = ttk.Combobox(self.f_dynamic, textvariable=self.v_sig_size, values=[4, 8, 16, 32], width=5)
             cb.pack(side="left", padx=5)
             cb.bind("<<ComboboxSelected>>", self._recalc_preview_event)
+            ttk.Checkbutton(self.f_dynamic, text="Mieszane", variable=self.v_mixed_sigs, command=self._recalc_preview).pack(side="left", padx=5)
+            ttk.Checkbutton(self.f_dynamic, text="Falcowana", variable=self.v_fold, command=self._recalc_preview).pack(side="left", padx=5)
+        elif t == ImpositionEngine.TYPE_CUT_STACK:
+            ttk.Label(self.f_dynamic, text="Kolumny:").pack(side="left")
+            ttk.Entry(self.f_dynamic, textvariable=self.v_nup_cols, width=3).pack(side="left")
+            ttk.Label(self.f_dynamic, text="Wiersze:").pack(side="left", padx=5)
+            ttk.Entry(self.f_dynamic, textvariable=self.v_nup_rows, width=3).pack(side="left")
+            self._add_numbering_opts()
         elif t == ImpositionEngine.TYPE_N_UP:
             ttk.Label(self.f_dynamic, text="Kolumny:").pack(side="left")
             ttk.Entry(self.f_dynamic, textvariable=self.v_nup_cols, width=3).pack(side="left")
             ttk.Label(self.f_dynamic, text="Wiersze:").pack(side="left", padx=5)
             ttk.Entry(self.f_dynamic, textvariable=self.v_nup_rows, width=3).pack(side="left")
+            ttk.Checkbutton(self.f_dynamic, text="Powielaj", variable=self.v_step_repeat, command=self._recalc_preview).pack(side="left", padx=5)
+            self._add_numbering_opts()
             
         self._recalc_preview()
 
+    def _add_numbering_opts(self):
+        """Numeracja (bilety, druki): numer startowy i liczba kompletów ze wzoru"""
+        f = ttk.Frame(self.f_dynamic)
+        f.pack(side="top", fill="x", pady=(4, 0))
+        ttk.Checkbutton(f, text="Numeruj od:", variable=self.v_number_on, command=self._recalc_preview).pack(side="left")
+        ttk.Entry(f, textvariable=self.v_number_start, width=7).pack(side="left", padx=2)
+        ttk.Label(f, text="Kompletów (0 = strony):").pack(side="left", padx=2)
+        e = ttk.Entry(f, textvariable=self.v_number_count, width=7)
+        e.pack(side="left", padx=2)
+        e.bind("<FocusOut>", self._recalc_preview_event)
+
+    def _numbering_params(self):
+        """Ustawienia numeracji z GUI (None = bez numeracji)"""
+        if not self.v_number_on.get() or self.v_imp_type.get() not in (ImpositionEngine.TYPE_N_UP, ImpositionEngine.TYPE_CUT_STACK):
+            return None
+        try:
+            count = max(0, self.v_number_count.get())
+            return {"start": self.v_number_start.get(), "count": count,
+                    "design_pages": max(1, self.page_count) if count else 1}
+        except tk.TclError:
+            return None
+
     def _toggle_spine(self):
         st = "normal" if self.v_cover.get() else "disabled"
         self.lbl_spine.config(state=st)
@@ -569,8 +2129,11 @@ class ImpositionApp:
             if scribus.haveDoc():
                 self.src_file = scribus.getDocName()
                 self.page_count = scribus.pageCount()
+                self.src_page_count = self.page_count
                 self.v_page_count.set(self.page_count) # Synchronizacja GUI
                 w, h = scribus.getPageSize()
+                self.v_page_w.set(round(w, 1))
+                self.v_page_h.set(round(h, 1))
                 self.lbl_file_info.config(text=f"SLA: {self.page_count} str. ({int(w)}x{int(h)}mm)")
                 base = os.path.splitext(self.src_file)[0]
                 self.v_output_path.set(base + "_impozycja.sla")
@@ -584,40 +2147,69 @@ class ImpositionApp:
             self.src_file = path
             
             # Próba automatycznego wykrycia liczby stron
-            cnt = self._get_pdf_page_count(path)
+            cnt = get_pdf_page_count(path)
             
             if not cnt or cnt <= 0:
                 cnt = simpledialog.askinteger("PDF", "Podaj liczbę stron w pliku PDF:", initialvalue=4)
             
             if cnt:
                 self.page_count = cnt
+                self.src_page_count = cnt
                 self.v_page_count.set(cnt) # Aktualizacja pola w GUI
                 self.lbl_file_info.config(text=f"PDF: {os.path.basename(path)} ({cnt} str.)")
                 base = os.path.splitext(path)[0]
                 self.v_output_path.set(base + "_impozycja.sla")
                 self._recalc_preview()
 
-    def _get_pdf_page_count(self, filename):
-        try:
-            with open(filename, "rb") as f:
-                content = f.read()
-                import re
-                matches = re.findall(rb"/Type\s*/Pages\b[^>]*\/Count\s+(\d+)", content)
-                if matches:
-                    counts = [int(x) for x in matches]
-                    return max(counts)
-                matches = re.findall(rb"/Type\s*/Page\b", content)
-                if matches:
-                    return len(matches)
-        except:
-            pass
-        return 0
+    def _browse_multi(self):
+        """Książka z wielu plików PDF - kolejność naturalna według nazw (rozdz2 przed rozdz10)"""
+        paths = filedialog.askopenfilenames(filetypes=[("PDF", "*.pdf")])
+        if not paths: return
+        sources = []
+        for path in sorted(paths, key=natural_sort_key):
+            cnt = get_pdf_page_count(path)
+            if not cnt or cnt <= 0:
+                cnt = simpledialog.askinteger("PDF", f"Podaj liczbę stron pliku {os.path.basename(path)}:", initialvalue=4)
+            if not cnt: return
+            sources.append({"file": path, "pages": cnt})
+        self.src_sources = sources
+        self.src_file = sources[0]["file"]
+        self.page_count = sum(s["pages"] for s in sources)
+        self.v_page_count.set(self.page_count)
+        self.lbl_file_info.config(text=f"PDF: plików {len(sources)} ({self.page_count} str.)")
+        base = os.path.splitext(self.src_file)[0]
+        self.v_output_path.set(base + "_impozycja.sla")
+        self._recalc_preview()
+
+    def _get_sheet_size(self):
+        """Wymiary arkusza (mm) z uwzględnieniem orientacji"""
+        fw, fh = SHEET_SIZES.get(self.v_sheet_fmt.get(), (297.0, 420.0))
+        if self.v_orient.get() == "Landscape": fw, fh = fh, fw
+        return fw, fh
 
     def _recalc_preview(self):
+        if self.v_src_mode.get() == "gang":
+            self._recalc_gang_preview()
+            return
+        
+        self.page_seq = None
         try:
-             # Pobierz z GUI
-             val = self.v_page_count.get()
-             self.page_count = val
+             # Pobierz z GUI: liczba stron albo wyrażenie kolejności stron
+             val = self.v_page_count.get().strip()
+             if val.isdigit():
+                 self.page_count = int(val)
+             else:
+                 main = self.src_page_count if self.v_src_mode.get() != "multi" else sum(s["pages"] for s in self.src_sources)
+                 base = os.path.dirname(self.src_file) if self.src_file else None
+                 self.page_seq = PageSequence.parse(val, main or None, base)
+                 self.page_count = len(self.page_seq)
+        except ValueError as e:
+             # Błędne wyrażenie - pokaż przyczynę
+             self.page_count = 0
+             self.lbl_sheet.config(text=str(e))
+             self.preview_data = []
+             self.canvas.delete("all")
+             return
         except:
              # Jeśli błąd (np. puste pole), uznaj że 0
              self.page_count = 0
@@ -630,14 +2222,18 @@ class ImpositionApp:
         
         params = {
             "sig_size": self.v_sig_size.get(),
+            "mixed_sigs": self.v_mixed_sigs.get(),
+            "fold": self.v_fold.get(),
             "cols": self.v_nup_cols.get(),
-            "rows": self.v_nup_rows.get()
+            "rows": self.v_nup_rows.get(),
+            "step_repeat": self.v_step_repeat.get()
         }
         
+        self.plan_params = params
         self.preview_data = self.engine.calculate(
             self.v_imp_type.get(),
             self.v_print_method.get(),
-            self.page_count,
+            ImpositionEngine.numbered_page_count(self.page_count, self._numbering_params()),
             params
         )
         
@@ -648,6 +2244,20 @@ class ImpositionApp:
             
         self._draw_sheet()
 
+    def _recalc_gang_preview(self):
+        fw, fh = self._get_sheet_size()
+        try:
+            self.preview_data = self.engine.calculate_gang(self.gang_jobs, fw, fh, self.v_gap.get())
+            self.plan_params = {"jobs": self.gang_jobs, "gap": self.v_gap.get()}
+        except ValueError as e:
+            messagebox.showwarning("Gang-run", str(e))
+            self.preview_data = []
+        
+        total = sum(int(j.get("qty", 1)) for j in self.gang_jobs)
+        self.lbl_file_info.config(text=f"Gang-run: {len(self.gang_jobs)} prac, {total} szt.")
+        self.current_sheet_idx = 0
+        self._draw_sheet()
+
     def _draw_sheet(self):
         self.canvas.delete("all")
         if not self.preview_data: return
@@ -670,7 +2280,6 @@ class ImpositionApp:
         
         # Rysujemy dwie strony arkusza (Przód i Tył) obok siebie
         # Chyba że jednostronny
-        method = self.v_print_method.get()
         
         area_w = (w - 3*m) / 2
         area_h = h - 2*m
@@ -681,8 +2290,10 @@ class ImpositionApp:
         # Tył (Prawa strona ekranu) - jeśli istnieje
         if sheet["back"]:
             self._draw_surface(sheet["back"], m*2 + area_w, m, area_w, area_h, "REWERS (Tył)")
-        elif method == ImpositionEngine.METHOD_WORK_TURN:
-            self._draw_surface(sheet["front"], m*2 + area_w, m, area_w, area_h, "REWERS (Ten sam co Awers)")
+        elif sheet.get("work_form") == "turn":
+            self._draw_surface(sheet["front"], m*2 + area_w, m, area_w, area_h, "REWERS (Ta sama forma, przez bok)")
+        elif sheet.get("work_form") == "tumble":
+            self._draw_surface(sheet["front"], m*2 + area_w, m, area_w, area_h, "REWERS (Ta sama forma, przez głowę)")
 
     def _draw_surface(self, items, x, y, w, h, title):
         # Tło papieru
@@ -707,24 +2318,28 @@ class ImpositionApp:
             g = 2
             
             color = "#E8F5E9" if pg else "#f0f0f0"
-            txt = str(pg) if pg else "X"
+            txt = self._page_label(pg) if pg else "X"
             
             self.canvas.create_rectangle(px+g, py+g, px+pw-g, py+ph-g, fill=color, outline="#4CAF50")
             self.canvas.create_text(px+pw/2, py+ph/2, text=txt, font=("Arial", 14, "bold"), fill="#2E7D32")
 
+    def _page_label(self, pg):
+        # Wyrażenie kolejności stron: pozycja w planie -> strona źródła
+        if self.page_seq is not None and not isinstance(pg, tuple):
+            pg = self.page_seq.resolve(pg)
+            if pg is None: return "-"
+        # Strona z innego pliku (Gang-run): (plik, strona)
+        if isinstance(pg, tuple):
+            src, num = pg
+            return f"{os.path.splitext(os.path.basename(src))[0][:10]}:{num}"
+        return str(pg)
+
     def _draw_cover_preview(self):
         cw = self.canvas.winfo_width()
         ch = self.canvas.winfo_height()
         spine = self.v_spine.get()
         
-        # Mapowanie formatów (kopia z run_imposition_job dla podglądu)
-        sizes = {
-            "A4": (210.0, 297.0), "A3": (297.0, 420.0), "A2": (420.0, 594.0),
-            "SRA3": (320.0, 450.0), "B1": (700.0, 1000.0), "RA1": (610.0, 860.0),
-            "B2": (500.0, 707.0), "B3": (353.0, 500.0)
-        }
-        fw, fh = sizes.get(self.v_sheet_fmt.get(), (297.0, 420.0))
-        if self.v_orient.get() == "Landscape": fw, fh = fh, fw
+        fw, fh = self._get_sheet_size()
         
         # Przybliżony rozmiar strony netto (1/2 arkusza)
         page_w = fw / 2
@@ -782,14 +2397,60 @@ class ImpositionApp:
             
         # Zapisz parametry w słowniku
         
+        self.gen_params = self._collect_params()
+        
+        # Upewnij się co do ścieżki
+        if self.gen_params["auto_save"] and self.gen_params["output_path"]:
+             raw_path = self.gen_params["output_path"]
+             if not os.path.isabs(raw_path):
+                 base_dir = os.path.expanduser("~")
+                 if self.src_file: base_dir = os.path.dirname(self.src_file)
+                 self.gen_params["output_path"] = os.path.join(base_dir, raw_path)
+
+        self.ready_to_generate = True
+        self.root.quit()
+        # Koniec funkcji, sterowanie wróci do main()
+
+    def _finalize(self):
+        """
+        Wybór zapisanego dokumentu roboczego do przełączenia na pełną rozdzielczość.
+        Jak generowanie - wykonywane w Scribusie po zamknięciu okna (main).
+        """
+        opts = {"filetypes": [("Scribus", "*.sla")]}
+        out = self.v_output_path.get().strip()
+        if out:
+            opts["initialdir"] = os.path.dirname(out) or "."
+            opts["initialfile"] = os.path.basename(out)
+        path = filedialog.askopenfilename(**opts)
+        if not path: return
+        self.finalize_path = path
+        self.root.quit()
+
+    def _export_plan(self):
+        """Zapis planu jako JSON/JDF dla RIP-a (bez generowania dokumentu)"""
+        if not self.preview_data:
+            messagebox.showwarning("Info", "Brak danych do eksportu.")
+            return
+        path = filedialog.asksaveasfilename(defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("JDF", "*.jdf")])
+        if not path: return
+        try:
+            sheets = export_plan(self._collect_params(), path)
+            messagebox.showinfo("Eksport planu", f"Zapisano {sheets} arkuszy:\n{path}")
+        except Exception as e:
+            messagebox.showerror("Eksport planu", str(e))
+
+    def _collect_params(self):
+        """Parametry zadania z GUI (słownik gen_params)"""
         # Normalizacja ścieżki dla Scribusa (czasem woli / zamiast \)
         if self.src_file:
             self.src_file = self.src_file.replace("\\", "/")
 
-        self.gen_params = {
+        return {
             "fmt": self.v_sheet_fmt.get(),
             "orient": 1 if self.v_orient.get() == "Landscape" else 0,
             "preview_data": self.preview_data, # Kopia danych
+            "plan_params": self.plan_params, # Parametry silnika, z których powstał plan
             "auto_save": self.v_auto_save.get(),
             "output_path": self.v_output_path.get().strip(),
             "src_mode": self.v_src_mode.get(),
@@ -797,50 +2458,1001 @@ class ImpositionApp:
             "gap": self.v_gap.get(),
             "bleed": self.v_bleed.get(),
             "paper_thickness": self.v_paper_thickness.get(),
-            "cover": self.v_cover.get(),
+            "cover": self.v_cover.get() and self.v_src_mode.get() != "gang",
             "spine": self.v_spine.get(),
-            "imp_type": self.v_imp_type.get()
+            "imp_type": self.v_imp_type.get(),
+            "print_method": self.v_print_method.get(),
+            "page_count": 0 if self.v_src_mode.get() == "gang" else ImpositionEngine.numbered_page_count(self.page_count, self._numbering_params()),
+            "numbering": None if self.v_src_mode.get() == "gang" else self._numbering_params(),
+            "sources": self.src_sources if self.v_src_mode.get() == "multi" else None,
+            "page_expr": self.v_page_count.get().strip() if self.page_seq else None,
+            "page_seq": [list(seg) for seg in self.page_seq.segments] if self.page_seq else None,
+            "slug_note": self.v_slug_note.get().strip(),
+            "crop_len": self.v_crop_len.get(),
+            "crop_offset": self.v_crop_offset.get(),
+            "incremental": self.v_incremental.get(),
+            "draft": self.v_draft.get(),
+            "copies": max(1, self.v_copies.get()),
+            "collate": self.v_collate.get()
         }
+
+    # (usunąłem stary kod _generate, który robił scribus.newDocument)
+
+    def run_imposition_job(self):
+        """Wykonywane po zamknięciu GUI"""
+        if not self.ready_to_generate: return
+        
+        ImpositionGenerator().run_imposition_job(self.gen_params)
+
+
+# --- PLAN CIĘCIA I STOSU ---
+
+class CutStackPlan:
+    """
+    Leniwy plan Cut & Stack: sekwencja arkuszy (len, indeks, iteracja) liczona
+    arytmetycznie. Każdy z cols*rows użytków to osobny stos o długości L:
+    użytek k na arkuszu j dostaje stronę k*L + j + 1 (simplex) albo k*L + 2j + 1
+    na przodzie i k*L + 2j + 2 na tyle, w lustrzanej kolumnie (dupleks).
+    Po przecięciu stosy kładzie się na sobie w kolejności użytków (wierszami).
+    """
+
+    def __init__(self, total_pages, simplex, cols=2, rows=1):
+        self.total_pages = total_pages
+        self.simplex = simplex
+        self.cols = cols
+        self.rows = rows
+        stacks = cols * rows
+        # Długość stosu; w dupleksie parzysta, żeby każdy stos zaczynał się od strony nieparzystej
+        per = -(-total_pages // stacks) if total_pages > 0 else 0
+        if not simplex: per += per % 2
+        self.stack_len = per
+        self._len = per if simplex else per // 2
+        w = 1.0 / cols
+        h = 1.0 / rows
+        self._slots = [(c * w, r * h, w, h, 0) for r in range(rows) for c in range(cols)]
+        # Tył: użytek k leży w lustrzanej kolumnie (odbicie jest inwolucją: miejsce m
+        # na tyle należy do stosu mirror[m]). Pierwsza strona stosu k: k*L + 1.
+        mirror = [r * cols + (cols - 1 - c) for r in range(rows) for c in range(cols)]
+        self._front = [(k * per + 1, slot) for k, slot in enumerate(self._slots)]
+        self._back = [(mirror[m] * per + 2, slot) for m, slot in enumerate(self._slots)]
+
+    def __len__(self):
+        return self._len
+
+    def __repr__(self):
+        return f"CutStackPlan({self.total_pages}, {self.simplex}, {self.cols}, {self.rows})"
+
+    def __iter__(self, block=1024):
+        # Porcjami: użytki i arkusze budowane przez map/zip, bez pętli Pythona po użytkach.
+        # Arkusze ze stronami spoza dokumentu (None) - tylko na końcu stosów - pojedynczo.
+        step = 1 if self.simplex else 2
+        offsets = [o for o, _ in self._front] + ([] if self.simplex else [o for o, _ in self._back])
+        full = (self.total_pages - max(offsets)) // step + 1 if offsets else 0
+        sides = itertools.repeat(("front", "back"))
+        for start in range(0, self._len, block):
+            stop = min(start + block, self._len)
+            if stop > full:
+                for j in range(start, stop):
+                    yield self._sheet(j)
+                continue
+            def side(tpl):
+                return map(list, zip(*[map(tuple.__add__, zip(range(o + step * start, o + step * stop, step)),
+                                           itertools.repeat(slot)) for o, slot in tpl]))
+            backs = map(list, itertools.repeat((), stop - start)) if self.simplex else side(self._back)
+            yield from map(dict, map(zip, sides, zip(side(self._front), backs)))
+
+    def page_columns(self, start, stop):
+        """
+        Arkusze start..stop-1 kolumnami (dla verify_plan): (prostokąty użytków
+        przodu, tyłu, strony przodu, tyłu - lista na użytek) albo None, gdy
+        porcja sięga ogona stosów (strony spoza dokumentu).
+        """
+        step = 1 if self.simplex else 2
+        tpls = [self._front] + ([] if self.simplex else [self._back])
+        if any(o + step * (stop - 1) > self.total_pages for tpl in tpls for o, _ in tpl):
+            return None
+        rects = [tuple(slot[:4] for _, slot in tpl) for tpl in tpls] + [()]
+        cols = [[range(o + step * start, o + step * stop, step) for o, _ in tpl] for tpl in tpls] + [[]]
+        return rects[0], rects[1], cols[0], cols[1]
+
+    def __getitem__(self, j):
+        if isinstance(j, slice):
+            return [self._sheet(i) for i in range(*j.indices(self._len))]
+        if j < 0: j += self._len
+        if not 0 <= j < self._len:
+            raise IndexError("CutStackPlan index out of range")
+        return self._sheet(j)
+
+    def _sheet(self, j):
+        T = self.total_pages
+        if self.simplex:
+            return {"front": [((o + j) if o + j <= T else None,) + slot for o, slot in self._front], "back": []}
+        j += j
+        return {"front": [((o + j) if o + j <= T else None,) + slot for o, slot in self._front],
+                "back": [((o + j) if o + j <= T else None,) + slot for o, slot in self._back]}
+
+# --- NAKŁAD ---
+
+class CopySequence:
+    """
+    Nakład bez powielania arkuszy: liczba egzemplarzy i kolejność druku
+    zapisywane w metadanych, a len() to liczba arkuszy do druku.
+    Kompletowane (collate): 1, 2, ..., N, 1, 2, ..., N, ...
+    Niekompletowane: 1, 1, ..., 2, 2, ..., N, N, ...
+    Dokument zawiera każdy arkusz raz.
+    """
+
+    def __init__(self, sheets, copies=1, collate=True):
+        self.sheets = max(0, sheets)
+        self.copies = max(1, copies)
+        self.collate = collate
+
+    def __len__(self):
+        return self.sheets * self.copies
+
+    def __repr__(self):
+        return f"CopySequence({self.sheets}, {self.copies}, {self.collate})"
+
+    def describe(self):
+        """Opis do metadanych (pliku pomocniczego)"""
+        return {
+            "copies": self.copies,
+            "collate": self.collate,
+            "order": "collated" if self.collate else "uncollated",
+            "sheets": self.sheets,
+            "print_sheets": len(self),
+        }
+
+# --- TELEMETRIA ---
+
+class JobTelemetry:
+    """
+    Dziennik zdarzeń generowania w formacie JSON Lines (jedno zdarzenie w linii),
+    dopisywany na bieżąco - można go śledzić (tail -f) lub wczytać do monitoringu.
+    Każde zdarzenie ma pola: ts (czas UNIX), job (identyfikator zadania), event.
+    Bez ścieżki (path=None) wszystkie metody nic nie robią.
+    """
+
+    FIT_BLOCK = 10 # Arkuszy na punkt prostej spowolnienia (mediana bloku)
+
+    def __init__(self, path=None, total_sheets=0, window=20):
+        self._time = time.time
+        self.path = path
+        self.job = os.urandom(6).hex()
+        self.total_sheets = total_sheets
+        self.t_start = time.time()
+        self.durations = deque(maxlen=window) # Czasy ostatnich arkuszy (kroczące ETA)
+        self._fit = [0, 0.0, 0.0, 0.0, 0.0] # n, Σx, Σy, Σxy, Σx² - prosta mediany bloku (y) wzgl. numeru arkusza (x)
+        self._block = []                    # (arkusz, czas) bieżącego bloku FIT_BLOCK arkuszy
+        self._first_sheet = None
+        self._last_sheet = None
+        self._f = None
+        if path:
+            try:
+                d = os.path.dirname(os.path.abspath(path))
+                if not os.path.isdir(d): os.makedirs(d)
+                self._f = open(path, "a", encoding="utf-8")
+            except Exception:
+                self._f = None # Telemetria nie może przerwać zadania
+
+    @property
+    def enabled(self):
+        return self._f is not None
+
+    def emit(self, event, **fields):
+        if self._f is None: return
+        rec = {"ts": round(self._time(), 3), "job": self.job, "event": event}
+        rec.update(fields)
+        try:
+            self._f.write(json.dumps(rec, ensure_ascii=False, default=str) + "\n")
+            self._f.flush()
+        except Exception:
+            pass
+
+    def sheet_done(self, sheet, seconds, objects, forms):
+        """Arkusz gotowy: czas, liczba obiektów, kroczące ETA i wydajność (arkusze/min)"""
+        if self._f is None: return
+        self.durations.append(seconds)
+        self._block.append((sheet, seconds))
+        if len(self._block) == self.FIT_BLOCK:
+            x = sum(b[0] for b in self._block) / float(self.FIT_BLOCK)
+            y = sorted(b[1] for b in self._block)[self.FIT_BLOCK // 2]
+            fit = self._fit
+            fit[0] += 1; fit[1] += x; fit[2] += y; fit[3] += x * y; fit[4] += x * x
+            self._block = []
+        if self._first_sheet is None: self._first_sheet = sheet
+        self._last_sheet = sheet
+        avg = sum(self.durations) / len(self.durations)
+        remaining = max(self.total_sheets - sheet, 0)
+        self.emit("sheet_done", sheet=sheet, total_sheets=self.total_sheets, forms=forms,
+                  seconds=round(seconds, 4), objects=objects,
+                  eta_s=round(avg * remaining, 1),
+                  sheets_per_min=round(60.0 / avg, 1) if avg > 0 else None,
+                  elapsed_s=round(self._time() - self.t_start, 3))
+
+    def slowdown(self, min_sheets=50):
+        """
+        Czas arkusza na końcu / na początku zadania według prostej dopasowanej
+        metodą najmniejszych kwadratów do median kolejnych bloków FIT_BLOCK
+        arkuszy (~1.0 = koszt liniowy, bez degradacji). Mediana bloku pomija
+        pojedyncze przerwy (pełny przebieg GC, planista systemu), które przy
+        porównaniu okien lub średnich decydowałyby o wyniku.
+        """
+        n, sx, sy, sxy, sxx = self._fit
+        if n * self.FIT_BLOCK < min_sheets: return None
+        d = n * sxx - sx * sx
+        if d <= 0: return None
+        slope = (n * sxy - sx * sy) / d
+        base = (sy - slope * sx) / n
+        start = base + slope * self._first_sheet
+        end = base + slope * self._last_sheet
+        return round(end / start, 2) if start > 0 else None
+
+    def close(self, ok, **fields):
+        if self._f is None: return
+        self.emit("job_end", ok=ok, seconds=round(self._time() - self.t_start, 3),
+                  slowdown=self.slowdown(), **fields)
+        try: self._f.close()
+        except Exception: pass
+        self._f = None
+
+# --- KONTEKST ZADANIA ---
+
+
+class JobContext(namedtuple("JobContext", (
+        "gap", "bleed", "src_mode", "src_file", "paper_thickness", "imp_type",
+        "slug_note", "crop", "numbering", "design_cycle", "source", "sequence",
+        "export", "copies", "reg_color", "sheet", "draft"))):
+    """
+    Niezmienny stan jednego zadania przekazywany do funkcji wstawiających treść
+    i rysujących znaczniki (zamiast atrybutów generatora). Zmiany tworzą nową
+    kopię (_replace / for_sheet), więc kilka zadań może liczyć geometrię
+    równolegle; sam zapis do Scribusa pozostaje sekwencyjny.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_params(cls, p, export=None, reg_color="Registration"):
+        numbering = ImpositionEngine.numbering_spec(p.get("numbering"))
+        # Numerowane komplety z jednego wzoru: strona planu -> strona wzoru
+        design_cycle = numbering["design_pages"] if numbering and numbering["count"] > 0 else 0
+        return cls(
+            gap=p["gap"],
+            bleed=p["bleed"],
+            src_mode=p["src_mode"],
+            src_file=p["src_file"],
+            paper_thickness=p.get("paper_thickness", 0.0),
+            imp_type=p.get("imp_type", ImpositionEngine.TYPE_SADDLE),
+            slug_note=p.get("slug_note", ""),
+            crop=(p.get("crop_len", 5.0), p.get("crop_offset", 2.0), p.get("crop_width", 0.1)),
+            numbering=numbering,
+            design_cycle=design_cycle,
+            # Wiele plików źródłowych: strona planu -> (plik, strona), rozwiązywane przy wstawianiu
+            source=PageSource(p["sources"]) if p["src_mode"] == "multi" else None,
+            sequence=PageSequence(p["page_seq"]) if p.get("page_seq") else None,
+            export=export,
+            copies=CopySequence(len(p["preview_data"]), p.get("copies", 1), p.get("collate", True)),
+            reg_color=reg_color,
+            sheet={},
+            draft=bool(p.get("draft", False)),
+        )
+
+    def for_sheet(self, sheet):
+        """Kontekst dla arkusza planu (metadane: składka, grzbiety, forma...)"""
+        return self._replace(sheet=sheet)
+
+def resolve_page(ctx, pg):
+    """
+    Strona planu -> (plik, strona, czy PDF) albo None (pusta strona).
+    Kolejno: komplety numeracji, wyrażenie kolejności, wiele plików, eksport
+    aktualnego dokumentu; krotka (plik, strona) to strona innego pliku.
+    """
+    if pg is None: return None
+    if not isinstance(pg, tuple):
+        if ctx.design_cycle:
+            pg = (pg - 1) % ctx.design_cycle + 1
+        if ctx.sequence is not None:
+            pg = ctx.sequence.resolve(pg)
+            if pg is None: return None # Pusta strona (blank)
+        if not isinstance(pg, tuple) and ctx.source is not None:
+            pg = ctx.source.resolve(pg)
+            if pg is None: return None # Wstawiona pusta strona
+        if not isinstance(pg, tuple) and ctx.export:
+            pg = ctx.export.get(pg, pg) # Aktualny dokument wyeksportowany do PDF
+    if isinstance(pg, tuple):
+        return pg[0], pg[1], True
+    return ctx.src_file, pg, ctx.src_mode == "pdf"
+
+def item_frame(ctx, item, dw, dh):
+    """
+    Ramka użytku (x, y, w, h) w mm: pozycja na arkuszu pomniejszona o odstęp,
+    z przesunięciem Creep (Shingling) dla głębszych arkuszy składki.
+    Wspólna dla treści, linii cięcia i aktualizacji istniejącego dokumentu.
+    """
+    pg, xr, yr, wr, hr, rot = item
+    gap = ctx.gap
+    
+    x = xr * dw
+    y = yr * dh
+    w = wr * dw
+    h = hr * dh
+    
+    # Im głębiej (większy sheet_idx), tym bardziej przesuwamy do grzbietu (do środka)
+    th = ctx.paper_thickness
+    if th > 0:
+        meta = ctx.sheet
+        creep_shift = meta.get("sheet_idx", 0) * th
+        if creep_shift > 0:
+            # Grzbiet pionowo na środku (x=0.5); forma z obracaniem ma dwa (0.25, 0.75)
+            spine = min(meta.get("spines", (0.5,)), key=lambda sx: abs(sx - (xr + wr / 2)))
+            if xr + wr / 2 < spine - 0.01: # Lewa strona grzbietu
+                x += creep_shift
+            elif xr + wr / 2 > spine + 0.01: # Prawa strona grzbietu
+                x -= creep_shift
+    
+    # Ramka (z uwzględnieniem spadu)
+    return x + gap/2, y + gap/2, w - gap, h - gap
+
+def rotated_frame(fx, fy, fw, fh, rot):
+    """
+    Zwraca (x, y, w, h) ramki przed obrotem tak, aby po setRotation(rot)
+    (dodatni kąt = przeciwnie do ruchu wskazówek zegara, obrót wokół
+    punktu początkowego ramki) zajmowała użytek (fx, fy, fw, fh).
+    """
+    rot = rot % 360
+    if rot == 90:
+        return fx, fy + fh, fh, fw
+    if rot == 180:
+        return fx + fw, fy + fh, fw, fh
+    if rot == 270:
+        return fx + fw, fy, fh, fw
+    return fx, fy, fw, fh
+
+def number_frame(ctx, item, dw, dh):
+    """Ramka numeru w użytku (przed obrotem); przy obrocie 180° odwrócona w użytku"""
+    spec = ctx.numbering
+    nx, ny, nw, nh = spec["x"], spec["y"], spec["w"], spec["h"]
+    rot = item[5]
+    fx, fy, fw, fh = item_frame(ctx, item, dw, dh)
+    if rot % 360 == 180:
+        x, y = fx + (1.0 - nx - nw) * fw, fy + (1.0 - ny - nh) * fh
+    else:
+        x, y = fx + nx * fw, fy + ny * fh
+    return rotated_frame(x, y, nw * fw, nh * fh, rot)
+
+def reg_mark_positions(dw, dh, margin=5.0):
+    """Środki paserów na arkuszu (rogi, środki krawędzi) w mm"""
+    return [
+        (margin, margin), # LG
+        (dw/2, margin),   # Środek Góra
+        (dw-margin, margin), # PG
+        (margin, dh-margin), # LD
+        (dw/2, dh-margin),   # Środek Dół
+        (dw-margin, dh-margin), # PD
+        (margin, dh/2), # Środek Lewy
+        (dw-margin, dh/2) # Środek Prawy
+    ]
+
+def prepare_jobs(tickets, workers=None):
+    """
+    Etap planu dla wielu biletów naraz (pula wątków): build_job_params bez
+    Scribusa. Zwraca listę (parametry, None) albo (None, wyjątek) w kolejności
+    biletów. Odczyt plików PDF (liczba stron) zwalnia GIL, więc wątki skracają
+    przygotowanie dużych wsadów.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    
+    def build(ticket):
+        try:
+            if isinstance(ticket, Exception): raise ticket
+            return build_job_params(ticket, ImpositionEngine()), None
+        except Exception as e:
+            return None, e
+    
+    with ThreadPoolExecutor(max_workers=workers or min(8, (os.cpu_count() or 1) + 2)) as pool:
+        return list(pool.map(build, tickets))
+
+# --- EKSPORT PLANU (JSON / JDF) ---
+
+PLAN_SCHEMA = "scribus-impozycja/plan"
+PLAN_SCHEMA_VERSION = 1
+MM_TO_PT = 72.0 / 25.4
+
+def job_sheet_size(p):
+    """Wymiary arkusza zadania w mm (jak dokument tworzony przez generator)"""
+    fw, fh = SHEET_SIZES.get(p["fmt"], (297.0, 420.0))
+    if p.get("orient") == 1: fw, fh = max(fw, fh), min(fw, fh)
+    return fw, fh
+
+def plan_slots(ctx, items, dw, dh):
+    """Użytki strony arkusza z treścią: (pozycja w planie, plik, strona, (x, y, w, h) mm, obrót)"""
+    for item in items:
+        ref = resolve_page(ctx, item[0])
+        if ref is None: continue
+        src, page, is_pdf = ref
+        pos = item[0] if not isinstance(item[0], tuple) else None
+        yield pos, src, page, item_frame(ctx, item, dw, dh), item[5] % 360
+
+def export_plan(p, path, fmt=None):
+    """
+    Zapisuje plan zadania (parametry build_job_params / gen_params) jako opis
+    układu dla RIP-a: wersjonowany JSON albo JDF (Layout + RunList), bez Scribusa.
+    Arkusze są zapisywane strumieniowo, jeden po drugim - plan nie jest
+    rozwijany w pamięci (także leniwe plany Cut & Stack). Zwraca liczbę arkuszy.
+    """
+    fmt = (fmt or ("jdf" if path.lower().endswith((".jdf", ".xml")) else "json")).lower()
+    dw, dh = job_sheet_size(p)
+    ctx = JobContext.from_params(p)
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "jdf":
+            return _write_plan_jdf(f, ctx, p, dw, dh)
+        return _write_plan_json(f, ctx, p, dw, dh)
+
+def _write_plan_json(f, ctx, p, dw, dh):
+    r = lambda v: round(v, 3)
+    head = {
+        "schema": PLAN_SCHEMA,
+        "version": PLAN_SCHEMA_VERSION,
+        "units": "mm",
+        "origin": "top-left",
+        "sheet": {"format": p["fmt"], "width": r(dw), "height": r(dh)},
+        "job": {k: p.get(k) for k in ("imp_type", "print_method", "src_mode", "src_file", "page_count",
+                                       "gap", "bleed", "paper_thickness", "copies", "collate")},
+    }
+    text = json.dumps(head, ensure_ascii=False)
+    f.write(text[:-1] + ', "sheets": [\n')
+    count = 0
+    for i, sheet in enumerate(p["preview_data"]):
+        c = ctx.for_sheet(sheet)
+        sides = {}
+        for side in ("front", "back"):
+            if not sheet[side]: continue
+            sides[side] = [{"position": pos, "file": src, "page": page,
+                            "rect": [r(v) for v in rect], "rotate": rot}
+                           for pos, src, page, rect, rot in plan_slots(c, sheet[side], dw, dh)]
+        marks = {"registration": [[r(x), r(y)] for x, y in reg_mark_positions(dw, dh)],
+                 "fold": [r(dw * sx) for sx in sheet.get("spines", (0.5,))]}
+        meta = {k: v for k, v in sheet.items() if k not in ("front", "back")}
+        f.write((",\n" if i else "") + json.dumps({"index": i + 1, "meta": meta, "sides": sides, "marks": marks},
+                                                 ensure_ascii=False))
+        count += 1
+    f.write(f'\n], "total_sheets": {count}}}\n')
+    return count
+
+def _write_plan_jdf(f, ctx, p, dw, dh):
+    """JDF 1.4: Layout (arkusz / strona) z ContentObject i MarkObject, RunList ze stronami źródeł"""
+    import pathlib
+    from xml.sax.saxutils import quoteattr
+    pt = lambda v: f"{v * MM_TO_PT:.2f}"
+    W, H = dw, dh
+    ords = {} # (plik, strona) -> Ord (kolejne strony logiczne RunList)
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write(f'<JDF xmlns="http://www.CIP4.org/JDFSchema_1_1" ID="IMPO" Type="Imposition" JobPartID="P1" '
+            f'Status="Waiting" Version="1.4" DescriptiveName={quoteattr(os.path.basename(p.get("src_file") or ""))}>\n')
+    f.write(' <ResourcePool>\n')
+    f.write('  <Layout Class="Parameter" ID="LAY" Status="Available" PartIDKeys="SheetName Side">\n')
+    count = 0
+    for i, sheet in enumerate(p["preview_data"]):
+        c = ctx.for_sheet(sheet)
+        f.write(f'   <Layout SheetName="S{i + 1}" SurfaceContentsBox="0 0 {pt(W)} {pt(H)}">\n')
+        for side, side_name in (("front", "Front"), ("back", "Back")):
+            if not sheet[side]: continue
+            f.write(f'    <Layout Side="{side_name}">\n')
+            cuts = []
+            for pos, src, page, (x, y, w, h), rot in plan_slots(c, sheet[side], dw, dh):
+                ord_ = ords.setdefault((src, page), len(ords))
+                # Układ PDF: początek w lewym dolnym rogu, y w górę
+                X, Y = x, H - y - h
+                if rot == 90:
+                    ctm, trim = f"0 1 -1 0 {pt(X + w)} {pt(Y)}", (h, w)
+                elif rot == 180:
+                    ctm, trim = f"-1 0 0 -1 {pt(X + w)} {pt(Y + h)}", (w, h)
+                elif rot == 270:
+                    ctm, trim = f"0 -1 1 0 {pt(X)} {pt(Y + h)}", (h, w)
+                else:
+                    ctm, trim = f"1 0 0 1 {pt(X)} {pt(Y)}", (w, h)
+                f.write(f'     <ContentObject Ord="{ord_}" CTM="{ctm}" ClipBox="{pt(X)} {pt(Y)} {pt(X + w)} {pt(Y + h)}" '
+                        f'TrimSize="{pt(trim[0])} {pt(trim[1])}"/>\n')
+                cuts += [(X, Y, "LowerLeft"), (X + w, Y, "LowerRight"), (X, Y + h, "UpperLeft"), (X + w, Y + h, "UpperRight")]
+            f.write(f'     <MarkObject Ord="-1" CTM="1 0 0 1 0 0" ClipBox="0 0 {pt(W)} {pt(H)}">\n')
+            for mx, my in reg_mark_positions(dw, dh):
+                f.write(f'      <RegisterMark Center="{pt(mx)} {pt(H - my)}" MarkType="Cross" MarkUsage="Color"/>\n')
+            for cx, cy, kind in cuts:
+                f.write(f'      <CutMark Position="{pt(cx)} {pt(cy)}" MarkType="{kind}"/>\n')
+            f.write('     </MarkObject>\n')
+            f.write('    </Layout>\n')
+        f.write('   </Layout>\n')
+        count += 1
+    f.write('  </Layout>\n')
+    
+    # RunList: ciągłe zakresy stron tego samego pliku w kolejności Ord
+    f.write('  <RunList Class="Parameter" ID="RUN" Status="Available" PartIDKeys="Run">\n')
+    runs = []
+    for (src, page), ord_ in sorted(ords.items(), key=lambda kv: kv[1]):
+        last = runs[-1] if runs else None
+        if last and last[0] == src and last[1] + last[2] == page:
+            last[2] += 1
+        else:
+            runs.append([src, page, 1, ord_])
+    for n, (src, first, length, ord_) in enumerate(runs):
+        # Ścieżka bezwzględna (względna - wobec katalogu roboczego), znaki spoza ASCII zakodowane
+        url = pathlib.Path(os.path.abspath(src)).as_uri() if src else ""
+        f.write(f'   <RunList Run="{n}" LogicalPage="{ord_}" NPage="{length}" Pages="{first - 1} ~ {first + length - 2}">\n')
+        f.write(f'    <LayoutElement><FileSpec URL={quoteattr(url)}/></LayoutElement>\n')
+        f.write('   </RunList>\n')
+    f.write('  </RunList>\n')
+    f.write(' </ResourcePool>\n')
+    f.write(' <ResourceLinkPool>\n  <LayoutLink Usage="Input" rRef="LAY"/>\n  <RunListLink Usage="Input" rRef="RUN"/>\n </ResourceLinkPool>\n')
+    f.write('</JDF>\n')
+    return count
+
+# --- EKSPORT BIEŻĄCEGO DOKUMENTU ---
+
+class CurrentDocExport:
+    """
+    Eksport bieżącego dokumentu Scribusa do PDF (scribus.PDFfile), aby tryb
+    "Aktualny dokument" wstawiał prawdziwą treść zamiast zastępczych ramek.
+    Dla każdej strony liczony jest skrót zawartości (strona wzorcowa, obiekty,
+    położenie, kolory wypełnienia i linii, krój, tekst, pliki obrazów);
+    ponownie eksportowane są tylko strony, których skrót się zmienił.
+    Stan całego dokumentu (zapisany plik .sla, kolory, style, warstwy, treść
+    stron wzorcowych) ma osobny skrót - jego zmiana albo brak możliwości jego
+    odczytu oznacza eksport wszystkich stron. Indeks (stan dokumentu, strona ->
+    skrót, plik PDF, strona w pliku) jest trzymany w katalogu tymczasowym,
+    więc bufor działa także między uruchomieniami.
+    """
+    INDEX_VERSION = 2
+    # Właściwości obiektu wpływające na wygląd strony (brak funkcji w API - pomijana)
+    OBJECT_GETTERS = ("getObjectType", "getPosition", "getSize", "getRotation", "getFillColor",
+                      "getFillShade", "getLineColor", "getLineShade", "getLineWidth", "getFont",
+                      "getFontSize", "getImageScale", "getImageOffset")
+
+    def __init__(self, cache_dir=None):
+        doc = os.path.abspath(scribus.getDocName() or "bez_nazwy")
+        key = hashlib.sha1(doc.encode("utf-8")).hexdigest()[:12]
+        self.dir = cache_dir or os.path.join(tempfile.gettempdir(), "impo_export", key)
+        self.index_path = os.path.join(self.dir, "index.json")
+        self.index = {}
+        self.doc_state = None
+        self.doc_hash = None
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == self.INDEX_VERSION:
+                self.doc_state = data["doc"]
+                self.index = data["pages"]
+        except Exception:
+            pass
+
+    @classmethod
+    def _object_parts(cls, name):
+        parts = [name]
+        for fn in cls.OBJECT_GETTERS:
+            try: parts.append(getattr(scribus, fn)(name))
+            except: pass
+        try: parts.append(scribus.getAllText(name))
+        except: pass
+        try:
+            img = scribus.getImageFile(name)
+            if img:
+                st = os.stat(img)
+                parts.append((img, st.st_mtime, st.st_size))
+        except: pass
+        return parts
+
+    @classmethod
+    def page_hash(cls, page):
+        """Skrót zawartości strony (wywołania API bez eksportu)"""
+        scribus.gotoPage(page)
+        h = hashlib.sha1()
+        try: h.update(repr(scribus.getPageSize()).encode("utf-8"))
+        except: pass
+        try: h.update(repr(scribus.getMasterPage(page)).encode("utf-8"))
+        except: pass
+        for name in scribus.getAllObjects():
+            h.update(repr(cls._object_parts(name)).encode("utf-8"))
+        return h.hexdigest()
+
+    @classmethod
+    def document_state(cls):
+        """
+        Skrót stanu wspólnego dla wszystkich stron albo None, gdy nie da się go
+        ustalić (wtedy eksport wszystkich stron). Zapisany plik .sla (czas
+        modyfikacji) obejmuje też zmiany, których API nie pokazuje.
+        """
+        h = hashlib.sha1()
+        try:
+            doc = scribus.getDocName()
+            if doc and os.path.exists(doc):
+                st = os.stat(doc)
+                h.update(repr((doc, st.st_mtime, st.st_size)).encode("utf-8"))
+            h.update(repr([(c, scribus.getColor(c)) for c in scribus.getColorNames()]).encode("utf-8"))
+            h.update(repr([(l, scribus.isLayerVisible(l), scribus.isLayerPrintable(l))
+                           for l in scribus.getLayers()]).encode("utf-8"))
+            get_styles = getattr(scribus, "getParagraphStyles", None) or scribus.getAllStyles
+            h.update(repr(get_styles()).encode("utf-8"))
+            try: h.update(repr(scribus.getCharStyles()).encode("utf-8"))
+            except AttributeError: pass
+            for master in scribus.masterPageNames():
+                scribus.editMasterPage(master)
+                try:
+                    h.update(repr([master] + [cls._object_parts(name) for name in scribus.getAllObjects()]).encode("utf-8"))
+                finally:
+                    scribus.closeMasterPage()
+        except Exception:
+            return None
+        return h.hexdigest()
+
+    def export(self):
+        """
+        Eksportuje zmienione strony. Zwraca (mapowanie strona -> (plik, strona),
+        lista wyeksportowanych stron).
+        """
+        n = scribus.pageCount()
+        try: cur = scribus.currentPage()
+        except: cur = 1
+        try:
+            state = self.document_state()
+            hashes = {pg: self.page_hash(pg) for pg in range(1, n + 1)}
+        finally:
+            try: scribus.gotoPage(cur)
+            except: pass
+        self.doc_hash = hashlib.sha1(("".join(hashes[pg] for pg in range(1, n + 1)) +
+                                      str(state)).encode("utf-8")).hexdigest()
+        
+        # Zmieniony albo nieznany stan dokumentu - bufor stron nie jest wiarygodny
+        if state is None or state != self.doc_state:
+            self.index = {}
+        changed = [pg for pg in range(1, n + 1)
+                   if self.index.get(str(pg), [None])[0] != hashes[pg]
+                   or not os.path.exists(self.index[str(pg)][1])]
+        if changed:
+            if not os.path.isdir(self.dir): os.makedirs(self.dir)
+            out = os.path.join(self.dir, f"eksport_{int(time.time() * 1000)}.pdf").replace("\\", "/")
+            pdf = scribus.PDFfile()
+            pdf.file = out
+            pdf.pages = changed
+            pdf.save()
+            for k, pg in enumerate(changed, 1):
+                self.index[str(pg)] = [hashes[pg], out, k]
+        
+        # Usuń strony, których już nie ma, i nieużywane pliki eksportu
+        self.index = {k: v for k, v in self.index.items() if int(k) <= n}
+        used = {v[1] for v in self.index.values()}
+        try:
+            for f in os.listdir(self.dir):
+                path = os.path.join(self.dir, f).replace("\\", "/")
+                if f.endswith(".pdf") and path not in used:
+                    os.remove(path)
+        except OSError:
+            pass
+        if changed or state != self.doc_state:
+            self.doc_state = state
+            try:
+                with open(self.index_path, "w", encoding="utf-8") as f:
+                    json.dump({"version": self.INDEX_VERSION, "doc": state, "pages": self.index}, f)
+            except Exception:
+                pass
+        return {int(k): (v[1], v[2]) for k, v in self.index.items()}, changed
+
+# --- HARMONOGRAM GENEROWANIA ---
+
+def default_cancel_path():
+    """Domyślny plik przerwania zadania (wspólny dla GUI, wsadu i serwera)"""
+    return os.path.join(tempfile.gettempdir(), "scribus-impozycja.cancel")
+
+class JobScheduler:
+    """
+    Odświeżanie ekranu i paska postępu według czasu, a nie liczby arkuszy,
+    oraz sprawdzanie żądania przerwania między arkuszami.
+    
+    Pełne przerysowanie płótna kosztuje tym więcej, im większy dokument,
+    więc odstęp między odświeżeniami rośnie tak, by przerysowanie zajmowało
+    najwyżej `share` czasu pracy (nie mniej niż `budget` sekund).
+    Przerwanie: metoda cancel() (np. z innego wątku) albo istnienie pliku
+    cancel_file (`python Book.py --cancel`).
+    """
+    def __init__(self, total, budget=0.5, share=0.1, cancel_file=None, clock=None):
+        self.total = total
+        self.budget = budget
+        self.share = share
+        self.cancel_file = cancel_file
+        self.clock = clock or time.monotonic
+        self.interval = budget
+        self.redraws = 0
+        self.redraw_seconds = 0.0
+        self._cancelled = False
+        self._next_poll = 0.0
+        self._last = self.clock()
+        
+        # Stary plik przerwania nie może zatrzymać nowego zadania
+        if cancel_file and os.path.exists(cancel_file):
+            try: os.remove(cancel_file)
+            except OSError: pass
+
+    def cancel(self):
+        self._cancelled = True
+
+    def cancelled(self):
+        """Czy zażądano przerwania (plik sprawdzany najwyżej co 0,1 s)"""
+        if not self._cancelled and self.cancel_file:
+            now = self.clock()
+            if now >= self._next_poll:
+                self._next_poll = now + 0.1
+                self._cancelled = os.path.exists(self.cancel_file)
+        return self._cancelled
+
+    def tick(self, done, force=False):
+        """Po arkuszu: odświeża ekran, jeśli minął odstęp. Zwraca True po odświeżeniu"""
+        now = self.clock()
+        if not force and now - self._last < self.interval:
+            return False
+        try:
+            scribus.progressSet(done)
+            scribus.statusMessage(f"Impozycja: arkusz {done}/{self.total}")
+        except Exception: pass
+        scribus.setRedraw(True)
+        scribus.setRedraw(False)
+        self._last = self.clock()
+        cost = self._last - now
+        self.redraws += 1
+        self.redraw_seconds += cost
+        self.interval = max(self.budget, cost / self.share)
+        return True
+
+# --- PAMIĘĆ ZADANIA ---
+
+def process_memory():
+    """Pamięć rezydentna procesu w MB; None, gdy system jej nie podaje"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576.0
+    except Exception:
+        pass
+    if sys.platform.startswith("win"):
+        try:
+            import ctypes
+            from ctypes import wintypes
+            class Counters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + \
+                           [(n, ctypes.c_size_t) for n in ("PeakWorkingSetSize", "WorkingSetSize",
+                            "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                            "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+            c = Counters()
+            c.cb = ctypes.sizeof(c)
+            proc = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(proc, ctypes.byref(c), c.cb):
+                return c.WorkingSetSize / 1048576.0
+        except Exception:
+            pass
+        return None
+    try:
+        import resource # Tylko szczyt (macOS: bajty, pozostałe: KB)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1048576.0 if sys.platform == "darwin" else 1024.0)
+    except Exception:
+        return None
+
+class JobMemory:
+    """
+    Pamięć procesu przed i po zadaniu (raport, telemetria, okno raportu).
+    API skryptów Scribusa nie daje dostępu do historii cofania, więc skrypt
+    nie grupuje generowania w jeden krok cofania ani nie wstrzymuje jej
+    nagrywania - zostaje pomiar, który pokazuje koszt zadania w pamięci.
+    """
+    def __init__(self):
+        self.mem_before = self.mem_after = None
+        self._open = False
+
+    def begin(self):
+        self.mem_before = process_memory()
+        self._open = True
+        return self
+
+    def end(self):
+        """Drugi pomiar (wielokrotne wywołanie jest bezpieczne)"""
+        if self._open:
+            self._open = False
+            self.mem_after = process_memory()
+        return self
+
+    def describe(self):
+        """Opis do raportu i telemetrii"""
+        mb = lambda v: round(v, 1) if v is not None else None
+        growth = None
+        if self.mem_before is not None and self.mem_after is not None:
+            growth = round(self.mem_after - self.mem_before, 1)
+        return {"memory_before_mb": mb(self.mem_before), "memory_after_mb": mb(self.mem_after),
+                "memory_growth_mb": growth}
+
+# --- GENEROWANIE (SCRIBUS) ---
+
+class ImpositionGenerator:
+    """
+    Buduje dokument impozycji w Scribusie na podstawie planu z ImpositionEngine.
+    Nie korzysta z Tk - może działać z GUI, w trybie wsadowym lub jako serwer.
+    """
+
+    # Przedrostki nazw obiektów (impo + rodzaj): pozwalają później odnaleźć w dokumencie
+    # grupy obiektów i zaktualizować tylko te, których dotyczy zmiana parametrów.
+    OBJ_PREFIX = "impo"
+    KIND_CONTENT = "C" # ramki treści
+    KIND_MARKS = "M"   # pasery, kostki, falcowanie, schodki
+    KIND_SLUG = "S"    # opis arkusza
+    KIND_CROP = "K"    # linie cięcia
+    KIND_NUMBER = "N"  # numeracja
+    NUMBER_STYLE = "impoNumer" # Wspólny styl akapitu/znaku numerów
+    # Rozdzielczość podglądu obrazów (setImagePreviewResolution): tryb roboczy / końcowy
+    PREVIEW_FULL = 0
+    PREVIEW_LOW = 2
+    
+    # Parametry, od których zależą poszczególne grupy obiektów. Zmiana innego
+    # parametru (format, plan, plik źródłowy...) wymaga pełnego generowania.
+    INCREMENTAL_KEYS = {
+        KIND_CONTENT: ("gap", "paper_thickness", "draft"),
+        KIND_CROP: ("gap", "paper_thickness", "crop_len", "crop_offset", "crop_width"),
+        KIND_SLUG: ("slug_note", "copies", "collate"),
+        KIND_NUMBER: ("gap", "paper_thickness", "numbering"),
+    }
+    # Parametry nieopisujące wyglądu dokumentu (nie są porównywane)
+    SIDECAR_SKIP = ("preview_data", "output_path", "auto_save", "incremental",
+                    "plan_export", "cancel_file", "redraw_budget", "telemetry_path")
+
+    def __init__(self):
+        _load_scribus()
+        self.doc_open = False # Czy ostatnie zadanie utworzyło dokument
+        self.obj_gen = 0 # Numer generacji nazw obiektów
+        self.obj_counter = 0
+        self.names_ok = True # Czy wszystkie ramki treści mają nazwy (duplikaty)
+        self.objects_created = 0
+        self.telemetry = JobTelemetry() # Wyłączona, dopóki zadanie nie poda telemetry_path
+        self.current_page = 1 # Strona dokumentu, na której powstają obiekty (nazwy ramek treści)
+        self.export_error = None # Błąd eksportu aktualnego dokumentu (ramki zastępcze)
+
+    def _obj_name(self, kind, idx=None):
+        """Nazwa nowego obiektu danej grupy; ramki treści: numer strony dokumentu i użytku"""
+        self.objects_created += 1
+        if idx is not None:
+            return f"{self.OBJ_PREFIX}{kind}{self.obj_gen}_{self.current_page}_{idx}"
+        self.obj_counter += 1
+        return f"{self.OBJ_PREFIX}{kind}{self.obj_gen}_{self.obj_counter}"
+
+    def _set_preview(self, name, draft):
+        """Rozdzielczość podglądu ramki; starsze API bez tej funkcji - pełna"""
+        try:
+            scribus.setImagePreviewResolution(self.PREVIEW_LOW if draft else self.PREVIEW_FULL, name)
+            return True
+        except Exception:
+            return False
+
+    def finalize_draft(self, path=None, interactive=False):
+        """
+        Przełącza ramki treści dokumentu roboczego na pełną rozdzielczość
+        (przed eksportem) - bez ponownego wczytywania PDF. path=None: aktywny
+        dokument. Plik pomocniczy dostaje draft=False, więc kolejna aktualizacja
+        przyrostowa nie wraca do trybu roboczego.
+        """
+        if path:
+            if not path.lower().endswith(".sla"): path += ".sla"
+            try:
+                is_open = scribus.haveDoc() and os.path.abspath(scribus.getDocName()) == os.path.abspath(path)
+            except: is_open = False
+            if not is_open:
+                scribus.openDoc(path)
+                self.doc_open = True
+        else:
+            path = scribus.getDocName()
+        
+        content_prefix = self.OBJ_PREFIX + self.KIND_CONTENT
+        frames = 0
+        scribus.setRedraw(False)
+        try:
+            for page in range(1, scribus.pageCount() + 1):
+                scribus.gotoPage(page)
+                for name in scribus.getAllObjects():
+                    if name.startswith(content_prefix) and self._set_preview(name, False):
+                        frames += 1
+        finally:
+            scribus.setRedraw(True)
+        scribus.saveDocAs(path)
         
-        # Upewnij się co do ścieżki
-        if self.gen_params["auto_save"] and self.gen_params["output_path"]:
-             raw_path = self.gen_params["output_path"]
-             if not os.path.isabs(raw_path):
-                 base_dir = os.path.expanduser("~")
-                 if self.src_file: base_dir = os.path.dirname(self.src_file)
-                 self.gen_params["output_path"] = os.path.join(base_dir, raw_path)
+        try:
+            with open(self.sidecar_path(path), encoding="utf-8") as f:
+                data = json.load(f)
+            data["params"]["draft"] = False
+            with open(self.sidecar_path(path), "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+        except Exception:
+            pass # Bez pliku pomocniczego - następnym razem pełne generowanie
+        
+        msg = f"Pełna rozdzielczość: {frames} ramek.\n{path}"
+        if interactive:
+            scribus.messageBox("Raport", msg, scribus.ICON_INFORMATION)
+        return {"ok": True, "message": msg, "output_path": path, "frames": frames}
 
-        self.ready_to_generate = True
-        self.root.quit()
-        # Koniec funkcji, sterowanie wróci do main()
+    @staticmethod
+    def _reg_color():
+        """Kolor pasera dostępny w dokumencie"""
+        return "Registration" if "Registration" in scribus.getColorNames() else "Black"
 
-    # (usunąłem stary kod _generate, który robił scribus.newDocument)
+    def _export_current(self, p):
+        """
+        Mapowanie strona -> (PDF, strona) dla trybu "current"; None = ramki zastępcze.
+        Błąd eksportu trafia do export_error (ostrzeżenie w raporcie zadania).
+        """
+        t0 = time.perf_counter()
+        try:
+            exp = CurrentDocExport()
+            mapping, changed = exp.export()
+        except Exception as e:
+            self.export_error = f"{type(e).__name__}: {e}"
+            self.telemetry.emit("export_failed", error=self.export_error)
+            return None
+        # Skrót treści w parametrach: zmiana dokumentu źródłowego wymusza pełne generowanie
+        p["src_hash"] = exp.doc_hash
+        self.telemetry.emit("current_export", pages=len(mapping), exported=len(changed),
+                            seconds=round(time.perf_counter() - t0, 3))
+        return mapping
 
-    def run_imposition_job(self):
-        """Wykonywane po zamknięciu GUI"""
-        if not self.ready_to_generate: return
+    def close_document(self):
+        """Zamyka dokument utworzony przez ostatnie zadanie (tryb wsadowy)"""
+        if self.doc_open:
+            try: scribus.closeDoc()
+            except: pass
+            self.doc_open = False
+
+    def run_imposition_job(self, p, interactive=True):
+        """
+        Generuje dokument impozycji według parametrów p (słownik gen_params).
+        Zwraca raport: {"ok", "message", "output_path", "sheets", "pages"}.
+        W trybie nieinteraktywnym (wsad, serwer) nie pokazuje okien messageBox,
+        a błędy są zgłaszane wyjątkiem.
+        """
+        report = {"ok": False, "message": "", "output_path": None, "sheets": 0, "pages": 0}
         
-        p = self.gen_params
-        
-        # Mapowanie formatów na wymiary (w mm)
-        sizes = {
-            "A4": (210.0, 297.0),
-            "A3": (297.0, 420.0),
-            "A2": (420.0, 594.0),
-            "SRA3": (320.0, 450.0),
-            "B1": (700.0, 1000.0),
-            "RA1": (610.0, 860.0),
-            "B2": (500.0, 707.0),
-            "B3": (353.0, 500.0)
-        }
+        fmt_arg = SHEET_SIZES.get(p["fmt"], (297.0, 420.0)) # Domyślnie A3
         
-        fmt_arg = sizes.get(p["fmt"], (297.0, 420.0)) # Domyślnie A3
+        tel = self.telemetry = JobTelemetry(p.get("telemetry_path"), len(p["preview_data"]))
+        tel.emit("job_start", sheets=len(p["preview_data"]),
+                 params={k: v for k, v in p.items() if k != "preview_data"})
+        mem = self.memory = JobMemory()
         
         try:
+            # Weryfikacja planu przed utworzeniem dokumentu
+            errors = ImpositionEngine().verify_plan(p["preview_data"], p.get("page_count") or None,
+                                                    p.get("print_method", ImpositionEngine.METHOD_SHEETWISE))
+            if errors:
+                raise ValueError("Błędny plan impozycji:\n" + "\n".join(errors))
+            
+            # Aktualny dokument: eksport do PDF (tylko zmienione strony) przed utworzeniem nowego dokumentu
+            export = None
+            self.export_error = None
+            if p["src_mode"] == "current" and p.get("export_current", True):
+                export = self._export_current(p)
+            export_warning = ""
+            if self.export_error:
+                report["export_error"] = self.export_error
+                export_warning = ("\nOSTRZEŻENIE: eksport aktualnego dokumentu do PDF nie powiódł się - "
+                                  f"wstawiono ramki zastępcze:\n{self.export_error}")
+            
+            # Aktualizacja istniejącego pliku: tylko grupy obiektów, których dotyczą zmiany
+            if p.get("incremental"):
+                updated = self._update_existing(p, export)
+                if updated is not None:
+                    updated["message"] += export_warning
+                    report.update(updated)
+                    tel.close(True, mode="incremental", output_path=report["output_path"])
+                    if interactive:
+                        scribus.messageBox("Raport", report["message"], scribus.ICON_INFORMATION)
+                    return report
+            
             # newDocument wymaga krotki (width, height) jako pierwszego argumentu w niektórych wersjach
             scribus.newDocument(fmt_arg, (0.0, 0.0, 0.0, 0.0), p["orient"], 1, scribus.UNIT_MILLIMETERS, scribus.PAGE_1, 0, 1)
+            self.doc_open = True
             doc_w, doc_h = scribus.getPageSize()
             
+            mem.begin()
+            
             # --- GENEROWANIE OKŁADKI (Opcjonalne) ---
             start_page_idx = 1
             
@@ -873,13 +3485,7 @@ class ImpositionApp:
                     l1 = scribus.createLine(sx1, 0, sx1, cover_h)
                     l2 = scribus.createLine(sx2, 0, sx2, cover_h)
                     
-                    # Cache koloru
-                    if not hasattr(self, 'reg_color'):
-                         self.reg_color = "Registration"
-                         if "Registration" not in scribus.getColorNames():
-                             self.reg_color = "Black"
-                    
-                    col = self.reg_color
+                    col = self._reg_color()
                     
                     scribus.setLineColor(col, l1)
                     scribus.setLineColor(col, l2)
@@ -921,13 +3527,9 @@ class ImpositionApp:
                 
                 # Strony impozycji zostały już dodane w pętli wyżej (pages_to_add)
             
-            # Parametry do place_on_page
-            self.current_gap = p["gap"]
-            self.current_bleed = p["bleed"]
-            self.current_src_mode = p["src_mode"]
-            self.current_src_file = p["src_file"]
-            self.current_paper_thickness = p.get("paper_thickness", 0.0)
-            self.current_imp_type = p.get("imp_type", ImpositionEngine.TYPE_SADDLE)
+            self.obj_gen = 0
+            self.obj_counter = 0
+            self.names_ok = True
             
             preview_data = p["preview_data"]
             
@@ -953,107 +3555,344 @@ class ImpositionApp:
                 scribus.progressTotal(len(preview_data))
             except: pass
             
-            # setRedraw(False) może powodować wrażenie zawieszenia przy dużej ilości obiektów.
-            # Włączmy je, żeby widzieć postęp, albo wyłączajmy tylko na chwilę.
-            scribus.setRedraw(False) 
+            # Ekran wyłączony; odświeżanie według czasu (JobScheduler), nie liczby arkuszy
+            scribus.setRedraw(False)
+            sched = self.scheduler = JobScheduler(len(preview_data), p.get("redraw_budget", 0.5),
+                                                  cancel_file=p.get("cancel_file") or default_cancel_path())
+            done = 0
             
             page_idx = start_page_idx
             
-            # Cache koloru
-            self.reg_color = "Registration"
-            if "Registration" not in scribus.getColorNames():
-                self.reg_color = "Black"
+            # Stan zadania dla funkcji wstawiających i rysujących
+            job = JobContext.from_params(p, export, self._reg_color())
+            
+            if job.numbering:
+                self._ensure_number_style(job)
 
             for i, sheet in enumerate(preview_data):
-                try: scribus.progressSet(i+1)
-                except: pass
+                # Przerwanie tylko między arkuszami: w dokumencie są wyłącznie kompletne arkusze
+                if sched.cancelled():
+                    break
+                t_sheet = time.perf_counter()
+                objects_before = self.objects_created
                 
-                # Ustaw metadane aktualnego arkusza dla funkcji pomocniczych
-                self.current_sheet_meta = sheet
+                # Metadane arkusza (składka, grzbiety, forma) w kontekście
+                ctx = job.for_sheet(sheet)
                 
                 scribus.gotoPage(page_idx)
+                self.current_page = page_idx
                 
                 # 1. Treść
-                self._place_on_page(sheet["front"], doc_w, doc_h)
+                self._place_on_page(ctx, sheet["front"], doc_w, doc_h)
+                if ctx.numbering:
+                    self._draw_numbers(ctx, sheet["front"], doc_w, doc_h)
                 
                 # 2. Znaczniki
-                self._draw_marks(doc_w, doc_h, "AWERS (Front)", i+1, len(preview_data)) 
-                self._draw_all_crop_marks(sheet["front"], doc_w, doc_h)
+                side_name = "AWERS (Front)"
+                if sheet.get("work_form") == "turn": side_name = "FORMA (Obracanie przez bok)"
+                elif sheet.get("work_form") == "tumble": side_name = "FORMA (Przewracanie przez głowę)"
+                self._draw_marks(ctx, doc_w, doc_h, side_name, i+1, len(preview_data))
+                self._draw_all_crop_marks(ctx, sheet["front"], doc_w, doc_h)
                 
                 page_idx += 1
                 
                 if sheet["back"]:
                     scribus.gotoPage(page_idx)
+                    self.current_page = page_idx
                     
                     # 1. Treść
-                    self._place_on_page(sheet["back"], doc_w, doc_h)
+                    self._place_on_page(ctx, sheet["back"], doc_w, doc_h)
+                    if ctx.numbering:
+                        self._draw_numbers(ctx, sheet["back"], doc_w, doc_h)
                     
                     # 2. Znaczniki
-                    self._draw_marks(doc_w, doc_h, "REWERS (Back)", i+1, len(preview_data))
-                    self._draw_all_crop_marks(sheet["back"], doc_w, doc_h)
+                    self._draw_marks(ctx, doc_w, doc_h, "REWERS (Back)", i+1, len(preview_data))
+                    self._draw_all_crop_marks(ctx, sheet["back"], doc_w, doc_h)
                     
                     page_idx += 1
                 
-                # Odśwież co 5 arkuszy, żeby nie wyglądało na zwis
-                if i % 5 == 0:
-                   scribus.setRedraw(True)
-                   scribus.setRedraw(False)
+                tel.sheet_done(i+1, time.perf_counter() - t_sheet,
+                               self.objects_created - objects_before, 1 + bool(sheet["back"]))
+                done = i + 1
+                sched.tick(done)
             
+            if done < len(preview_data):
+                return self._finish_cancelled(p, report, done, page_idx, interactive)
+            
+            sched.tick(done, force=True)
             scribus.setRedraw(True)
             try: scribus.progressReset()
             except: pass
+            tel.emit("redraw", count=sched.redraws, seconds=round(sched.redraw_seconds, 3))
+            report.update(mem.end().describe())
+            tel.emit("memory", **mem.describe())
+            
+            report["ok"] = True
+            report["sheets"] = len(preview_data)
+            report["pages"] = total_doc_pages
+            report["copies"] = job.copies.copies
+            report["print_sheets"] = len(job.copies)
             
             msg = "Dokument został wygenerowany w nowym oknie Scribusa.\n"
+            if export_warning:
+                msg += export_warning.lstrip("\n") + "\n"
+            if job.copies.copies > 1:
+                msg += f"Nakład: {job.copies.copies} egz. = {len(job.copies)} arkuszy do druku.\n"
+            if report["memory_growth_mb"] is not None:
+                msg += (f"Pamięć procesu: +{report['memory_growth_mb']} MB (historia cofania Scribusa "
+                        "nie jest sterowana przez skrypt).\n")
             if p["auto_save"]:
                 path = p["output_path"]
                 if path:
                     if not path.lower().endswith(".sla"): path += ".sla"
                     try:
+                        t_save = time.perf_counter()
                         scribus.saveDocAs(path)
+                        tel.emit("save", path=path, seconds=round(time.perf_counter() - t_save, 3))
                         if os.path.exists(path):
                             msg += f"\nSUKCES: Zapisano plik:\n{path}"
+                            report["output_path"] = path
+                            error = self._write_sidecar(path, p, start_page_idx)
+                            if error:
+                                report["sidecar_error"] = error
+                                msg += f"\nOSTRZEŻENIE: brak pliku pomocniczego (następna aktualizacja = pełne generowanie):\n{error}"
                         else:
                             msg += "\nOSTRZEŻENIE: Zapisano, ale brak pliku na dysku."
                     except Exception as e:
+                        tel.emit("save_failed", path=path, error=f"{type(e).__name__}: {e}")
+                        if not interactive: raise
+                        report["ok"] = False
                         msg += f"\nBŁĄD ZAPISU:\n{e}"
                 else:
                     msg += "\nAnulowano zapis (brak ścieżki)."
             else:
                 msg += "\nPlik niezapisany."
-                
-            scribus.messageBox("Raport", msg, scribus.ICON_INFORMATION)
+            
+            report["message"] = msg
+            tel.close(report["ok"], mode="full", output_path=report["output_path"],
+                      sheets=report["sheets"], pages=report["pages"])
+            if interactive:
+                scribus.messageBox("Raport", msg, scribus.ICON_INFORMATION)
             
         except Exception as e:
              scribus.setRedraw(True)
+             tel.emit("job_failed", error=f"{type(e).__name__}: {e}")
+             tel.close(False)
+             if not interactive: raise
+             report["message"] = str(e)
              scribus.messageBox("Błąd Krytyczny", str(e), scribus.ICON_WARNING)
+        finally:
+            mem.end() # Pomiar także po błędzie i przerwaniu
+        
+        return report
+
+    def _finish_cancelled(self, p, report, done, next_page, interactive):
+        """
+        Domyka przerwane zadanie: usuwa puste (dodane z góry) strony za ostatnim
+        kompletnym arkuszem, a przy auto-zapisie zapisuje część obok pliku
+        docelowego, bez pliku pomocniczego (plan nie jest kompletny).
+        """
+        for n in range(scribus.pageCount(), max(next_page, 2) - 1, -1):
+            scribus.deletePage(n)
+        if next_page == 1:
+            # Przerwano przed pierwszym arkuszem (bez okładki): Scribus nie usuwa
+            # ostatniej strony dokumentu, więc strona 1 zostaje pusta
+            scribus.gotoPage(1)
+            for name in scribus.getAllObjects():
+                scribus.deleteObject(name)
+        report.update(self.memory.end().describe())
+        scribus.setRedraw(True)
+        try: scribus.progressReset()
+        except: pass
+        
+        report.update(ok=False, cancelled=True, sheets=done, pages=next_page - 1)
+        msg = f"Przerwano po {done} z {len(p['preview_data'])} arkuszy."
+        if p["auto_save"] and p["output_path"]:
+            path = os.path.splitext(p["output_path"])[0] + "_przerwane.sla"
+            scribus.saveDocAs(path)
+            report["output_path"] = path
+            msg += f"\nZapisano część:\n{path}"
+        report["message"] = msg
+        
+        self.telemetry.emit("cancelled", sheets=done, output_path=report["output_path"])
+        self.telemetry.close(False, mode="cancelled", sheets=done, pages=report["pages"])
+        if interactive:
+            scribus.messageBox("Przerwano", msg, scribus.ICON_INFORMATION)
+        return report
+
+    # --- AKTUALIZACJA PRZYROSTOWA ---
+
+    @staticmethod
+    def sidecar_path(sla_path):
+        """Plik z parametrami zadania zapisywany obok dokumentu .sla"""
+        return os.path.splitext(sla_path)[0] + ".impo.json"
+
+    @staticmethod
+    def _plan_hash(p):
+        """
+        Skrót parametrów wyznaczających plan: rodzaj, metoda, liczba stron, format
+        i parametry silnika (plan_params). Zadanie bez plan_params (plan podany
+        z zewnątrz) - skrót stron i geometrii wszystkich użytków.
+        """
+        key = {k: p.get(k) for k in ("imp_type", "print_method", "page_count", "fmt", "orient", "plan_params")}
+        key["sheets"] = len(p["preview_data"])
+        h = hashlib.sha1(json.dumps(key, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8"))
+        if p.get("plan_params") is None:
+            for sheet in p["preview_data"]:
+                h.update(json.dumps([sheet["front"], sheet["back"], sheet.get("work_form")], default=str).encode("utf-8"))
+        return h.hexdigest()
+
+    def _write_sidecar(self, path, p, start_page):
+        """
+        Zapisuje parametry zadania i skrót planu dla późniejszej aktualizacji.
+        Zwraca opis błędu zapisu (zdarzenie sidecar_failed w telemetrii) albo None.
+        """
+        params = {k: v for k, v in p.items() if k not in self.SIDECAR_SKIP}
+        data = {
+            "version": 1,
+            "params": params,
+            "plan_hash": self._plan_hash(p),
+            "start_page": start_page,
+            "gen": self.obj_gen,
+            "names_ok": self.names_ok,
+            "copies": CopySequence(len(p["preview_data"]), p.get("copies", 1), p.get("collate", True)).describe(),
+        }
+        try:
+            with open(self.sidecar_path(path), "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+        except Exception as e:
+            # Dokument jest zapisany; bez pliku pomocniczego następnym razem pełne generowanie
+            error = f"{type(e).__name__}: {e}"
+            self.telemetry.emit("sidecar_failed", path=self.sidecar_path(path), error=error)
+            return error
+        return None
+
+    def diff_job(self, prev, p):
+        """
+        Porównuje zadanie z parametrami zapisanymi w pliku pomocniczym.
+        Zwraca zbiór grup obiektów do odświeżenia (KIND_*) albo None,
+        jeśli zmiana wymaga pełnego generowania.
+        """
+        old = prev.get("params", {})
+        new = {k: v for k, v in p.items() if k not in self.SIDECAR_SKIP}
+        if prev.get("plan_hash") != self._plan_hash(p):
+            return None
+        
+        changed = {k for k in set(old) | set(new) if old.get(k) != new.get(k)}
+        groups = set()
+        for key in changed:
+            kinds = [kind for kind, keys in self.INCREMENTAL_KEYS.items() if key in keys]
+            if not kinds: return None
+            groups.update(kinds)
+        if self.KIND_CONTENT in groups and not prev.get("names_ok", False):
+            return None
+        return groups
+
+    def _update_existing(self, p, export=None):
+        """
+        Aktualizuje wcześniej wygenerowany dokument zamiast budować go od nowa:
+        ramki treści są tylko przesuwane (bez ponownego loadImage), a znaczniki
+        i opis rysowane ponownie tylko wtedy, gdy zmieniły się ich parametry.
+        Zwraca raport albo None, jeśli potrzebne jest pełne generowanie.
+        """
+        path = p.get("output_path") or ""
+        if not path: return None
+        if not path.lower().endswith(".sla"): path += ".sla"
+        try:
+            with open(self.sidecar_path(path), encoding="utf-8") as f:
+                prev = json.load(f)
+        except Exception:
+            return None
+        if not os.path.exists(path): return None
+        
+        groups = self.diff_job(prev, p)
+        if groups is None: return None
+        
+        copies = CopySequence(len(p["preview_data"]), p.get("copies", 1), p.get("collate", True))
+        report = {"ok": True, "output_path": path, "sheets": len(p["preview_data"]), "pages": 0,
+                  "copies": copies.copies, "print_sheets": len(copies)}
+        if not groups:
+            report["message"] = f"Dokument jest aktualny - brak zmian:\n{path}"
+            return report
+        
+        # Dokument może być już otwarty (np. po poprzednim uruchomieniu)
+        is_open = False
+        try:
+            is_open = scribus.haveDoc() and os.path.abspath(scribus.getDocName()) == os.path.abspath(path)
+        except: pass
+        if not is_open:
+            scribus.openDoc(path)
+            self.doc_open = True
+        doc_w, doc_h = scribus.getPageSize()
+        
+        job = JobContext.from_params(p, export, self._reg_color())
+        self.obj_gen = prev.get("gen", 0) + 1
+        self.obj_counter = 0
+        self.names_ok = prev.get("names_ok", False)
+        
+        if self.KIND_NUMBER in groups and job.numbering:
+            self._ensure_number_style(job)
+        
+        preview_data = p["preview_data"]
+        prefixes = tuple(self.OBJ_PREFIX + kind for kind in groups if kind != self.KIND_CONTENT)
+        content_prefix = self.OBJ_PREFIX + self.KIND_CONTENT
+        
+        scribus.setRedraw(False)
+        try:
+            page_idx = prev.get("start_page", 1)
+            for i, sheet in enumerate(preview_data):
+                ctx = job.for_sheet(sheet)
+                front_name = {"turn": "FORMA (Obracanie przez bok)",
+                              "tumble": "FORMA (Przewracanie przez głowę)"}.get(sheet.get("work_form"), "AWERS (Front)")
+                for side_name, items in ((front_name, sheet["front"]), ("REWERS (Back)", sheet["back"])):
+                    if side_name.startswith("REWERS") and not items: continue
+                    scribus.gotoPage(page_idx)
+                    self.current_page = page_idx
+                    
+                    for name in scribus.getAllObjects():
+                        if prefixes and name.startswith(prefixes):
+                            scribus.deleteObject(name)
+                        elif self.KIND_CONTENT in groups and name.startswith(content_prefix):
+                            idx = int(name.rsplit("_", 1)[1])
+                            pg, xr, yr, wr, hr, rot = items[idx]
+                            fx, fy, fw, fh = rotated_frame(*item_frame(ctx, items[idx], doc_w, doc_h), rot)
+                            scribus.sizeObject(fw, fh, name)
+                            scribus.moveObjectAbs(fx, fy, name)
+                            self._set_preview(name, ctx.draft)
+                    
+                    if self.KIND_CROP in groups:
+                        self._draw_all_crop_marks(ctx, items, doc_w, doc_h)
+                    if self.KIND_SLUG in groups:
+                        self._draw_slug_info(ctx, doc_w, doc_h, side_name, i+1, len(preview_data))
+                    if self.KIND_NUMBER in groups and ctx.numbering:
+                        self._draw_numbers(ctx, items, doc_w, doc_h)
+                    page_idx += 1
+                    report["pages"] += 1
+        finally:
+            scribus.setRedraw(True)
+        
+        scribus.saveDocAs(path)
+        error = self._write_sidecar(path, p, prev.get("start_page", 1))
+        
+        names = {self.KIND_CONTENT: "ramki treści", self.KIND_CROP: "linie cięcia",
+                 self.KIND_SLUG: "opis arkusza", self.KIND_NUMBER: "numeracja"}
+        report["message"] = ("Zaktualizowano istniejący dokument (" +
+                             ", ".join(names[k] for k in sorted(groups)) + f"):\n{path}")
+        if error:
+            report["sidecar_error"] = error
+            report["message"] += f"\nOSTRZEŻENIE: brak pliku pomocniczego (następna aktualizacja = pełne generowanie):\n{error}"
+        return report
 
-    def _draw_marks(self, dw, dh, side_name="", sheet_num=0, total_sheets=0):
+    def _draw_marks(self, ctx, dw, dh, side_name="", sheet_num=0, total_sheets=0):
         """Rysuje pasery i kostki."""
         
-        # Kolor Registration (z cache)
-        if hasattr(self, 'reg_color'):
-            reg_color = self.reg_color
-        else:
-            reg_color = "Registration"
-            if not reg_color in scribus.getColorNames():
-                scribus.defineColor("Registration", 255, 255, 255, 255)
-                reg_color = "Registration"
+        # Kolor Registration (ustalony raz dla dokumentu)
+        reg_color = ctx.reg_color
         
         mark_size = 5.0 # mm
         margin = 5.0 # Odstęp od krawędzi arkusza
         
-        positions = [
-            (margin, margin), # LG
-            (dw/2, margin),   # Środek Góra
-            (dw-margin, margin), # PG
-            (margin, dh-margin), # LD
-            (dw/2, dh-margin),   # Środek Dół
-            (dw-margin, dh-margin), # PD
-            (margin, dh/2), # Środek Lewy
-            (dw-margin, dh/2) # Środek Prawy
-        ]
-        
-        for x, y in positions:
+        for x, y in reg_mark_positions(dw, dh, margin):
             self._draw_reg_mark(x, y, mark_size, reg_color)
 
         # 2. Pasek kolorów (Color Bar)
@@ -1081,50 +3920,51 @@ class ImpositionApp:
         colors = ["Cyan", "Magenta", "Yellow", "Black"]
         for i, col in enumerate(colors):
             if col in scribus.getColorNames():
-                r = scribus.createRect(start_x + i*box_w, start_y, box_w, box_h)
+                r = scribus.createRect(start_x + i*box_w, start_y, box_w, box_h, self._obj_name(self.KIND_MARKS))
                 scribus.setFillColor(col, r)
                 scribus.setLineColor("None", r)
 
         # 3. Znaczniki Falcowania (Fold Marks)
-        self._draw_fold_marks(dw, dh, reg_color)
+        self._draw_fold_marks(ctx, dw, dh, reg_color)
 
         # 4. Znaczniki Kompletowania (Collation Marks)
-        if self.current_imp_type == ImpositionEngine.TYPE_PERFECT:
-             self._draw_collation_marks(dw, dh)
+        if ctx.imp_type == ImpositionEngine.TYPE_PERFECT:
+             self._draw_collation_marks(ctx, dw, dh)
 
         # 5. Opis Arkusza (Slug)
-        self._draw_slug_info(dw, dh, side_name, sheet_num, total_sheets)
+        self._draw_slug_info(ctx, dw, dh, side_name, sheet_num, total_sheets)
 
-    def _draw_fold_marks(self, dw, dh, color):
+    def _draw_fold_marks(self, ctx, dw, dh, color):
         """Rysuje linie falcowania (przerywane) na marginesach."""
         # Pionowa linia środkowa (Grzbiet)
         # Rysujemy tylko na marginesach (poza obszarem spadu)
         # Zakładamy margines ok 10mm, spad 3mm.
         margin_len = 8.0 
         
-        cx = dw / 2
-        cy = dh / 2
-        
-        # Góra
-        l1 = scribus.createLine(cx, 0, cx, margin_len)
-        scribus.setLineColor(color, l1)
-        try: scribus.setLineStyle(scribus.LINE_DASH, l1)
-        except: pass
+        # Forma z obracaniem ma osobny grzbiet w każdej połowie
+        spines = ctx.sheet.get("spines", (0.5,))
         
-        # Dół
-        l2 = scribus.createLine(cx, dh - margin_len, cx, dh)
-        scribus.setLineColor(color, l2)
-        try: scribus.setLineStyle(scribus.LINE_DASH, l2)
-        except: pass
+        for sx in spines:
+            cx = dw * sx
+            
+            # Góra
+            l1 = scribus.createLine(cx, 0, cx, margin_len, self._obj_name(self.KIND_MARKS))
+            scribus.setLineColor(color, l1)
+            try: scribus.setLineStyle(scribus.LINE_DASH, l1)
+            except: pass
+            
+            # Dół
+            l2 = scribus.createLine(cx, dh - margin_len, cx, dh, self._obj_name(self.KIND_MARKS))
+            scribus.setLineColor(color, l2)
+            try: scribus.setLineStyle(scribus.LINE_DASH, l2)
+            except: pass
         
         # Pozioma (jeśli N-up lub składka krzyżowa - tu zakładamy prosty układ 2-stronny)
         # Opcjonalnie można dodać poziome znaczniki na cy
 
-    def _draw_collation_marks(self, dw, dh):
+    def _draw_collation_marks(self, ctx, dw, dh):
         """Rysuje schodki (sygnatury) na grzbiecie dla oprawy klejonej."""
-        if not hasattr(self, 'current_sheet_meta'): return
-        
-        meta = self.current_sheet_meta
+        meta = ctx.sheet
         sig_idx = meta.get("sig_idx", 0)
         total_sigs = meta.get("total_sigs", 1)
         sheet_idx = meta.get("sheet_idx", 0)
@@ -1138,39 +3978,70 @@ class ImpositionApp:
         
         if total_sigs <= 1: return
         
-        # Obszar roboczy dla schodków (np. od 20% do 80% wysokości arkusza)
-        h_start = dh * 0.2
-        h_end = dh * 0.8
-        h_avail = h_end - h_start
-        
-        step_h = h_avail / total_sigs
-        
-        # Pozycja Y dla danej składki
-        y = h_start + (sig_idx * step_h)
+        # Pasy wysokości arkusza ze składką: (początek, koniec, odwrócony o 180°).
+        # Przewracanie: dolna połowa formy to składka obrócona "do góry nogami".
+        if "collation" in meta:
+            # Składka z katalogu falcowania: tylko zewnętrzny grzbiet
+            cx, y0, y1 = meta["collation"]
+            spines = [cx]
+            bands = [(dh * y0, dh * y1, False)]
+        elif meta.get("work_form") == "tumble":
+            bands = [(0.0, dh / 2, False), (dh / 2, dh, True)]
+        else:
+            bands = [(0.0, dh, False)]
         
         # Wymiary znacznika
         mark_w = 4.0 # mm (po 2mm na stronę)
-        mark_h = step_h
         
-        x = (dw / 2) - (mark_w / 2)
+        if "collation" not in meta:
+            spines = meta.get("spines", (0.5,))
         
-        r = scribus.createRect(x, y, mark_w, mark_h)
-        scribus.setFillColor("Black", r) # Zwykły czarny (nie Registration), żeby nie brudzić CMY
-        scribus.setLineColor("None", r)
+        for sx in spines:
+            x = (dw * sx) - (mark_w / 2)
+            for b_start, b_end, flipped in bands:
+                # Obszar roboczy dla schodków (np. od 20% do 80% wysokości składki)
+                b_h = b_end - b_start
+                h_start = b_start + b_h * 0.2
+                h_avail = b_h * 0.6
+                
+                step_h = h_avail / total_sigs
+                mark_h = step_h
+                
+                # Pozycja Y dla danej składki
+                pos = (total_sigs - 1 - sig_idx) if flipped else sig_idx
+                y = h_start + (pos * step_h)
+                
+                r = scribus.createRect(x, y, mark_w, mark_h, self._obj_name(self.KIND_MARKS))
+                scribus.setFillColor("Black", r) # Zwykły czarny (nie Registration), żeby nie brudzić CMY
+                scribus.setLineColor("None", r)
         
         # Opcjonalnie: Dodaj tekst z numerem składki obok
         # t = scribus.createText(x + mark_w + 1, y, 10, mark_h)
         # scribus.setText(str(sig_idx+1), t)
         # scribus.setFontSize(6, t)
 
-    def _draw_slug_info(self, dw, dh, side_name, sheet_num, total_sheets):
+    def _draw_slug_info(self, ctx, dw, dh, side_name, sheet_num, total_sheets):
         """Dodaje opis tekstowy arkusza."""
-        info = f"Plik: {os.path.basename(self.current_src_file)} | Data: {self._get_date_str()} | Arkusz: {sheet_num}/{total_sheets} | {side_name}"
+        src_name = os.path.basename(ctx.src_file)
+        if ctx.source is not None:
+            src_name = f"plików: {len(ctx.source.files())}"
+        info = f"Plik: {src_name} | Data: {self._get_date_str()} | Arkusz: {sheet_num}/{total_sheets} | {side_name}"
+        
+        # Metadane składki
+        m = ctx.sheet
+        info += f" | Składka: {m.get('sig_idx',0)+1}/{m.get('total_sigs',1)}"
+        if "sig_pages" in m:
+            info += f" ({m['sig_pages']} str.)"
+        if "fold" in m:
+            info += f" {m['fold']}"
         
-        # Jeśli mamy metadane składki
-        if hasattr(self, 'current_sheet_meta'):
-             m = self.current_sheet_meta
-             info += f" | Składka: {m.get('sig_idx',0)+1}/{m.get('total_sigs',1)}"
+        copies = ctx.copies
+        if copies and copies.copies > 1:
+            info += f" | Nakład: {copies.copies} egz. ({'kompletowane' if copies.collate else 'niekompletowane'})"
+        
+        note = ctx.slug_note
+        if note:
+            info += f" | {note}"
         
         # Umieść na dole po lewej, poza spadem
         x = 10
@@ -1178,14 +4049,13 @@ class ImpositionApp:
         w = dw - 20
         h = 6
         
-        t = scribus.createText(x, y, w, h)
+        t = scribus.createText(x, y, w, h, self._obj_name(self.KIND_SLUG))
         scribus.setText(info, t)
         scribus.setFontSize(7, t)
         # scribus.setFont("Arial Regular", t) # Ryzykowne jeśli fontu nie ma
         scribus.setLineColor("None", t)
 
     def _get_date_str(self):
-        import datetime
         return datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
 
     def _draw_reg_mark(self, x, y, size, color):
@@ -1198,85 +4068,73 @@ class ImpositionApp:
         # scribus.setLineWidth(0.2, o)
         
         # Krzyż
-        l1 = scribus.createLine(x-r, y, x+r, y)
+        l1 = scribus.createLine(x-r, y, x+r, y, self._obj_name(self.KIND_MARKS))
         scribus.setLineColor(color, l1)
         scribus.setLineWidth(0.2, l1)
         
-        l2 = scribus.createLine(x, y-r, x, y+r)
+        l2 = scribus.createLine(x, y-r, x, y+r, self._obj_name(self.KIND_MARKS))
         scribus.setLineColor(color, l2)
         scribus.setLineWidth(0.2, l2)
 
-    def _place_on_page(self, items, dw, dh):
+    def _place_on_page(self, ctx, items, dw, dh):
         """Umieszcza obiekty na stronie Scribusa"""
-        # ... (parametry)
-        # Używamy parametrów zapisanych w self (jeśli wywołane z job) lub z GUI
-        if hasattr(self, 'current_gap'):
-            gap = self.current_gap
-            bleed = self.current_bleed
-            src_mode = self.current_src_mode
-            src_file = self.current_src_file
-        else:
-            gap = self.v_gap.get()
-            bleed = self.v_bleed.get()
-            src_mode = self.v_src_mode.get()
-            src_file = self.src_file
-        
-        # W Scribusie jednostki to mm (zgodnie z newDocument)
-        
-        # Oblicz przesunięcie (Creep / Shingling)
-        creep_shift = 0.0
-        if hasattr(self, 'current_sheet_meta') and hasattr(self, 'current_paper_thickness'):
-             th = self.current_paper_thickness
-             if th > 0:
-                 meta = self.current_sheet_meta
-                 sheet_idx = meta.get("sheet_idx", 0)
-                 # Im głębiej (większy sheet_idx), tym bardziej przesuwamy do grzbietu (do środka)
-                 creep_shift = sheet_idx * th
+        
+        # Ramki już załadowane na tej stronie: (strona, w, h, obrót) -> nazwa obiektu
+        # Kolejne użytki tej samej strony (Step & Repeat) są duplikowane zamiast
+        # ponownego importu PDF (loadImage jest najwolniejszym wywołaniem API).
+        loaded = {}
 
-        for item in items:
-            pg, xr, yr, wr, hr, rot = item
-            if pg is None: continue
+        for idx, item in enumerate(items):
+            rot = item[5]
+            # Plik i strona źródła (Gang-run, wiele plików, wyrażenie, eksport)
+            ref = resolve_page(ctx, item[0])
+            if ref is None: continue
+            item_src, pg, is_pdf = ref
             
-            # Pozycja
-            x = xr * dw
-            y = yr * dh
-            w = wr * dw
-            h = hr * dh
-            
-            # Zastosuj Creep
-            if creep_shift > 0:
-                # Zakładamy że grzbiet jest pionowo na środku (x=0.5)
-                if xr < 0.49: # Lewa strona
-                    x += creep_shift
-                elif xr > 0.51: # Prawa strona
-                    x -= creep_shift
-            
-            # Ramka (z uwzględnieniem spadu)
-            fx = x + gap/2
-            fy = y + gap/2
-            fw = w - gap
-            fh = h - gap
+            # Ramka użytku (z odstępem i przesunięciem Creep)
+            fx, fy, fw, fh = item_frame(ctx, item, dw, dh)
             
             # UWAGA: Obrót strony (rot)
-            # Jeśli rot == 180, musimy obrócić zawartość.
-            # W Scribusie obracamy ramkę względem środka.
+            # Scribus obraca ramkę względem jej punktu początkowego,
+            # więc ramkę tworzymy tak, aby po obrocie wypełniła użytek.
+            fx, fy, fw, fh = rotated_frame(fx, fy, fw, fh, rot)
             
-            if src_mode == "pdf":
-                img = scribus.createImage(fx, fy, fw, fh)
-                scribus.loadImage(src_file, img)
+            name = self._obj_name(self.KIND_CONTENT, idx)
+            
+            if is_pdf:
+                key = (item_src, pg, round(fw, 3), round(fh, 3), rot)
+                if key in loaded:
+                    try:
+                        dup = scribus.duplicateObject(loaded[key])
+                        scribus.moveObjectAbs(fx, fy, dup)
+                        try: scribus.setItemName(name, dup)
+                        except: self.names_ok = False
+                        continue
+                    except: pass # Starsze API - zwykły import poniżej
+                
+                t_load = time.perf_counter()
+                img = scribus.createImage(fx, fy, fw, fh, name)
+                if ctx.draft:
+                    self._set_preview(img, True) # Przed loadImage: od razu niska rozdzielczość
+                scribus.loadImage(item_src, img)
                 scribus.setScaleImageToFrame(True, True, img)
                 try:
                     scribus.setImagePage(pg, img)
                 except Exception as e:
                     try: scribus.setImagePage(pg-1, img)
                     except: pass
+                if self.telemetry.enabled:
+                    self.telemetry.emit("pdf_load", src=item_src, page=pg,
+                                        seconds=round(time.perf_counter() - t_load, 4))
                 
                 if rot != 0:
                     scribus.setRotation(rot, img)
+                
+                loaded[key] = img
                     
             else:
                 # Placeholder tekstowy
-                txt = scribus.createText(fx, fy, fw, fh)
+                txt = scribus.createText(fx, fy, fw, fh, name)
                 scribus.setText(f"Str. {pg}", txt)
                 try: scribus.setPrintable(False, txt)
                 except: pass
@@ -1305,20 +4163,43 @@ class ImpositionApp:
             # try: scribus.setLineStyle(scribus.LINE_DASH, rect)
             # except: pass
 
-    def _draw_all_crop_marks(self, items, dw, dh):
-        if hasattr(self, 'current_gap'):
-             gap = self.current_gap
-        else: gap = 0.0
+    def _ensure_number_style(self, ctx):
+        """Tworzy wspólny styl numerów (jeden styl zamiast ustawień każdej ramki)"""
+        spec = ctx.numbering
+        self.number_style_ok = False
+        try:
+            scribus.createCharStyle(name=self.NUMBER_STYLE, fontsize=float(spec["size"]))
+            scribus.createParagraphStyle(name=self.NUMBER_STYLE, alignment=2, charstyle=self.NUMBER_STYLE) # 2 = do prawej
+            self.number_style_ok = True
+        except Exception:
+            pass # Starsze API - ustawienia na ramce (wolniej)
+
+    def _draw_numbers(self, ctx, items, dw, dh):
+        """Numer w każdym użytku (pierwsza strona kompletu), w ramce obróconej razem z użytkiem"""
+        spec = ctx.numbering
+        number_text = ImpositionEngine.number_text
         
-        # Oblicz przesunięcie (Creep) - duplikat logiki z _place_on_page
-        creep_shift = 0.0
-        if hasattr(self, 'current_sheet_meta') and hasattr(self, 'current_paper_thickness'):
-             th = self.current_paper_thickness
-             if th > 0:
-                 meta = self.current_sheet_meta
-                 sheet_idx = meta.get("sheet_idx", 0)
-                 creep_shift = sheet_idx * th
+        for item in items:
+            text = number_text(item[0], spec)
+            if text is None: continue
+            rot = item[5]
+            x, y, w, h = number_frame(ctx, item, dw, dh)
+            
+            t = scribus.createText(x, y, w, h, self._obj_name(self.KIND_NUMBER))
+            scribus.setText(text, t)
+            if self.number_style_ok:
+                try:
+                    scribus.setParagraphStyle(self.NUMBER_STYLE, t)
+                except AttributeError:
+                    scribus.setStyle(self.NUMBER_STYLE, t) # Scribus 1.4
+            else:
+                scribus.setFontSize(float(spec["size"]), t)
+            if rot:
+                scribus.setRotation(rot, t)
 
+    def _draw_all_crop_marks(self, ctx, items, dw, dh):
+        gap = ctx.gap
+        
         # Znajdź granice bloku (min_x, max_x, min_y, max_y)
         # Aby wiedzieć, które krawędzie są zewnętrzne
         # Zakładamy, że items są znormalizowane (0.0 - 1.0)
@@ -1328,25 +4209,15 @@ class ImpositionApp:
         
         draw_inner = (gap > 0.1) # Tolerancja
         
+        # Gang-run: użytki różnych prac nie mają wspólnych linii cięcia
+        if ctx.sheet.get("gang"):
+            draw_inner = True
+        
         for item in items:
             pg, xr, yr, wr, hr, rot = item
             if pg is None: continue
             
-            x = xr * dw
-            y = yr * dh
-            
-            # Zastosuj Creep (musi być identyczne jak w place_on_page)
-            if creep_shift > 0:
-                if xr < 0.49: x += creep_shift
-                elif xr > 0.51: x -= creep_shift
-            
-            w = wr * dw
-            h = hr * dh
-            
-            fx = x + gap/2
-            fy = y + gap/2
-            fw = w - gap
-            fh = h - gap
+            fx, fy, fw, fh = item_frame(ctx, item, dw, dh)
             
             # Określ, które krawędzie są zewnętrzne względem arkusza
             # Margines błędu float
@@ -1357,33 +4228,28 @@ class ImpositionApp:
             
             # Jeśli gap > 0, traktujemy wszystkie jako zewnętrzne (każdy ma swoje)
             if draw_inner:
-                self._draw_crop_marks(fx, fy, fw, fh, True, True, True, True)
+                self._draw_crop_marks(ctx, fx, fy, fw, fh, True, True, True, True)
             else:
-                self._draw_crop_marks(fx, fy, fw, fh, is_left, is_right, is_top, is_bottom)
+                self._draw_crop_marks(ctx, fx, fy, fw, fh, is_left, is_right, is_top, is_bottom)
 
-    def _draw_crop_marks(self, x, y, w, h, left, right, top, bottom):
+    def _draw_crop_marks(self, ctx, x, y, w, h, left, right, top, bottom):
         """Rysuje linie cięcia wokół użytku (x,y,w,h)."""
-        # Długość kreski i odstęp od formatu netto
-        l = 5.0
-        offset = 2.0
+        # Długość kreski, odstęp od formatu netto i grubość linii
+        l, offset, lw = ctx.crop
         
-        # Kolor Registration (z cache)
-        if hasattr(self, 'reg_color'):
-            col = self.reg_color
-        else:
-            col = "Registration"
-            if not col in scribus.getColorNames(): col = "Black"
+        # Kolor Registration (ustalony raz dla dokumentu)
+        col = ctx.reg_color
         
         # Lewy Górny
         if top and left:
             # Pionowa
-            line = scribus.createLine(x, y - offset - l, x, y - offset)
+            line = scribus.createLine(x, y - offset - l, x, y - offset, self._obj_name(self.KIND_CROP))
             scribus.setLineColor(col, line)
-            scribus.setLineWidth(0.1, line)
+            scribus.setLineWidth(lw, line)
             # Pozioma
-            line = scribus.createLine(x - offset - l, y, x - offset, y)
+            line = scribus.createLine(x - offset - l, y, x - offset, y, self._obj_name(self.KIND_CROP))
             scribus.setLineColor(col, line)
-            scribus.setLineWidth(0.1, line)
+            scribus.setLineWidth(lw, line)
         elif top: # Tylko góra (np. styk dwóch stron)
              # Pionowa na styku? Zazwyczaj rysujemy tylko na rogach bloku.
              # Ale jeśli to środek, to linia cięcia powinna być.
@@ -1393,53 +4259,818 @@ class ImpositionApp:
         
         # Prawy Górny
         if top and right:
-            line = scribus.createLine(x + w, y - offset - l, x + w, y - offset)
+            line = scribus.createLine(x + w, y - offset - l, x + w, y - offset, self._obj_name(self.KIND_CROP))
             scribus.setLineColor(col, line)
-            scribus.setLineWidth(0.1, line)
-            line = scribus.createLine(x + w + offset, y, x + w + offset + l, y)
+            scribus.setLineWidth(lw, line)
+            line = scribus.createLine(x + w + offset, y, x + w + offset + l, y, self._obj_name(self.KIND_CROP))
             scribus.setLineColor(col, line)
-            scribus.setLineWidth(0.1, line)
+            scribus.setLineWidth(lw, line)
         
         # Lewy Dolny
         if bottom and left:
-            line = scribus.createLine(x, y + h + offset, x, y + h + offset + l)
+            line = scribus.createLine(x, y + h + offset, x, y + h + offset + l, self._obj_name(self.KIND_CROP))
             scribus.setLineColor(col, line)
-            scribus.setLineWidth(0.1, line)
-            line = scribus.createLine(x - offset - l, y + h, x - offset, y + h)
+            scribus.setLineWidth(lw, line)
+            line = scribus.createLine(x - offset - l, y + h, x - offset, y + h, self._obj_name(self.KIND_CROP))
             scribus.setLineColor(col, line)
-            scribus.setLineWidth(0.1, line)
+            scribus.setLineWidth(lw, line)
         
         # Prawy Dolny
         if bottom and right:
-            line = scribus.createLine(x + w, y + h + offset, x + w, y + h + offset + l)
+            line = scribus.createLine(x + w, y + h + offset, x + w, y + h + offset + l, self._obj_name(self.KIND_CROP))
             scribus.setLineColor(col, line)
-            scribus.setLineWidth(0.1, line)
-            line = scribus.createLine(x + w + offset, y + h, x + w + offset + l, y + h)
+            scribus.setLineWidth(lw, line)
+            line = scribus.createLine(x + w + offset, y + h, x + w + offset + l, y + h, self._obj_name(self.KIND_CROP))
             scribus.setLineColor(col, line)
-            scribus.setLineWidth(0.1, line)
+            scribus.setLineWidth(lw, line)
             
         # Dodatkowe znaczniki środkowe dla styku (jeśli gap=0 i jesteśmy na krawędzi)
         # Np. znaczniki cięcia pionowego na górze i dole między stronami
         if not left and top: # Środek góra
-             line = scribus.createLine(x, y - offset - l, x, y - offset)
+             line = scribus.createLine(x, y - offset - l, x, y - offset, self._obj_name(self.KIND_CROP))
              scribus.setLineColor(col, line)
-             scribus.setLineWidth(0.1, line)
+             scribus.setLineWidth(lw, line)
         if not left and bottom: # Środek dół
-             line = scribus.createLine(x, y + h + offset, x, y + h + offset + l)
+             line = scribus.createLine(x, y + h + offset, x, y + h + offset + l, self._obj_name(self.KIND_CROP))
              scribus.setLineColor(col, line)
-             scribus.setLineWidth(0.1, line)
+             scribus.setLineWidth(lw, line)
         
         # Poziome środkowe (rzadziej potrzebne w książkach, ale w N-up tak)
         if not top and left: # Środek lewo
-             line = scribus.createLine(x - offset - l, y, x - offset, y)
+             line = scribus.createLine(x - offset - l, y, x - offset, y, self._obj_name(self.KIND_CROP))
              scribus.setLineColor(col, line)
-             scribus.setLineWidth(0.1, line)
+             scribus.setLineWidth(lw, line)
         if not top and right: # Środek prawo
-             line = scribus.createLine(x + w + offset, y, x + w + offset + l, y)
+             line = scribus.createLine(x + w + offset, y, x + w + offset + l, y, self._obj_name(self.KIND_CROP))
              scribus.setLineColor(col, line)
-             scribus.setLineWidth(0.1, line)
+             scribus.setLineWidth(lw, line)
+
+# --- TRYB WSADOWY ---
+
+def load_job_ticket(path):
+    """
+    Wczytuje bilet zadania (JSON lub INI z sekcją [job]) z polami gen_params,
+    np. src_file, imp_type, print_method, fmt, orient, sig_size, cols, rows...
+    Ścieżki względne liczone są od katalogu biletu. Brak src_file oznacza
+    plik PDF o tej samej nazwie co bilet.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    
+    if path.lower().endswith(".ini"):
+        import configparser
+        cp = configparser.ConfigParser()
+        cp.read(path, encoding="utf-8")
+        section = "job" if cp.has_section("job") else (cp.sections() or [None])[0]
+        if section is None:
+            raise ValueError("Pusty bilet INI.")
+        ticket = {}
+        for key, value in cp.items(section):
+            # Wartości w INI zapisane jak w JSON (true, 16, [16, 8]) - inaczej tekst
+            try: ticket[key] = json.loads(value)
+            except ValueError: ticket[key] = value
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            ticket = json.load(f)
+    
+    if not ticket.get("src_file") and not ticket.get("jobs"):
+        ticket["src_file"] = os.path.splitext(path)[0] + ".pdf"
+    
+    return resolve_ticket_paths(ticket, base_dir)
+
+def resolve_ticket_paths(ticket, base_dir):
+    """Zamienia ścieżki względne w bilecie na bezwzględne (względem base_dir)"""
+    for key in ("src_file", "output_path", "telemetry_path", "plan_export", "cancel_file"):
+        if ticket.get(key) and not os.path.isabs(ticket[key]):
+            ticket[key] = os.path.join(base_dir, ticket[key])
+    for job in ticket.get("jobs", []):
+        if not os.path.isabs(job["src_file"]):
+            job["src_file"] = os.path.join(base_dir, job["src_file"])
+    sources = []
+    for spec in ticket.get("sources", []):
+        if isinstance(spec, str) and not os.path.isabs(spec):
+            spec = os.path.join(base_dir, spec)
+        elif isinstance(spec, dict) and spec.get("file") and not os.path.isabs(spec["file"]):
+            spec = dict(spec, file=os.path.join(base_dir, spec["file"]))
+        sources.append(spec)
+    if sources: ticket["sources"] = sources
+    
+    return ticket
+
+def build_job_params(ticket, engine=None):
+    """Zamienia bilet zadania na komplet parametrów run_imposition_job (z planem)"""
+    engine = engine or ImpositionEngine()
+    t = ticket
+    
+    imp_type = t.get("imp_type", "saddle")
+    imp_type = ImpositionEngine.TYPE_ALIASES.get(imp_type, imp_type)
+    method = t.get("print_method", "sheetwise")
+    method = ImpositionEngine.METHOD_ALIASES.get(method, method)
+    if method not in ImpositionEngine.METHOD_ALIASES.values():
+        raise ValueError(f"Nieznana metoda druku: {method}")
+    
+    orient = t.get("orient", 1)
+    if isinstance(orient, str):
+        orient = 1 if orient.lower() == "landscape" else 0
+    
+    fmt = t.get("fmt", "A3")
+    gap = float(t.get("gap", 0.0))
+    src_file = (t.get("src_file") or "").replace("\\", "/")
+    
+    numbering = None
+    sources = None
+    page_expr, page_seq = None, None
+    if t.get("jobs"):
+        src_mode = "gang"
+        pages = 0
+        fw, fh = SHEET_SIZES.get(fmt, (297.0, 420.0))
+        if orient == 1: fw, fh = fh, fw
+        plan = engine.calculate_gang(t["jobs"], fw, fh, gap)
+        plan_params = {"jobs": t["jobs"], "gap": gap}
+    else:
+        src_mode = t.get("src_mode", "pdf")
+        page_expr = str(t.get("pages") or "").strip()
+        pages = int(page_expr) if page_expr.isdigit() else 0
+        if t.get("sources"):
+            # Książka z wielu plików (rozdziały, wstawione puste strony)
+            src_mode = "multi"
+            source = PageSource(t["sources"])
+            pages = len(source)
+            sources = source.counted_specs()
+            src_file = src_file or (source.files() or [""])[0]
+        elif pages <= 0 and src_mode == "pdf":
+            pages = get_pdf_page_count(src_file)
+        
+        # Wyrażenie kolejności stron zamiast liczby ("1-4,blank*2,5-200,@wklejka.pdf:1-4")
+        if page_expr and not page_expr.isdigit():
+            if src_mode == "pdf" and not pages:
+                pages = get_pdf_page_count(src_file)
+            seq = PageSequence.parse(page_expr, pages or None, os.path.dirname(src_file) or None)
+            page_seq, pages = [list(seg) for seg in seq.segments], len(seq)
+        if pages <= 0:
+            raise ValueError(f"Nie można ustalić liczby stron: {src_file}")
+        
+        # Numeracja: count kompletów z jednego wzoru (domyślnie wzór = cały plik źródłowy)
+        numbering = t.get("numbering")
+        if numbering:
+            numbering = dict(numbering)
+            if numbering.get("count") and "design_pages" not in numbering:
+                numbering["design_pages"] = pages
+            pages = ImpositionEngine.numbered_page_count(pages, numbering)
+        
+        params = {}
+        for key in ("sig_size", "mixed_sigs", "sig_sizes", "fold", "cols", "rows", "step_repeat"):
+            if key in t: params[key] = t[key]
+        if imp_type not in ImpositionEngine.TYPE_ALIASES.values():
+            raise ValueError(f"Nieznany rodzaj prac: {imp_type}")
+        plan = engine.calculate(imp_type, method, pages, params)
+        plan_params = params
+    
+    output_path = t.get("output_path") or (os.path.splitext(src_file)[0] + "_impozycja.sla")
+    
+    return {
+        "fmt": fmt,
+        "orient": orient,
+        "preview_data": plan,
+        "plan_params": plan_params,
+        "auto_save": bool(t.get("auto_save", True)),
+        "output_path": output_path.replace("\\", "/"),
+        "src_mode": src_mode,
+        "src_file": src_file,
+        "gap": gap,
+        "bleed": float(t.get("bleed", 3.0)),
+        "paper_thickness": float(t.get("paper_thickness", 0.0)),
+        "cover": bool(t.get("cover", False)) and src_mode != "gang",
+        "spine": float(t.get("spine", 5.0)),
+        "imp_type": imp_type,
+        "print_method": method,
+        "page_count": pages,
+        "slug_note": str(t.get("slug_note", "")),
+        "crop_len": float(t.get("crop_len", 5.0)),
+        "crop_offset": float(t.get("crop_offset", 2.0)),
+        "crop_width": float(t.get("crop_width", 0.1)),
+        "incremental": bool(t.get("incremental", False)),
+        "draft": bool(t.get("draft", False)),
+        "plan_export": t.get("plan_export"),
+        "cancel_file": t.get("cancel_file"),
+        "redraw_budget": float(t.get("redraw_budget", 0.5)),
+        "telemetry_path": t.get("telemetry_path"),
+        "numbering": numbering,
+        "sources": sources,
+        "page_expr": page_expr if page_seq else None,
+        "page_seq": page_seq,
+        "export_current": bool(t.get("export_current", True)),
+        "copies": max(1, int(t.get("copies", 1))),
+        "collate": bool(t.get("collate", True))
+    }
+
+def run_job(generator, p):
+    """
+    Wykonuje zadanie: z "plan_export" zapisuje tylko opis układu (JSON/JDF)
+    dla RIP-a bez budowania dokumentu, w przeciwnym razie generuje dokument.
+    """
+    if p.get("plan_export"):
+        sheets = export_plan(p, p["plan_export"])
+        return {"ok": True, "message": f"Zapisano plan: {p['plan_export']}",
+                "output_path": p["plan_export"], "sheets": sheets, "pages": 0}
+    return generator.run_imposition_job(p, interactive=False)
+
+def run_batch(ticket_dir, report_path=None, telemetry_path=None, workers=None):
+    """
+    Przetwarza wszystkie bilety (*.json, *.ini) z katalogu bez okien dialogowych.
+    Błąd jednego zadania nie przerywa wsadu. Wyniki, czasy i błędy trafiają
+    do raportu JSON (domyślnie batch_report.json w katalogu biletów).
+    telemetry_path: dziennik zdarzeń dla biletów, które nie podają własnego.
+    workers: wątki etapu planu (prepare_jobs); zapis do Scribusa jest sekwencyjny.
+    """
+    
+    report_path = os.path.abspath(report_path or os.path.join(ticket_dir, "batch_report.json"))
+    generator = ImpositionGenerator()
+    results = []
+    t_batch = time.time()
+    
+    names = []
+    tickets = []
+    for name in sorted(os.listdir(ticket_dir)):
+        path = os.path.join(ticket_dir, name)
+        if os.path.splitext(name)[1].lower() not in (".json", ".ini"): continue
+        if os.path.abspath(path) == report_path: continue
+        if name.lower().endswith(".impo.json"): continue # Plik pomocniczy wygenerowanego dokumentu
+        names.append(name)
+        try: tickets.append(load_job_ticket(path))
+        except Exception as e: tickets.append(e)
+    
+    # Etap planu dla wszystkich biletów naraz
+    t_plan = time.time()
+    prepared = prepare_jobs(tickets, workers)
+    plan_seconds = round(time.time() - t_plan, 3)
+    
+    for name, (p, error) in zip(names, prepared):
+        entry = {"ticket": name, "status": "ok", "error": None, "src_file": None,
+                 "output_path": None, "sheets": 0, "pages": 0, "seconds": 0.0}
+        t0 = time.time()
+        try:
+            if error is not None: raise error
+            p["telemetry_path"] = p["telemetry_path"] or telemetry_path
+            entry["src_file"] = p["src_file"]
+            res = run_job(generator, p)
+            entry.update(output_path=res["output_path"], sheets=res["sheets"], pages=res["pages"],
+                         copies=res.get("copies", 1), print_sheets=res.get("print_sheets", res["sheets"]))
+            if "memory_growth_mb" in res: entry["memory_growth_mb"] = res["memory_growth_mb"]
+            if res.get("cancelled"): entry["status"] = "cancelled"
+        except Exception as e:
+            entry["status"] = "error"
+            entry["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            generator.close_document()
+            entry["seconds"] = round(time.time() - t0, 3)
+        
+        results.append(entry)
+        print(f"[{entry['status']}] {name} ({entry['seconds']} s){' - ' + entry['error'] if entry['error'] else ''}")
+        if entry["status"] == "cancelled":
+            break # Przerwanie dotyczy całego wsadu, pozostałe bilety nie są uruchamiane
+    
+    summary = {
+        "ticket_dir": os.path.abspath(ticket_dir),
+        "total": len(results),
+        "ok": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "seconds": round(time.time() - t_batch, 3),
+        "plan_seconds": plan_seconds,
+        "jobs": results
+    }
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    print(f"Wsad: {summary['ok']}/{summary['total']} OK, raport: {report_path}")
+    return summary
+
+# --- TRYB SERWERA ---
+
+def default_server_address():
+    """Domyślny adres serwera: potok nazwany (Windows) lub gniazdo Unix"""
+    if sys.platform.startswith("win"):
+        return r"\\.\pipe\scribus-impozycja"
+    return os.path.join(tempfile.gettempdir(), "scribus-impozycja.sock")
+
+def server_key_path():
+    """Plik klucza uwierzytelniania serwera (w katalogu domowym, tylko dla właściciela)"""
+    return os.path.join(os.path.expanduser("~"), ".scribus-impozycja.key")
+
+def server_authkey(create=False):
+    """
+    Klucz wspólny serwera i klientów (authkey multiprocessing.connection).
+    Potok nazwany Windows jest dostępny dla innych użytkowników komputera,
+    a bilet zapisuje pliki jako użytkownik Scribusa - bez klucza nikt obcy
+    nie zleci zadania. Zmienna IMPO_SERVER_KEY zastępuje plik klucza.
+    """
+    env = os.environ.get("IMPO_SERVER_KEY")
+    if env:
+        return env.encode("utf-8")
+    path = server_key_path()
+    if create and not os.path.exists(path):
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(os.urandom(32).hex())
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip().encode("utf-8")
+    except OSError:
+        raise RuntimeError(f"Brak klucza serwera: {path} (uruchom serwer albo ustaw IMPO_SERVER_KEY)")
+
+def _claim_socket_path(address):
+    """Usuwa pozostałość po zakończonym serwerze; działające gniazdo albo inny plik to błąd"""
+    import socket
+    if not os.path.lexists(address):
+        return
+    if not stat.S_ISSOCK(os.lstat(address).st_mode):
+        raise RuntimeError(f"Adres serwera zajęty przez plik, który nie jest gniazdem: {address}")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(address)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(address) # Nikt nie nasłuchuje: gniazdo po przerwanym serwerze
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"Pod adresem {address} działa już serwer impozycji")
+
+def run_server(address=None, telemetry_path=None):
+    """
+    Tryb serwera: skrypt pozostaje w pamięci w (bezokienkowym) Scribusie
+    i przyjmuje zadania przez lokalne gniazdo Unix / potok nazwany.
+    Silnik, generator i indeksy źródeł (liczby stron PDF) są współdzielone
+    między zadaniami, więc koszt startu Scribusa płacimy raz.
+    Połączenia są uwierzytelniane kluczem server_authkey(); błąd jednego
+    połączenia (rozłączony klient, złe żądanie) nie zatrzymuje serwera.
+    
+    Żądanie (obiekt JSON): {"cmd": "job", "ticket": {...}, ["cwd": katalog]},
+    {"cmd": "ping"} lub {"cmd": "shutdown"}.
+    Odpowiedź: {"ok", "output_path", "sheets", "pages", "seconds"} lub {"ok": False, "error"}.
+    telemetry_path: dziennik zdarzeń dla biletów, które nie podają własnego.
+    """
+    from multiprocessing.connection import Listener
+    
+    address = address or default_server_address()
+    family = "AF_PIPE" if address.startswith("\\\\") else "AF_UNIX"
+    if family == "AF_UNIX":
+        _claim_socket_path(address)
+    authkey = server_authkey(create=True)
+    
+    engine = ImpositionEngine()
+    generator = ImpositionGenerator()
+    
+    # Potok Windows: pierwsza instancja potoku jest wyłączna, więc drugi serwer pod tą nazwą nie wystartuje
+    with Listener(address, family, authkey=authkey) as listener:
+        if family == "AF_UNIX":
+            os.chmod(address, 0o600)
+        print(f"Serwer impozycji nasłuchuje: {address}")
+        
+        running = True
+        while running:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"Odrzucono połączenie: {type(e).__name__}: {e}") # Np. zły klucz
+                continue
+            
+            with conn:
+                try:
+                    req = json.loads(conn.recv_bytes().decode("utf-8"))
+                except (EOFError, OSError):
+                    continue
+                except ValueError as e:
+                    req = e
+                
+                t0 = time.time()
+                if not isinstance(req, dict):
+                    resp = {"ok": False, "error": "Żądanie musi być obiektem JSON"}
+                else:
+                    cmd = req.get("cmd", "job")
+                    if cmd == "ping":
+                        resp = {"ok": True}
+                    elif cmd == "shutdown":
+                        resp = {"ok": True}
+                        running = False
+                    elif cmd == "job":
+                        try:
+                            ticket = req.get("ticket", {})
+                            if not isinstance(ticket, dict):
+                                raise ValueError("Bilet musi być obiektem JSON")
+                            ticket = resolve_ticket_paths(dict(ticket), req.get("cwd") or os.getcwd())
+                            p = build_job_params(ticket, engine)
+                            p["telemetry_path"] = p["telemetry_path"] or telemetry_path
+                            res = run_job(generator, p)
+                            resp = {"ok": not res.get("cancelled"), "output_path": res["output_path"],
+                                    "sheets": res["sheets"], "pages": res["pages"]}
+                            if res.get("cancelled"): resp["error"] = "cancelled"
+                        except Exception as e:
+                            resp = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                        finally:
+                            generator.close_document()
+                    else:
+                        resp = {"ok": False, "error": f"Nieznane polecenie: {cmd}"}
+                
+                resp["seconds"] = round(time.time() - t0, 3)
+                try:
+                    conn.send_bytes(json.dumps(resp).encode("utf-8"))
+                except (EOFError, OSError):
+                    pass # Klient rozłączył się (np. przekroczył czas oczekiwania) - wynik jest na dysku
+    
+    if family == "AF_UNIX" and os.path.exists(address):
+        os.remove(address)
+
+def send_job(ticket, address=None, cmd="job"):
+    """Klient trybu serwera: wysyła bilet zadania i zwraca odpowiedź serwera"""
+    from multiprocessing.connection import Client
+    
+    address = address or default_server_address()
+    family = "AF_PIPE" if address.startswith("\\\\") else "AF_UNIX"
+    with Client(address, family, authkey=server_authkey()) as conn:
+        conn.send_bytes(json.dumps({"cmd": cmd, "ticket": ticket, "cwd": os.getcwd()}).encode("utf-8"))
+        return json.loads(conn.recv_bytes().decode("utf-8"))
+
+# --- NAGRYWANIE I ODTWARZANIE API SCRIBUSA ---
+
+class ScribusRecorder:
+    """
+    Nakładka na moduł scribus zapisująca każde wywołanie (funkcja, argumenty,
+    czas, wynik) do pliku JSON Lines. Stałe i atrybuty niebędące funkcjami są
+    przekazywane bez zapisu. Wyjątki są zapisywane i zgłaszane dalej, więc
+    awaryjne ścieżki kodu (starsze API) działają tak samo jak bez nakładki.
+    """
+
+    def __init__(self, module, path):
+        self._module = module
+        self._clock = time.perf_counter
+        self._f = open(path, "w", encoding="utf-8")
+        self.calls = 0
+
+    @staticmethod
+    def _plain(value):
+        """Wartość do zapisu w JSON (obiekty API jako repr)"""
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, (list, tuple)):
+            return [ScribusRecorder._plain(v) for v in value]
+        return repr(value)
+
+    def __getattr__(self, name):
+        attr = getattr(self._module, name)
+        if not callable(attr) or isinstance(attr, type):
+            return attr
+        
+        def call(*args, **kwargs):
+            t0 = self._clock()
+            rec = {"fn": name, "args": self._plain(args)}
+            if kwargs: rec["kwargs"] = {k: self._plain(v) for k, v in kwargs.items()}
+            try:
+                ret = attr(*args, **kwargs)
+                rec["ret"] = self._plain(ret)
+                return ret
+            except Exception as e:
+                rec["error"] = type(e).__name__
+                raise
+            finally:
+                rec["t"] = round(self._clock() - t0, 6)
+                self.calls += 1
+                self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        return call
+
+    def close(self):
+        try: self._f.close()
+        except Exception: pass
+
+class ScribusStub:
+    """
+    Zastępnik modułu scribus w zwykłym Pythonie (CI, pomiary): prosty model
+    dokumentu - strony, obiekty z geometrią i tekstem, kolory, style - wystarczający
+    do wykonania pełnego run_imposition_job, aktualizacji przyrostowej i eksportu.
+    replay: ślad nagrany w Scribusie - funkcje odczytu (get*, haveDoc, pageCount...)
+    zwracają wtedy kolejno nagrane wyniki zamiast wartości modelu.
+    Nieznane funkcje zgłaszają AttributeError, jak starsze wersje API.
+    """
+    ICON_WARNING = 1
+    ICON_INFORMATION = 2
+    UNIT_MILLIMETERS = 1
+    PAGE_1 = 0
+    ALIGN_CENTER = 1
+    LINE_DASH = 2
+    
+    # Funkcje ustawiające właściwość obiektu: nazwa -> klucz w modelu
+    SETTERS = ("setLineColor", "setLineWidth", "setLineStyle", "setFillColor", "setFontSize",
+               "setFont", "setTextAlignment", "setRotation", "setPrintable", "setScaleImageToFrame",
+               "setImagePage", "setImagePreviewResolution", "setParagraphStyle", "setStyle")
+
+    def __init__(self, replay=None):
+        self.doc = None
+        self.docs = {} # Zapisane dokumenty: ścieżka -> model
+        self.colors = ["Black", "White", "Registration", "Cyan", "Magenta", "Yellow"]
+        self.color_values = {} # Nazwa -> (C, M, Y, K) kolorów zdefiniowanych przez skrypt
+        self.master = None # Edytowana strona wzorcowa (editMasterPage); stub nie ma na niej obiektów
+        self.styles = set()
+        self._n = 0
+        self._replay = {}
+        if replay:
+            with open(replay, encoding="utf-8") as f:
+                for line in f:
+                    rec = json.loads(line)
+                    if "ret" in rec and self._is_query(rec["fn"]):
+                        self._replay.setdefault(rec["fn"], []).append(rec["ret"])
+        for fn in self.SETTERS:
+            setattr(self, fn, self._setter(fn))
+
+    @staticmethod
+    def _is_query(fn):
+        return fn.startswith("get") or fn in ("haveDoc", "pageCount", "currentPage")
+
+    def _replayed(self, fn, value):
+        queue = self._replay.get(fn)
+        return queue.pop(0) if queue else value
+
+    def _setter(self, fn):
+        def set_prop(*args):
+            name = args[-1] if len(args) > 1 and isinstance(args[-1], str) and args[-1] in self.doc["objs"] else None
+            if name: self.doc["objs"][name][fn] = args[0] if len(args) == 2 else list(args[:-1])
+        return set_prop
+
+    # Dokument i strony
+    def newDocument(self, size, margins, orient, first, unit, pages_type, first_left, count):
+        w, h = size
+        if orient == 1: w, h = h, w
+        self.doc = {"name": None, "size": [w, h], "pages": [[]], "cur": 0, "objs": {}}
+
+    def newPage(self, where):
+        self.doc["pages"].append([])
+
+    def gotoPage(self, n):
+        if not 1 <= n <= len(self.doc["pages"]): raise IndexError(f"Brak strony {n}")
+        self.doc["cur"] = n - 1
+
+    def deletePage(self, n):
+        if len(self.doc["pages"]) == 1: raise IndexError("Nie można usunąć ostatniej strony dokumentu")
+        if not 1 <= n <= len(self.doc["pages"]): raise IndexError(f"Brak strony {n}")
+        for name in self.doc["pages"].pop(n - 1):
+            del self.doc["objs"][name]
+        for obj in self.doc["objs"].values():
+            if obj["page"] >= n: obj["page"] -= 1
+        self.doc["cur"] = min(self.doc["cur"], len(self.doc["pages"]) - 1)
+
+    def pageCount(self):
+        return self._replayed("pageCount", len(self.doc["pages"]) if self.doc else 0)
+
+    def currentPage(self):
+        return self._replayed("currentPage", self.doc["cur"] + 1)
+
+    def getPageSize(self):
+        return self._replayed("getPageSize", tuple(self.doc["size"]))
+
+    def setPageSize(self, w, h):
+        pass
+
+    def haveDoc(self):
+        return self._replayed("haveDoc", self.doc is not None)
+
+    def getDocName(self):
+        return self._replayed("getDocName", self.doc["name"] if self.doc else None)
+
+    def saveDocAs(self, path):
+        self.doc["name"] = path
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.doc, f)
+
+    def openDoc(self, path):
+        with open(path, encoding="utf-8") as f:
+            self.doc = json.load(f)
+        self.doc["name"] = path
+
+    def closeDoc(self):
+        self.doc = None
+
+    # Obiekty
+    def _create(self, kind, args):
+        if len(args) > 4 and args[4]:
+            name = args[4]
+            if name in self.doc["objs"]: raise NameError(f"Obiekt {name} już istnieje")
+        else:
+            self._n += 1
+            name = f"{kind}{self._n}"
+        self.doc["objs"][name] = {"kind": kind, "geo": list(args[:4]), "page": self.doc["cur"]}
+        self.doc["pages"][self.doc["cur"]].append(name)
+        return name
+
+    def createImage(self, *args): return self._create("image", args)
+    def createText(self, *args): return self._create("text", args)
+    def createLine(self, *args): return self._create("line", args)
+    def createRect(self, *args): return self._create("rect", args)
+    def createEllipse(self, *args): return self._create("ellipse", args)
+
+    def getAllObjects(self):
+        objs = [] if self.master else list(self.doc["pages"][self.doc["cur"]])
+        return self._replayed("getAllObjects", objs)
+
+    def getPosition(self, name): return self._replayed("getPosition", tuple(self.doc["objs"][name]["geo"][0:2]))
+    def getSize(self, name): return self._replayed("getSize", tuple(self.doc["objs"][name]["geo"][2:4]))
+    def getFillColor(self, name): return self._replayed("getFillColor", self.doc["objs"][name].get("setFillColor", "None"))
+    def getLineColor(self, name): return self._replayed("getLineColor", self.doc["objs"][name].get("setLineColor", "Black"))
+
+    def deleteObject(self, name):
+        obj = self.doc["objs"].pop(name)
+        self.doc["pages"][obj["page"]].remove(name)
+
+    def duplicateObject(self, name):
+        self._n += 1
+        dup = f"copy{self._n}"
+        obj = dict(self.doc["objs"][name], geo=list(self.doc["objs"][name]["geo"]), page=self.doc["cur"])
+        self.doc["objs"][dup] = obj
+        self.doc["pages"][self.doc["cur"]].append(dup)
+        return dup
+
+    def setItemName(self, new, name):
+        obj = self.doc["objs"].pop(name)
+        self.doc["objs"][new] = obj
+        items = self.doc["pages"][obj["page"]]
+        items[items.index(name)] = new
+        return new
+
+    def moveObjectAbs(self, x, y, name):
+        self.doc["objs"][name]["geo"][0:2] = [x, y]
+
+    def sizeObject(self, w, h, name):
+        self.doc["objs"][name]["geo"][2:4] = [w, h]
+
+    def loadImage(self, path, name):
+        self.doc["objs"][name]["file"] = path
+
+    def setText(self, text, name):
+        self.doc["objs"][name]["text"] = text
+
+    def getAllText(self, name):
+        return self._replayed("getAllText", self.doc["objs"][name].get("text", ""))
+
+    # Kolory, style, interfejs
+    def getColorNames(self):
+        return self._replayed("getColorNames", list(self.colors))
+
+    def getColor(self, name):
+        return self._replayed("getColor", self.color_values.get(name, (0, 0, 0, 0)))
+
+    def defineColor(self, name, c, m, y, k):
+        if name not in self.colors: self.colors.append(name)
+        self.color_values[name] = (c, m, y, k)
+
+    def getLayers(self): return self._replayed("getLayers", ["Background"])
+    def isLayerVisible(self, layer): return True
+    def isLayerPrintable(self, layer): return True
+    def getParagraphStyles(self): return self._replayed("getParagraphStyles", sorted(self.styles))
+    def getCharStyles(self): return self._replayed("getCharStyles", [])
+    def masterPageNames(self): return ["Normal"]
+    def getMasterPage(self, n): return self._replayed("getMasterPage", "Normal")
+    def editMasterPage(self, name): self.master = name
+    def closeMasterPage(self): self.master = None
+
+    class PDFfile:
+        """Eksport PDF: syntetyczny plik o liczbie stron równej liczbie eksportowanych stron"""
+        def __init__(self):
+            self.file = None
+            self.pages = []
+
+        def save(self):
+            # Generator fikstur jest częścią testów (tests/pdf_fixtures.py), nie skryptu dla Scribusa
+            tests_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests")
+            if tests_dir not in sys.path: sys.path.append(tests_dir)
+            from pdf_fixtures import write_test_pdf
+            write_test_pdf(self.file, max(1, len(self.pages)))
+
+    def createCharStyle(self, name, **kwargs): self.styles.add(name)
+    def createParagraphStyle(self, name, **kwargs): self.styles.add(name)
+    def messageBox(self, *args, **kwargs): return 0
+    def setRedraw(self, on): pass
+    def statusMessage(self, text): pass
+    def progressReset(self): pass
+    def progressTotal(self, n): pass
+    def progressSet(self, n): pass
+
+def install_scribus_stub(replay=None):
+    """Używa ScribusStub zamiast modułu scribus (zwykły Python)"""
+    global scribus
+    scribus = ScribusStub(replay)
+    return scribus
+
+def install_recorder(path):
+    """Nagrywa wywołania API do pliku path (moduł scribus albo zastępnik)"""
+    global scribus
+    scribus = ScribusRecorder(_load_scribus(), path)
+    atexit.register(scribus.close)
+    return scribus
+
+def trace_stats(path):
+    """
+    Statystyki śladu: liczba i łączny czas wywołań każdej funkcji oraz liczba
+    obiektów utworzonych na każdej stronie (między kolejnymi gotoPage).
+    """
+    calls = {}
+    per_page = {}
+    page = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            rec = json.loads(line)
+            fn = rec["fn"]
+            n, t = calls.get(fn, (0, 0.0))
+            calls[fn] = (n + 1, t + rec.get("t", 0.0))
+            if fn == "gotoPage":
+                page = rec["args"][0]
+            elif fn.startswith("create") and not fn.endswith("Style") or fn == "duplicateObject":
+                per_page[page] = per_page.get(page, 0) + 1
+    return {"calls": calls, "objects": sum(per_page.values()), "per_page": per_page}
+
+def compare_traces(path_a, path_b, max_growth=1.25):
+    """
+    Porównuje dwa ślady (np. dwóch wersji skryptu dla tego samego biletu).
+    Zwraca (wiersze różnic, ok); ok=False, gdy liczba obiektów albo wywołań
+    wzrosła ponad max_growth raza.
+    """
+    a, b = trace_stats(path_a), trace_stats(path_b)
+    rows = []
+    for fn in sorted(set(a["calls"]) | set(b["calls"])):
+        na, nb = a["calls"].get(fn, (0, 0.0))[0], b["calls"].get(fn, (0, 0.0))[0]
+        if na != nb: rows.append((fn, na, nb))
+    total_a = sum(n for n, _ in a["calls"].values())
+    total_b = sum(n for n, _ in b["calls"].values())
+    rows.append(("(obiekty)", a["objects"], b["objects"]))
+    rows.append(("(wywołania)", total_a, total_b))
+    ok = b["objects"] <= a["objects"] * max_growth and total_b <= total_a * max_growth
+    return rows, ok
 
 def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Impozycja dla Scribusa")
+    parser.add_argument("--batch", metavar="KATALOG", help="przetwórz bilety zadań z katalogu (bez GUI)")
+    parser.add_argument("--report", metavar="PLIK", help="ścieżka raportu trybu wsadowego")
+    parser.add_argument("--server", metavar="ADRES", nargs="?", const="", help="tryb serwera (gniazdo Unix / potok nazwany)")
+    parser.add_argument("--telemetry", metavar="PLIK", help="dziennik zdarzeń generowania (JSON Lines)")
+    parser.add_argument("--workers", type=int, metavar="N", help="liczba wątków etapu planu w trybie wsadowym")
+    parser.add_argument("--finalize", metavar="PLIK", help="przełącz dokument roboczy na pełną rozdzielczość")
+    parser.add_argument("--stub", nargs="?", const="", metavar="ŚLAD", help="zastępnik API Scribusa (zwykły Python), opcjonalnie z odtwarzaniem śladu")
+    parser.add_argument("--record", metavar="PLIK", help="nagraj wywołania API Scribusa (JSON Lines)")
+    parser.add_argument("--trace-diff", nargs=2, metavar=("A", "B"), help="porównaj dwa ślady wywołań API")
+    parser.add_argument("--max-growth", type=float, default=1.25, help="dopuszczalny wzrost liczby obiektów/wywołań w --trace-diff")
+    parser.add_argument("--cancel", nargs="?", const=True, metavar="PLIK", help="przerwij trwające zadanie (po bieżącym arkuszu)")
+    parser.add_argument("--export-plan", nargs=2, metavar=("BILET", "PLIK"), help="zapisz plan biletu jako JSON lub JDF (.jdf) bez Scribusa")
+    parser.add_argument("--check-import", action="store_true", help="sprawdź czas importu silnika (zwykły Python)")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="budżet czasu importu z .pyc w ms")
+    parser.add_argument("--cold-budget-ms", type=float, default=250.0, help="budżet czasu importu bez .pyc (kompilacja) w ms")
+    args, _ = parser.parse_known_args()
+    
+    if args.check_import:
+        cold, warm, heavy, ok = check_import_budget(args.budget_ms, args.cold_budget_ms)
+        print(f"Import: ciepły {warm:.1f} ms (budżet {args.budget_ms:.0f} ms), "
+              f"zimny {cold:.1f} ms (budżet {args.cold_budget_ms:.0f} ms), ciężkie moduły: {', '.join(heavy) or 'brak'}")
+        sys.exit(0 if ok else 1)
+    
+    if args.cancel:
+        path = default_cancel_path() if args.cancel is True else args.cancel
+        open(path, "w").close()
+        print(f"Żądanie przerwania: {path}")
+        return
+    
+    if args.export_plan:
+        ticket_path, out = args.export_plan
+        p = build_job_params(load_job_ticket(ticket_path))
+        print(f"Plan: {export_plan(p, out)} arkuszy -> {out}")
+        return
+    
+    if args.trace_diff:
+        rows, ok = compare_traces(args.trace_diff[0], args.trace_diff[1], args.max_growth)
+        for fn, na, nb in rows:
+            print(f"{fn:28} {na:>10} {nb:>10}")
+        print("Ślady zgodne." if ok else f"Wzrost ponad {args.max_growth}x!")
+        sys.exit(0 if ok else 1)
+    
+    if args.stub is not None:
+        install_scribus_stub(args.stub or None)
+    try:
+        _load_scribus()
+    except ImportError:
+        print("Ten skrypt musi być uruchomiony wewnątrz Scribusa.")
+        sys.exit(1)
+    if args.record:
+        install_recorder(args.record)
+    
+    if args.finalize:
+        print(ImpositionGenerator().finalize_draft(args.finalize)["message"])
+        return
+    if args.batch:
+        run_batch(args.batch, args.report, args.telemetry, args.workers)
+        return
+    if args.server is not None:
+        run_server(args.server or None, args.telemetry)
+        return
+    
+    try:
+        _load_tk()
+    except ImportError:
+        scribus.messageBox("Błąd", "Brak modułu 'tkinter'. Skrypt wymaga biblioteki GUI.", scribus.ICON_WARNING)
+        sys.exit(1)
+    
     root = tk.Tk()
     # High DPI fix windows
     try:
@@ -1454,7 +5085,10 @@ def main():
     except: pass
     
     # Po zamknięciu okna GUI, uruchamiamy właściwe zadanie w Scribusie
-    if app.ready_to_generate:
+    if app.finalize_path:
+        ImpositionGenerator().finalize_draft(app.finalize_path, interactive=True)
+    elif app.ready_to_generate:
+        app.gen_params["telemetry_path"] = args.telemetry
         app.run_imposition_job()
 
 if __name__ == '__main__':
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Book.py to pojedynczy skrypt (nie pakiet): testy importują go z katalogu Book/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Book"))
@@ -0,0 +1,130 @@
+"""
+Syntetyczne pliki PDF dla testów i zastępnika API (ScribusStub.PDFfile):
+czysty Python, bez zależności, od kilku stron do plików wielu GB.
+"""
+import zlib
+
+# Rozmiary stron fikstur (mm -> pt): MediaBox i dodatkowe pola stron na przemian
+FIXTURE_BOXES = (
+    ("[0 0 595.28 841.89]", ""),                                           # A4
+    ("[0 0 841.89 595.28]", ""),                                           # A4 poziomo
+    ("[0 0 419.53 595.28]", " /CropBox [10 10 409.53 585.28]"),            # A5 z CropBox
+    ("[0 0 612 792]", " /Rotate 90"),                                      # Letter obrócony
+    ("[0 0 637.8 884.41]", " /TrimBox [21.26 21.26 616.54 863.15] /BleedBox [12.76 12.76 625.04 871.65]"),
+)
+
+
+def write_test_pdf(path, pages, objstm=True, filler_mb=0.0, fanout=32, per_stream=100):
+    """
+    Zapisuje syntetyczny PDF (czysty Python, bez zależności): pages stron
+    o różnych polach (FIXTURE_BOXES), zbalansowane drzewo stron, opcjonalnie
+    strumienie obiektów i strumień xref (objstm=True, PDF 1.5) albo klasyczną
+    tablicę odsyłaczy. filler_mb: łączny rozmiar wypełnienia treści stron
+    (komentarze w strumieniach), pisany porcjami - pliki wielu GB nie trafiają
+    do pamięci. Zwraca rozmiar pliku w bajtach.
+    """
+    if pages < 1:
+        raise ValueError("Fikstura wymaga co najmniej jednej strony")
+
+    # Drzewo stron: liczba węzłów kolejnych poziomów (0 = strony) aż do jednego korzenia
+    counts = [pages]
+    while counts[-1] > 1 or len(counts) == 1:
+        counts.append(-(-counts[-1] // fanout))
+    top = len(counts) - 1
+    # Numery obiektów: 1 katalog, 2 czcionka, węzły drzewa, strony, treści stron
+    node_base, nxt = {}, 3
+    for depth in range(top, 0, -1):
+        node_base[depth] = nxt
+        nxt += counts[depth]
+    page_base, content_base = nxt, nxt + pages
+    size = content_base + pages
+
+    def node_num(depth, i): return node_base[depth] + i
+    def child_num(depth, i): return node_num(depth, i) if depth else page_base + i
+    def child_count(depth, i):
+        span = fanout ** depth # Liczba stron w poddrzewie węzła i na poziomie depth
+        return min(pages, (i + 1) * span) - i * span
+
+    objects = {1: f"<< /Type /Catalog /Pages {node_num(top, 0)} 0 R >>".encode(),
+               2: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    def node_objects():
+        for depth in range(top, 0, -1):
+            for i in range(counts[depth]):
+                kids = range(i * fanout, min((i + 1) * fanout, counts[depth - 1]))
+                parent = f" /Parent {node_num(depth + 1, i // fanout)} 0 R" if depth < top else \
+                         " /Resources << /Font << /F1 2 0 R >> >>"
+                yield node_num(depth, i), (f"<< /Type /Pages /Kids [{' '.join(f'{child_num(depth - 1, k)} 0 R' for k in kids)}]"
+                                           f" /Count {child_count(depth, i)}{parent} >>").encode()
+        for i in range(pages):
+            media, extra = FIXTURE_BOXES[i % len(FIXTURE_BOXES)]
+            yield page_base + i, (f"<< /Type /Page /Parent {node_num(1, i // fanout)} 0 R /MediaBox {media}{extra}"
+                                  f" /Contents {content_base + i} 0 R >>").encode()
+
+    filler = int(filler_mb * 1048576 / pages) if filler_mb else 0
+    line = b"% " + b"x" * 97 + b"\n"
+    offsets = {}
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n")
+        # Treści stron (strumienie są zawsze obiektami najwyższego poziomu)
+        for i in range(pages):
+            text = f"q BT /F1 48 Tf 72 400 Td (Strona {i + 1}) Tj ET Q\n".encode()
+            offsets[content_base + i] = f.tell()
+            f.write(f"{content_base + i} 0 obj\n<< /Length {len(text) + filler} >>\nstream\n".encode())
+            f.write(text)
+            left = filler
+            while left > 0:
+                chunk = min(left, 1 << 20)
+                f.write((line * (chunk // len(line) + 1))[:chunk])
+                left -= chunk
+            f.write(b"\nendstream\nendobj\n")
+
+        packed = {} # numer -> (strumień obiektów, indeks)
+        def write_obj(num, body):
+            offsets[num] = f.tell()
+            f.write(f"{num} 0 obj\n".encode() + body + b"\nendobj\n")
+        def write_objstm(batch):
+            nonlocal size
+            num, size = size, size + 1
+            head, body = [], bytearray()
+            for idx, (n, obj) in enumerate(batch):
+                head.append(f"{n} {len(body)}")
+                body += obj + b"\n"
+                packed[n] = (num, idx)
+            head = " ".join(head).encode() + b"\n"
+            data = zlib.compress(head + bytes(body))
+            write_obj(num, f"<< /Type /ObjStm /N {len(batch)} /First {len(head)} /Filter /FlateDecode /Length {len(data)} >>\nstream\n".encode()
+                      + data + b"\nendstream")
+
+        batch = []
+        for num, body in list(objects.items()) + list(node_objects()):
+            if not objstm:
+                write_obj(num, body)
+                continue
+            batch.append((num, body))
+            if len(batch) == per_stream:
+                write_objstm(batch); batch = []
+        if batch: write_objstm(batch)
+
+        xref_pos = f.tell()
+        if objstm:
+            # Strumień xref: W [1 5 2], predyktor PNG Up jak w plikach z typowych narzędzi
+            num, size = size, size + 1
+            offsets[num] = xref_pos
+            rows, prev = bytearray(), bytes(8)
+            for n in range(size):
+                if n in packed: row = bytes([2]) + packed[n][0].to_bytes(5, "big") + packed[n][1].to_bytes(2, "big")
+                elif n in offsets: row = bytes([1]) + offsets[n].to_bytes(5, "big") + bytes(2)
+                else: row = bytes([0]) + bytes(5) + b"\xff\xff"
+                rows += b"\x02" + bytes((a - b) & 0xFF for a, b in zip(row, prev))
+                prev = row
+            data = zlib.compress(bytes(rows))
+            f.write(f"{num} 0 obj\n<< /Type /XRef /Size {size} /W [1 5 2] /Root 1 0 R /Filter /FlateDecode"
+                    f" /DecodeParms << /Predictor 12 /Columns 8 >> /Length {len(data)} >>\nstream\n".encode()
+                    + data + b"\nendstream\nendobj\n")
+        else:
+            f.write(f"xref\n0 {size}\n0000000000 65535 f \n".encode())
+            for n in range(1, size):
+                f.write(f"{offsets[n]:010d} 00000 n \n".encode() if n in offsets else b"0000000000 00000 f \n")
+            f.write(f"trailer\n<< /Size {size} /Root 1 0 R >>\n".encode())
+        f.write(f"startxref\n{xref_pos}\n%%EOF\n".encode())
+        return f.tell()
@@ -0,0 +1,72 @@
+"""Bufor eksportu aktualnego dokumentu (CurrentDocExport) - na zastępniku API Scribusa."""
+import os
+
+import pytest
+
+import Book
+
+
+@pytest.fixture
+def doc(tmp_path):
+    stub = Book.install_scribus_stub()
+    stub.newDocument((210, 297), (0, 0, 0, 0), 0, 1, 1, 0, 0, 1)
+    for _ in range(2):
+        stub.newPage(-1)
+    for pg in (1, 2, 3):
+        stub.gotoPage(pg)
+        name = stub.createText(10, 10, 50, 20)
+        stub.setText(f"strona {pg}", name)
+    stub.saveDocAs(str(tmp_path / "src.sla"))
+    return stub
+
+
+def exported(tmp_path):
+    return Book.CurrentDocExport(str(tmp_path / "cache")).export()[1]
+
+
+def first_object(stub, page):
+    stub.gotoPage(page)
+    return stub.getAllObjects()[0]
+
+
+def test_unchanged_document_is_served_from_cache(doc, tmp_path):
+    assert exported(tmp_path) == [1, 2, 3]
+    assert exported(tmp_path) == []
+
+
+def test_only_changed_pages_are_exported(doc, tmp_path):
+    exported(tmp_path)
+    doc.moveObjectAbs(5, 5, first_object(doc, 2))
+    doc.setFillColor("Cyan", first_object(doc, 3))
+    assert exported(tmp_path) == [2, 3]
+
+
+def test_document_wide_change_exports_every_page(doc, tmp_path):
+    exported(tmp_path)
+    doc.defineColor("Spot", 0, 100, 0, 0)
+    assert exported(tmp_path) == [1, 2, 3]
+
+
+def test_saved_sla_change_exports_every_page(doc, tmp_path):
+    exported(tmp_path)
+    os.utime(doc.getDocName(), (1, 1))
+    assert exported(tmp_path) == [1, 2, 3]
+
+
+def test_unknown_document_state_disables_the_cache(doc, tmp_path, monkeypatch):
+    exported(tmp_path)
+    monkeypatch.delattr(type(doc), "getLayers")
+    assert exported(tmp_path) == [1, 2, 3]
+    assert exported(tmp_path) == [1, 2, 3]
+
+
+def test_export_failure_is_reported(doc, tmp_path, monkeypatch):
+    class FailingPDF(doc.PDFfile):
+        def save(self):
+            raise OSError("brak miejsca")
+
+    monkeypatch.setattr(doc, "PDFfile", FailingPDF)
+    p = Book.build_job_params({"src_mode": "current", "pages": 3, "imp_type": "saddle", "auto_save": False})
+    report = Book.ImpositionGenerator().run_imposition_job(p, interactive=False)
+    assert report["export_error"] == "OSError: brak miejsca"
+    assert "OSTRZEŻENIE" in report["message"]
@@ -0,0 +1,23 @@
+"""Tryb roboczy i przełączenie na pełną rozdzielczość - na zastępniku API Scribusa."""
+import json
+
+import Book
+from pdf_fixtures import write_test_pdf
+
+
+def test_finalize_switches_frames_and_sidecar(tmp_path):
+    stub = Book.install_scribus_stub()
+    src, out = tmp_path / "ksiazka.pdf", tmp_path / "ksiazka.sla"
+    write_test_pdf(str(src), 8)
+    p = Book.build_job_params({"src_file": str(src), "imp_type": "saddle", "draft": True, "output_path": str(out)})
+    Book.ImpositionGenerator().run_imposition_job(p, interactive=False)
+
+    content = [o for n, o in stub.doc["objs"].items() if n.startswith("impoC")]
+    assert content and all(o["setImagePreviewResolution"] == Book.ImpositionGenerator.PREVIEW_LOW for o in content)
+
+    result = Book.ImpositionGenerator().finalize_draft(str(out))
+    assert result["frames"] == len(content)
+    assert all(o["setImagePreviewResolution"] == Book.ImpositionGenerator.PREVIEW_FULL
+               for n, o in stub.doc["objs"].items() if n.startswith("impoC"))
+    with open(Book.ImpositionGenerator.sidecar_path(str(out)), encoding="utf-8") as f:
+        assert json.load(f)["params"]["draft"] is False
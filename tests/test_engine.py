@@ -0,0 +1,99 @@
+"""
+Właściwości silnika impozycji (bez Scribusa): każdy plan przechodzi verify_plan,
+count_sheets zgadza się z planem, wstrzyknięty błąd zostaje wykryty, a plan
+miliona stron weryfikuje się w czasie poniżej sekundy.
+"""
+import random
+import time
+
+import pytest
+
+from Book import CutStackPlan, ImpositionEngine, build_job_params
+
+ENGINE = ImpositionEngine()
+TYPES = sorted(ImpositionEngine.TYPE_ALIASES)
+METHODS = sorted(ImpositionEngine.METHOD_ALIASES)
+BIG_PAGES = 1000000
+VERIFY_BUDGET_S = 1.0
+
+
+def random_case(rnd):
+    imp_type = ImpositionEngine.TYPE_ALIASES[rnd.choice(TYPES)]
+    method = ImpositionEngine.METHOD_ALIASES[rnd.choice(METHODS)]
+    n = rnd.randint(1, 400)
+    params = {"sig_size": rnd.choice([4, 8, 16, 32]), "mixed_sigs": rnd.random() < 0.5, "fold": rnd.random() < 0.5,
+              "cols": rnd.randint(1, 4), "rows": rnd.randint(1, 4), "step_repeat": rnd.random() < 0.25}
+    return imp_type, method, n, params
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_plan_is_valid_and_counted(seed):
+    imp_type, method, n, params = random_case(random.Random(seed))
+    plan = ENGINE.calculate(imp_type, method, n, params)
+
+    assert ENGINE.verify_plan(plan, n, method) == []
+    real_forms = sum(1 + bool(sh["back"]) for sh in plan)
+    assert ENGINE.count_sheets(imp_type, method, n, params) == (len(plan), real_forms)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_repeated_page_is_detected(seed):
+    rnd = random.Random(seed)
+    imp_type, method, n, params = random_case(rnd)
+    plan = [dict(sh, front=list(sh["front"]), back=list(sh["back"]))
+            for sh in ENGINE.calculate(imp_type, method, n, params)]
+    slots = [(i, side, j) for i, sh in enumerate(plan) for side in ("front", "back")
+             for j, it in enumerate(sh[side]) if it[0] not in (None, 1)]
+    if any(sh.get("step_repeat") for sh in plan):
+        pytest.skip("Step & Repeat celowo powtarza strony")
+    if not slots:
+        pytest.skip("plan bez strony do podmiany")
+
+    # Strona 1 w miejscu innej strony
+    i, side, j = rnd.choice(slots)
+    plan[i][side][j] = (1,) + tuple(plan[i][side][j][1:])
+    assert ENGINE.verify_plan(plan, n, method)
+
+
+@pytest.mark.parametrize("cols, rows", [(1, 1), (2, 1), (3, 2)])
+@pytest.mark.parametrize("method", ["sheetwise", "single"])
+def test_cut_stack_columns_match_sheets(method, cols, rows):
+    # Szybka ścieżka czyta CutStackPlan kolumnami - ma zgadzać się z arkuszami
+    simplex = method == "single"
+    for n in range(1, 60):
+        plan = CutStackPlan(n, simplex, cols, rows)
+        m = ImpositionEngine.METHOD_ALIASES[method]
+        assert ENGINE.verify_plan(plan, n, m) == ENGINE.verify_plan(list(plan), n, m)
+        assert ENGINE.verify_plan(plan, n + 1, m)
+
+
+@pytest.mark.parametrize("key, value", [("print_method", "work-turn"), ("imp_type", "sadle")])
+def test_unknown_ticket_name_is_rejected(key, value):
+    # Literówka w bilecie nie może po cichu wybrać innej metody / rodzaju prac
+    with pytest.raises(ValueError):
+        build_job_params({"src_mode": "pdf", "src_file": "a.pdf", "pages": 8, key: value})
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_method_alias_and_full_name_are_accepted(method):
+    full = ImpositionEngine.METHOD_ALIASES[method]
+    for name in (method, full):
+        p = build_job_params({"src_mode": "pdf", "src_file": "a.pdf", "pages": 8, "print_method": name})
+        assert p["print_method"] == full
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("imp_type", TYPES)
+def test_million_pages_verify_under_budget(imp_type, method):
+    imp_type = ImpositionEngine.TYPE_ALIASES[imp_type]
+    method = ImpositionEngine.METHOD_ALIASES[method]
+    plan = ENGINE.calculate(imp_type, method, BIG_PAGES, {})
+
+    # Najlepszy z trzech pomiarów: pojedynczy przebieg zaburza planista systemu
+    times = []
+    for _ in range(3):
+        t0 = time.perf_counter()
+        errors = ENGINE.verify_plan(plan, BIG_PAGES, method)
+        times.append(time.perf_counter() - t0)
+        assert errors == []
+    assert min(times) < VERIFY_BUDGET_S, f"weryfikacja {BIG_PAGES} stron: {min(times):.2f} s"
@@ -0,0 +1,77 @@
+"""Eksport planu dla RIP-a (export_plan): JSON i JDF opisują te same strony na tych samych arkuszach."""
+import json
+import os
+import pathlib
+import xml.etree.ElementTree as ET
+
+import pytest
+
+import Book
+
+NS = {"j": "http://www.CIP4.org/JDFSchema_1_1"}
+SRC = "wizytówki ż.pdf"
+
+
+@pytest.fixture
+def ticket(tmp_path, monkeypatch):
+    # Ścieżka względna: adres w RunList ma wskazywać plik w katalogu roboczym
+    monkeypatch.chdir(tmp_path)
+    return Book.build_job_params({"src_mode": "pdf", "src_file": SRC, "pages": 12,
+                                  "imp_type": "perfect", "sig_size": 8})
+
+
+def exported_json(p, tmp_path):
+    path = str(tmp_path / "plan.json")
+    count = Book.export_plan(p, path)
+    with open(path, encoding="utf-8") as f:
+        return count, json.load(f)
+
+
+def exported_jdf(p, tmp_path):
+    path = str(tmp_path / "plan.jdf")
+    count = Book.export_plan(p, path)
+    return count, ET.parse(path).getroot()
+
+
+def run_list(root):
+    """Ord -> (URL, strona od 1) z zakresów RunList"""
+    pages = {}
+    for run in root.iterfind("j:ResourcePool/j:RunList/j:RunList", NS):
+        url = run.find("j:LayoutElement/j:FileSpec", NS).get("URL")
+        first = int(run.get("Pages").split("~")[0])
+        for k in range(int(run.get("NPage"))):
+            pages[int(run.get("LogicalPage")) + k] = (url, first + k + 1)
+    return pages
+
+
+def test_file_url_is_absolute_and_encoded(ticket, tmp_path):
+    _, root = exported_jdf(ticket, tmp_path)
+    urls = {url for url, _ in run_list(root).values()}
+    assert urls == {pathlib.Path(os.path.abspath(SRC)).as_uri()}
+    url = urls.pop()
+    assert url.startswith("file:///") and url.endswith("/wizyt%C3%B3wki%20%C5%BC.pdf")
+    assert str(tmp_path.name) in url
+
+
+def test_jdf_ords_match_json_plan(ticket, tmp_path):
+    count, plan = exported_json(ticket, tmp_path)
+    jdf_count, root = exported_jdf(ticket, tmp_path)
+    assert count == jdf_count == plan["total_sheets"] == len(ticket["preview_data"])
+
+    url = pathlib.Path(os.path.abspath(SRC)).as_uri()
+    pages = run_list(root)
+    sheets = root.findall("j:ResourcePool/j:Layout/j:Layout", NS)
+    assert len(sheets) == count
+    for sheet, layout in zip(plan["sheets"], sheets):
+        assert layout.get("SheetName") == f"S{sheet['index']}"
+        sides = {side.get("Side"): side for side in layout.findall("j:Layout", NS)}
+        assert set(sides) == {name.capitalize() for name in sheet["sides"]}
+        for name, slots in sheet["sides"].items():
+            ords = [int(o.get("Ord")) for o in sides[name.capitalize()].findall("j:ContentObject", NS)]
+            assert [pages[o] for o in ords] == [(url, slot["page"]) for slot in slots]
+
+
+def test_every_page_is_placed_once(ticket, tmp_path):
+    _, plan = exported_json(ticket, tmp_path)
+    placed = [slot["page"] for sheet in plan["sheets"] for slots in sheet["sides"].values() for slot in slots]
+    assert sorted(placed) == list(range(1, 13))
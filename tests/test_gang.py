@@ -0,0 +1,71 @@
+"""Pakowanie prac zbiorczych (calculate_gang) - geometria sprawdzana przez verify_plan."""
+from collections import Counter
+
+import pytest
+
+from Book import ImpositionEngine
+
+ENGINE = ImpositionEngine()
+A3 = (297.0, 420.0)
+MARGIN = 10.0
+EPS = 1e-9
+
+
+def pack(jobs, sheet=A3, gap=3.0):
+    plan = ENGINE.calculate_gang(jobs, sheet[0], sheet[1], gap, MARGIN)
+    assert ENGINE.verify_plan(plan, None, ImpositionEngine.METHOD_SHEETWISE) == []
+    w, h = sheet
+    for sh in plan:
+        for _, x, y, wr, hr, _ in sh["front"] + sh["back"]:
+            assert x * w >= MARGIN - EPS and y * h >= MARGIN - EPS
+            assert (x + wr) * w <= w - MARGIN + EPS and (y + hr) * h <= h - MARGIN + EPS
+    return plan
+
+
+def placed(plan, side="front"):
+    return Counter(it[0] for sh in plan for it in sh[side])
+
+
+def test_quantities_are_placed_exactly():
+    jobs = [{"src_file": "wizytowki.pdf", "page": 1, "back_page": 2, "w": 90, "h": 50, "qty": 37},
+            {"src_file": "ulotki.pdf", "page": 1, "w": 100, "h": 148, "qty": 9},
+            {"src_file": "zaproszenia.pdf", "page": 3, "w": 105, "h": 99, "qty": 0}]
+    plan = pack(jobs)
+    assert placed(plan) == {("wizytowki.pdf", 1): 37, ("ulotki.pdf", 1): 9}
+    assert placed(plan, "back") == {("wizytowki.pdf", 2): 37}
+
+
+def test_back_is_mirrored_with_opposite_rotation():
+    plan = pack([{"src_file": "a.pdf", "page": 1, "back_page": 2, "w": 50, "h": 90, "qty": 11}])
+    for sh in plan:
+        backs = {(round(x, 6), round(y, 6), round(w, 6), round(h, 6), rot) for _, x, y, w, h, rot in sh["back"]}
+        assert len(backs) == len(sh["front"])
+        for _, x, y, w, h, rot in sh["front"]:
+            assert rot == 90 # Pionowy użytek położony na płasko
+            assert (round(1.0 - x - w, 6), round(y, 6), round(w, 6), round(h, 6), (360 - rot) % 360) in backs
+
+
+def test_too_wide_job_is_rotated_to_fit():
+    plan = pack([{"src_file": "baner.pdf", "page": 1, "w": 380, "h": 100, "qty": 2}])
+    assert [it[5] for sh in plan for it in sh["front"]] == [90, 90]
+
+
+def test_job_that_does_not_fit_is_rejected():
+    with pytest.raises(ValueError):
+        ENGINE.calculate_gang([{"src_file": "plakat.pdf", "w": 500, "h": 700, "qty": 1}], *A3)
+    with pytest.raises(ValueError):
+        ENGINE.calculate_gang([{"src_file": "baner.pdf", "w": 380, "h": 100, "qty": 1}], *A3, allow_rotate=False)
+
+
+def test_large_quantity_fills_sheets_densely():
+    plan = pack([{"src_file": "bilety.pdf", "page": 1, "w": 50, "h": 20, "qty": 10000}])
+    assert placed(plan) == {("bilety.pdf", 1): 10000}
+    per_sheet = max(len(sh["front"]) for sh in plan)
+    assert len(plan) == -(-10000 // per_sheet)
+
+
+def test_overlap_in_gang_sheet_is_detected():
+    plan = ENGINE.calculate_gang([{"src_file": "a.pdf", "w": 90, "h": 50, "qty": 4}], *A3)
+    front = plan[0]["front"]
+    front[1] = front[1][:1] + front[0][1:]
+    assert ENGINE.verify_plan(plan, None, ImpositionEngine.METHOD_SHEETWISE)
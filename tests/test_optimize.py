@@ -0,0 +1,53 @@
+"""Dobór arkusza i siatki (optimize_layout): ranking dla stron A5 na formatach SHEET_SIZES."""
+import pytest
+
+from Book import SHEET_SIZES, ImpositionEngine
+
+ENGINE = ImpositionEngine()
+A5 = (148.0, 210.0)
+SHEETWISE = ImpositionEngine.METHOD_SHEETWISE
+WORK_TURN = ImpositionEngine.METHOD_WORK_TURN
+
+
+def ranking(imp_type, method, pages=64, params=None):
+    return ENGINE.optimize_layout(imp_type, method, pages, *A5, params)
+
+
+def key(r):
+    return r["fmt"], r["orient"], r["cols"], r["rows"], r["sheets"], r["plates"]
+
+
+def test_saddle_sheetwise_prefers_a3():
+    results = ranking(ImpositionEngine.TYPE_SADDLE, SHEETWISE)
+    assert key(results[0]) == ("A3", "Landscape", 2, 1, 16, 32)
+    assert [r["score"] for r in results] == sorted(r["score"] for r in results)
+
+
+def test_saddle_work_turn_needs_two_spreads_across_the_sheet():
+    # Obracanie: rozkładówka mieści się w połowie szerokości arkusza, więc A3 odpada
+    results = ranking(ImpositionEngine.TYPE_SADDLE, WORK_TURN)
+    assert key(results[0]) == ("B2", "Landscape", 2, 1, 16, 16)
+    assert ("A3", "Landscape") not in {(r["fmt"], r["orient"]) for r in results}
+    for r in results:
+        fw, fh = SHEET_SIZES[r["fmt"]]
+        sw = max(fw, fh) if r["orient"] == "Landscape" else min(fw, fh)
+        assert (sw - 20.0) / 2 >= 2 * A5[0]
+
+
+def test_n_up_sheetwise_and_work_turn_ranking():
+    best = ranking(ImpositionEngine.TYPE_N_UP, SHEETWISE)[:2]
+    assert [key(r) for r in best] == [("B1", "Portrait", 4, 4, 2, 4), ("B1", "Landscape", 6, 3, 2, 4)]
+    best = ranking(ImpositionEngine.TYPE_N_UP, WORK_TURN)[:2]
+    # Połowa szerokości arkusza: o połowę mniej kolumn, dwa komplety z arkusza
+    assert [key(r) for r in best] == [("B1", "Portrait", 2, 4, 4, 4), ("B1", "Landscape", 3, 3, 4, 4)]
+
+
+@pytest.mark.parametrize("method", [SHEETWISE, WORK_TURN])
+@pytest.mark.parametrize("imp_type", [ImpositionEngine.TYPE_N_UP, ImpositionEngine.TYPE_CUT_STACK])
+def test_smaller_grid_never_needs_fewer_sheets(imp_type, method):
+    # Podstawa odcinania: liczona jest tylko największa siatka na arkuszu
+    for r in ranking(imp_type, method):
+        for cols in range(1, r["cols"] + 1):
+            for rows in range(1, r["rows"] + 1):
+                sheets, _ = ENGINE.count_sheets(imp_type, method, 64, {"cols": cols, "rows": rows})
+                assert sheets >= r["sheets"]
@@ -0,0 +1,152 @@
+"""
+Test skali, offline, bez Scribusa: syntetyczne fikstury PDF (pdf_fixtures),
+liczba stron, plany wszystkich rodzajów prac i generowanie przez zastępnik API.
+
+Liniowość generowania sprawdzają liczby (obiekty na arkusz, obiekty i wywołania
+API na stronę) - są deterministyczne. Czas arkusza jest tylko kontrolą zgrubną:
+spowolnienie to stosunek koniec/początek prostej dopasowanej do median bloków
+arkuszy (JobTelemetry.slowdown). Zapis dokumentu (saveDocAs zastępnika) jest
+wyłączony, więc nie wchodzi do pomiaru.
+
+Wielkości ustawiają zmienne środowiskowe:
+IMPO_SCALE_PAGES (liczby stron fikstur, np. "1000,10000,50000"),
+IMPO_SCALE_GEN_PAGES (strony generowania), IMPO_SCALE_FILLER_MB
+(wypełnienie każdej fikstury, np. 4096 = pliki wielu GB).
+"""
+import gc
+import json
+import os
+import time
+
+import pytest
+
+import Book
+from pdf_fixtures import write_test_pdf
+
+SIZES = [int(n) for n in os.environ.get("IMPO_SCALE_PAGES", "1000,10000,50000").split(",")]
+GEN_PAGES = int(os.environ.get("IMPO_SCALE_GEN_PAGES", "10000"))
+FILLER_MB = float(os.environ.get("IMPO_SCALE_FILLER_MB", "0"))
+
+# Budżety (czas w s, pamięć w MB)
+BUDGETS = {
+    "count_s": 1.0,        # liczba stron jednego pliku (niezależnie od rozmiaru)
+    "count_mb": 64.0,      # przyrost pamięci przy liczeniu stron
+    "plan_s": 5.0,         # plany wszystkich rodzajów prac dla największego pliku
+    "sheet_ms": 25.0,      # średni czas arkusza przy generowaniu (zastępnik API)
+    "slowdown": 2.0,       # koniec / początek prostej czasu arkusza (JobTelemetry)
+    "generate_mb": 1024.0, # przyrost pamięci generowania
+}
+
+
+@pytest.fixture(scope="module")
+def workdir(tmp_path_factory):
+    return tmp_path_factory.mktemp("skala")
+
+
+def run_saddle(workdir, pages, record=False):
+    """
+    Zadanie zeszytowe przez zastępnik API bez zapisu dokumentu. Z record=True
+    nagrywa wywołania API (ślad liczb wywołań), inaczej zapisuje tylko telemetrię,
+    żeby zapis śladu nie wchodził do pomiaru czasu.
+    """
+    src = str(workdir / f"generowanie_{pages}.pdf")
+    if not os.path.exists(src):
+        write_test_pdf(src, pages)
+    Book.install_scribus_stub()
+    trace, tel = str(workdir / f"slad_{pages}.jsonl"), str(workdir / f"telemetria_{pages}.jsonl")
+    rec = Book.install_recorder(trace) if record else None
+    p = Book.build_job_params({"src_file": src, "imp_type": "saddle", "auto_save": False,
+                               "telemetry_path": None if record else tel})
+    # Obiekty pozostawione przez wcześniejsze testy poza zasięgiem GC: pełne
+    # przebiegi GC nie mogą doliczać ich do czasu ostatnich arkuszy
+    gc.collect()
+    gc.freeze()
+    try:
+        t0 = time.perf_counter()
+        res = Book.run_job(Book.ImpositionGenerator(), p)
+        seconds = time.perf_counter() - t0
+    finally:
+        gc.unfreeze()
+        if rec: rec.close()
+    if record:
+        return res, Book.trace_stats(trace)
+    with open(tel, encoding="utf-8") as f:
+        return res, seconds, [json.loads(line) for line in f]
+
+
+def total_calls(stats):
+    return sum(n for n, _ in stats["calls"].values())
+
+
+@pytest.fixture(scope="module")
+def generated(workdir):
+    return run_saddle(workdir, GEN_PAGES)
+
+
+@pytest.fixture(scope="module")
+def traced(workdir):
+    return run_saddle(workdir, GEN_PAGES, record=True)
+
+
+@pytest.mark.parametrize("objstm", [True, False], ids=["objstm", "xref"])
+@pytest.mark.parametrize("pages", SIZES)
+def test_page_count_under_budget(workdir, pages, objstm):
+    path = str(workdir / f"fikstura_{pages}_{'objstm' if objstm else 'xref'}.pdf")
+    write_test_pdf(path, pages, objstm, FILLER_MB)
+
+    Book._PDF_PAGE_COUNT_CACHE.clear()
+    mem = Book.process_memory()
+    t0 = time.perf_counter()
+    count = Book.get_pdf_page_count(path)
+    seconds = time.perf_counter() - t0
+    after = Book.process_memory()
+
+    assert count == pages
+    assert seconds <= BUDGETS["count_s"], f"liczba stron: {seconds:.3f} s"
+    if None not in (mem, after):
+        assert after - mem <= BUDGETS["count_mb"], f"pamięć liczenia stron: {after - mem:.1f} MB"
+
+
+def test_plans_under_budget():
+    n = max(SIZES)
+    eng = Book.ImpositionEngine()
+    t0 = time.perf_counter()
+    for imp_type in sorted(set(Book.ImpositionEngine.TYPE_ALIASES.values())):
+        len(eng.calculate(imp_type, Book.ImpositionEngine.METHOD_SHEETWISE, n, {}))
+    seconds = time.perf_counter() - t0
+    assert seconds <= BUDGETS["plan_s"], f"plany ({n} stron): {seconds:.2f} s"
+
+
+def test_generation_places_every_page(traced):
+    res, stats = traced
+    assert res["sheets"] == GEN_PAGES // 4
+    assert len(stats["per_page"]) == res["pages"] == 2 * res["sheets"]
+
+
+def test_generation_cost_per_sheet_is_constant(generated, traced):
+    # Każdy arkusz zadania zeszytowego ma tyle samo obiektów - bez względu na
+    # jego numer; wzrost oznaczałby koszt zależny od rozmiaru dokumentu
+    events = generated[2]
+    assert len({e["objects"] for e in events if e["event"] == "sheet_done"}) == 1
+    assert len(set(traced[1]["per_page"].values())) == 1
+
+
+def test_generation_calls_grow_linearly(traced, workdir):
+    # Liczba wywołań API ma rosnąć liniowo z liczbą arkuszy: przyrost na arkusz
+    # między dwoma mniejszymi zadaniami i między większym a pełnym jest ten sam
+    runs = [run_saddle(workdir, GEN_PAGES // 10, record=True), run_saddle(workdir, GEN_PAGES // 5, record=True), traced]
+    (s1, c1), (s2, c2), (s3, c3) = [(res["sheets"], total_calls(stats)) for res, stats in runs]
+    early, late = (c2 - c1) / (s2 - s1), (c3 - c2) / (s3 - s2)
+    assert late <= 1.01 * early, f"wywołania na arkusz: {early:.1f} -> {late:.1f}"
+
+
+def test_generation_time_under_budget(generated):
+    res, seconds, events = generated
+    end = events[-1]
+    assert end["event"] == "job_end"
+    sheet_ms = seconds * 1000.0 / max(1, res["sheets"])
+    assert sheet_ms <= BUDGETS["sheet_ms"], f"czas arkusza: {sheet_ms:.2f} ms"
+    assert end["slowdown"] is not None
+    assert end["slowdown"] <= BUDGETS["slowdown"], f"spowolnienie koniec/początek: {end['slowdown']}x"
+    if res.get("memory_growth_mb") is not None:
+        assert res["memory_growth_mb"] <= BUDGETS["generate_mb"]
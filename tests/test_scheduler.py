@@ -0,0 +1,102 @@
+"""Odświeżanie według czasu i przerwanie zadania (JobScheduler) - zegar podawany przez test."""
+import pytest
+
+import Book
+
+
+class Clock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def stub(clock):
+    stub = Book.install_scribus_stub()
+    stub.redraw_cost = 0.0
+
+    # Przerysowanie (setRedraw(True)) trwa redraw_cost sekund zegara testu
+    def set_redraw(on):
+        if on: clock.t += stub.redraw_cost
+    stub.setRedraw = set_redraw
+    return stub
+
+
+def test_redraw_waits_for_budget(stub, clock):
+    sched = Book.JobScheduler(10, budget=0.5, clock=clock)
+    clock.t = 0.3
+    assert not sched.tick(1)
+    clock.t = 0.5
+    assert sched.tick(2)
+    assert sched.redraws == 1
+    assert sched.tick(2, force=True)
+
+
+def test_interval_grows_with_redraw_cost(stub, clock):
+    sched = Book.JobScheduler(10, budget=0.5, share=0.1, clock=clock)
+    stub.redraw_cost = 0.2
+    clock.t = 0.5
+    assert sched.tick(1)
+    # Przerysowanie 0,2 s może zająć najwyżej 10% czasu: następne po 2 s
+    assert sched.interval == pytest.approx(2.0)
+    assert sched.redraw_seconds == pytest.approx(0.2)
+    clock.t += 1.9
+    assert not sched.tick(2)
+    clock.t += 0.1
+    assert sched.tick(3)
+
+
+def test_interval_never_drops_below_budget(stub, clock):
+    sched = Book.JobScheduler(10, budget=0.5, share=0.1, clock=clock)
+    stub.redraw_cost = 0.01
+    clock.t = 0.5
+    assert sched.tick(1)
+    assert sched.interval == 0.5
+
+
+def test_cancel_file_is_polled_at_most_every_100_ms(clock, tmp_path):
+    path = tmp_path / "zadanie.cancel"
+    sched = Book.JobScheduler(10, cancel_file=str(path), clock=clock)
+    assert not sched.cancelled()
+    path.touch()
+    clock.t = 0.05
+    assert not sched.cancelled()
+    clock.t = 0.1
+    assert sched.cancelled()
+
+
+def test_stale_cancel_file_is_removed(clock, tmp_path):
+    path = tmp_path / "zadanie.cancel"
+    path.touch()
+    sched = Book.JobScheduler(10, cancel_file=str(path), clock=clock)
+    assert not path.exists()
+    assert not sched.cancelled()
+    sched.cancel()
+    assert sched.cancelled()
+
+
+def test_cancel_before_first_sheet_keeps_one_empty_page(monkeypatch):
+    stub = Book.install_scribus_stub()
+    monkeypatch.setattr(Book.JobScheduler, "cancelled", lambda self: True)
+    p = Book.build_job_params({"src_mode": "pdf", "src_file": "a.pdf", "pages": 16,
+                               "imp_type": "saddle", "auto_save": False})
+    report = Book.ImpositionGenerator().run_imposition_job(p, interactive=False)
+    assert report["cancelled"] and not report["ok"]
+    assert (report["sheets"], report["pages"]) == (0, 0)
+    assert stub.pageCount() == 1
+    stub.gotoPage(1)
+    assert stub.getAllObjects() == []
+
+
+def test_stub_refuses_to_delete_last_page():
+    stub = Book.install_scribus_stub()
+    stub.newDocument((210, 297), (0, 0, 0, 0), 0, 1, 1, 0, 0, 1)
+    with pytest.raises(IndexError):
+        stub.deletePage(1)
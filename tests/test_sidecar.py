@@ -0,0 +1,48 @@
+"""Porównanie zadania z plikiem pomocniczym (<nazwa>.impo.json) - na zastępniku API Scribusa."""
+import pytest
+
+import Book
+
+
+@pytest.fixture
+def generator():
+    Book.install_scribus_stub()
+    return Book.ImpositionGenerator()
+
+
+def job(**ticket):
+    return Book.build_job_params(dict({"src_mode": "pdf", "src_file": "ksiazka.pdf", "pages": 32,
+                                       "imp_type": "perfect", "sig_size": 16}, **ticket))
+
+
+def saved(generator, p):
+    params = {k: v for k, v in p.items() if k not in generator.SIDECAR_SKIP}
+    return {"params": params, "plan_hash": generator._plan_hash(p), "names_ok": True}
+
+
+def test_unchanged_job_needs_nothing(generator):
+    assert generator.diff_job(saved(generator, job()), job()) == set()
+
+
+def test_run_only_keys_are_ignored(generator):
+    prev = saved(generator, job(telemetry_path="a.jsonl", cancel_file="a.cancel"))
+    assert generator.diff_job(prev, job(telemetry_path="b.jsonl", cancel_file="b.cancel")) == set()
+
+
+def test_slug_change_is_incremental(generator):
+    prev = saved(generator, job())
+    assert generator.diff_job(prev, job(slug_note="v2")) == {generator.KIND_SLUG}
+
+
+def test_engine_parameter_change_needs_full_generation(generator):
+    prev = saved(generator, job())
+    assert generator.diff_job(prev, job(sig_size=8)) is None
+
+
+def test_plan_hash_without_plan_params_covers_geometry(generator):
+    p = job()
+    p["plan_params"] = None
+    h = generator._plan_hash(p)
+    sheet = p["preview_data"][0]
+    sheet["front"][0] = sheet["front"][0][:1] + (0.25,) + sheet["front"][0][2:]
+    assert generator._plan_hash(p) != h
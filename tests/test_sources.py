@@ -0,0 +1,31 @@
+"""Książka z wielu plików: leniwe liczenie stron i kolejność plików."""
+from Book import PageSource, natural_sort_key
+
+
+def test_counted_specs_are_not_reopened():
+    opened = []
+
+    def counter(path):
+        opened.append(path)
+        return {"ch1.pdf": 3, "ch2.pdf": 5}[path]
+
+    source = PageSource(["ch1.pdf", {"blank": 2}, {"file": "ch2.pdf"}], counter)
+    assert len(source) == 10
+    specs = source.counted_specs()
+    assert specs == [{"file": "ch1.pdf", "pages": 3}, {"blank": 2}, {"file": "ch2.pdf", "pages": 5}]
+
+    again = PageSource(specs, counter)
+    assert len(again) == 10
+    assert again.resolve(10) == ("ch2.pdf", 5)
+    assert opened == ["ch1.pdf", "ch2.pdf"]
+
+
+def test_uncounted_files_stay_lazy():
+    source = PageSource([{"file": "a.pdf", "pages": 4}, "b.pdf"], counter=lambda path: 1 / 0)
+    assert source.resolve(2) == ("a.pdf", 2)
+    assert source.counted_specs()[1] == {"file": "b.pdf"}
+
+
+def test_natural_order_of_chapters():
+    names = ["ch10.pdf", "ch2.pdf", "Ch1.pdf", "ch2a.pdf"]
+    assert sorted(names, key=natural_sort_key) == ["Ch1.pdf", "ch2.pdf", "ch2a.pdf", "ch10.pdf"]
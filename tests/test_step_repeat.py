@@ -0,0 +1,26 @@
+"""Step & Repeat przez zastępnik API: jeden import na wzór, pozostałe użytki to kopie."""
+import pytest
+
+import Book
+from pdf_fixtures import write_test_pdf
+
+
+@pytest.mark.parametrize("pages", [2, 4])
+def test_one_import_per_design(tmp_path, pages):
+    src = str(tmp_path / "wizytowki.pdf")
+    write_test_pdf(src, pages)
+    Book.install_scribus_stub()
+    trace = str(tmp_path / "slad.jsonl")
+    rec = Book.install_recorder(trace)
+    try:
+        p = Book.build_job_params({"src_file": src, "pages": pages, "imp_type": "n_up", "cols": 5, "rows": 5,
+                                   "step_repeat": True, "auto_save": False})
+        report = Book.run_job(Book.ImpositionGenerator(), p)
+    finally:
+        rec.close()
+    calls = Book.trace_stats(trace)["calls"]
+
+    # Dupleks: arkusz na parę stron, 25 użytków na stronę arkusza
+    assert report["sheets"] == pages // 2
+    assert calls["loadImage"][0] == pages
+    assert calls["duplicateObject"][0] == pages * 24